@@ -0,0 +1,793 @@
+import torch
+from torch.nn.functional import softmax
+from torch.utils.data import DataLoader
+import numpy as np
+import time
+import json
+import subprocess
+import tempfile
+import threading
+import sys
+import os
+
+# Custom module imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from models.lstm import LSTMGenerator, BrandNameDataset, train
+from models.cache import PrefixCache
+from models.novelty import load_known_names
+from models.constraints import Constraints
+from models.ensemble import load_ensemble, space_weight_mix, SPACE_WEIGHT_CHECKPOINTS
+from models.mmap_checkpoint import export_mmap
+from models.scheduler import BatchScheduler
+from models.registry import TRAINED_DIR, REPO_ROOT
+from models.corpus import CorpusDataset, BucketBatchSampler, collate_corpus, build_corpus, corpus_is_stale, \
+    CORPUS_JSON
+from models.embedding import EmbeddingLSTMGenerator, collate_indices
+from models.utils import encode_char_onehot, encode_onehot, encode_label, collate_pad, collate_names, LABEL_DICT, \
+    LETTER_DICT
+
+# Checkpoint used for all benchmarks
+CHECKPOINT = os.path.join(TRAINED_DIR, 'lstm2_hs128_bs128_ep100_sw0-05.pt')
+
+
+def load_model():
+    '''
+    Load the pretrained model used by the web app.
+
+        Returns:
+            model (LSTMGenerator): model with the benchmark checkpoint loaded
+    '''
+
+    model = LSTMGenerator(128, 2)
+    model.load_state_dict(torch.load(CHECKPOINT, map_location='cpu'))
+    return model
+
+
+def time_calls(fn, repeats):
+    '''
+    Time repeated calls of a function.
+
+        Parameters:
+            fn (function): function taking no arguments to time
+            repeats (int): number of calls to make
+
+        Returns:
+            per_call (float): average seconds per call
+            outputs (list): return value of each call
+    '''
+
+    outputs = []
+    start = time.perf_counter()
+    for _ in range(repeats):
+        outputs.append(fn())
+    return (time.perf_counter() - start) / repeats, outputs
+
+
+def predict_legacy(model, seed, greedy):
+    '''
+    Original decoding loop of LSTMGenerator.predict and predict_max, kept as the baseline of bench_incremental.
+    Re-encodes and re-feeds the whole growing name at every step, carrying the state over.
+
+        Parameters:
+            model (LSTMGenerator): model to decode with
+            seed (str): substring that the name should start with
+            greedy (bool): pick the most likely letter instead of sampling with np.random
+
+        Returns:
+            name (str): generated name
+            prob_total (float): probability of the chosen letters
+    '''
+
+    model.eval()
+    with torch.inference_mode():
+        state_h, state_c = model._init_states(1)
+        name = seed
+        prob_total = 1
+        continue_generation = True
+        while continue_generation:
+            x = model._name_inputs(name)
+            y, (state_h, state_c) = model(x, (state_h, state_c), train=False)
+            y_next = y[-1, :]
+            probs_next = softmax(y_next, dim=0).detach().numpy()    # convert logits to probabilities
+            if greedy:
+                letter_ind = int(probs_next.argmax())
+            else:
+                letter_ind = np.random.choice(27, p=probs_next)
+            prob_total *= probs_next[letter_ind]
+            letter = LETTER_DICT[letter_ind]
+            if letter == ' ':
+                continue_generation = False
+            else:
+                name += letter
+
+    return name, prob_total
+
+
+def bench_incremental(model, seeds=('a', 'zo', 'nicm'), repeats=200):
+    '''
+    Compare per-name latency of the original decoding loop (predict_legacy) against incremental decoding.
+    The two loops produce different names, so the cost per generated letter is reported too.
+
+        Parameters:
+            model (LSTMGenerator): model to benchmark
+            seeds (tuple): seed strings to generate from
+            repeats (int): number of names generated per seed and mode
+    '''
+
+    for seed in seeds:
+        for greedy in (False, True):
+            paths = {
+                'legacy': lambda: predict_legacy(model, seed, greedy)[0],
+                'incremental': (lambda: model.predict_max(seed)[0]) if greedy else (lambda: model.predict(seed))
+            }
+            results = {}
+            for path, fn in paths.items():
+                np.random.seed(0)
+                per_call, names = time_calls(fn, repeats)
+                letters = sum(len(name) - len(seed) + 1 for name in names) / repeats
+                results[path] = (per_call, per_call / letters)
+            print({
+                'bench': 'incremental',
+                'seed': seed,
+                'mode': 'predict_max' if greedy else 'predict',
+                'legacy_ms_per_name': round(results['legacy'][0] * 1000, 3),
+                'incremental_ms_per_name': round(results['incremental'][0] * 1000, 3),
+                'legacy_ms_per_letter': round(results['legacy'][1] * 1000, 3),
+                'incremental_ms_per_letter': round(results['incremental'][1] * 1000, 3),
+                'speedup_per_letter': round(results['legacy'][1] / results['incremental'][1], 2)
+            })
+
+
+def count_lstm_calls(model, fn):
+    '''
+    Count how many times the model's LSTM module is called while running a function.
+
+        Parameters:
+            model (LSTMGenerator): model whose LSTM calls are counted
+            fn (function): function taking no arguments to run
+
+        Returns:
+            calls (int): number of LSTM calls made
+    '''
+
+    counter = [0]
+    handle = model.lstm.register_forward_hook(lambda *args: counter.__setitem__(0, counter[0] + 1))
+    try:
+        fn()
+    finally:
+        handle.remove()
+    return counter[0]
+
+
+def bench_batch(model, seeds=('a', 'nicm'), sizes=(10, 100, 1000)):
+    '''
+    Compare generating n names with a predict loop against a single predict_batch call.
+
+        Parameters:
+            model (LSTMGenerator): model to benchmark
+            seeds (tuple): seed strings to generate from
+            sizes (tuple): numbers of names to generate per request
+    '''
+
+    for seed in seeds:
+        for n in sizes:
+            loop = lambda: [model.predict(seed) for _ in range(n)]
+            batch = lambda: model.predict_batch(seed, n)
+            loop_time, _ = time_calls(loop, 1)
+            batch_time, _ = time_calls(batch, 1)
+            print({
+                'bench': 'batch',
+                'seed': seed,
+                'n': n,
+                'loop_ms': round(loop_time * 1000, 3),
+                'batch_ms': round(batch_time * 1000, 3),
+                'speedup': round(loop_time / batch_time, 2),
+                'loop_lstm_calls': count_lstm_calls(model, loop),
+                'batch_lstm_calls': count_lstm_calls(model, batch)
+            })
+
+
+def bench_seeds(model, num_seeds=(10, 100, 500), count=5):
+    '''
+    Compare names/sec for a list of seeds decoded one predict_batch call per seed against
+    a single predict_seeds call for the whole list.
+
+        Parameters:
+            model (LSTMGenerator): model to benchmark
+            num_seeds (tuple): lengths of the seed lists to generate for
+            count (int): number of names to generate per seed
+    '''
+
+    with open(CORPUS_JSON, 'r') as f:
+        corpus = json.load(f)
+    rng = np.random.default_rng(0)
+    for k in num_seeds:
+
+        # Random prefixes of real names give seeds of varied lengths
+        picks = rng.choice(len(corpus), k, replace=False)
+        seed_counts = [(corpus[i][:rng.integers(1, 5)], count) for i in picks]
+        loop_time, _ = time_calls(lambda: [model.predict_batch(seed, n) for seed, n in seed_counts], 1)
+        seeds_time, _ = time_calls(lambda: model.predict_seeds(seed_counts), 1)
+        total = k * count
+        print({
+            'bench': 'seeds',
+            'num_seeds': k,
+            'names': total,
+            'per_seed_names_per_sec': round(total / loop_time, 1),
+            'shared_names_per_sec': round(total / seeds_time, 1),
+            'speedup': round(loop_time / seeds_time, 2)
+        })
+
+
+def bench_cache(model, seeds=('a', 'zo', 'nic', 'nicmo', 'abcdefgh'), n=10, repeats=50):
+    '''
+    Compare request latency with and without the prefix cache for repeated seeds.
+
+        Parameters:
+            model (LSTMGenerator): model to benchmark
+            seeds (tuple): seed strings requested repeatedly
+            n (int): number of names generated per request
+            repeats (int): number of requests timed per seed and setting
+    '''
+
+    cache = PrefixCache(max_size=len(seeds))
+    for seed in seeds:
+        results = {}
+        for cached in (False, True):
+            model.enable_prefix_cache(cache if cached else None, CHECKPOINT)
+            torch.manual_seed(0)
+            results[cached], _ = time_calls(lambda: (model.predict_batch(seed, n), model.predict_max(seed)), repeats)
+        print({
+            'bench': 'cache',
+            'seed': seed,
+            'uncached_ms': round(results[False] * 1000, 3),
+            'cached_ms': round(results[True] * 1000, 3),
+            'speedup': round(results[False] / results[True], 2)
+        })
+    model.enable_prefix_cache(None, None)
+    print({'bench': 'cache', **cache.stats()})
+
+
+def bench_beam(model, seeds=('a', 'zo', 'nicm'), ks=(1, 3, 10), repeats=20):
+    '''
+    Time beam search for several beam widths against a single greedy predict_max decode.
+
+        Parameters:
+            model (LSTMGenerator): model to benchmark
+            seeds (tuple): seed strings to search from
+            ks (tuple): beam widths to time
+            repeats (int): number of searches timed per seed and width
+    '''
+
+    for seed in seeds:
+        greedy_time, _ = time_calls(lambda: model.predict_max(seed), repeats)
+        for k in ks:
+            beam_time, outputs = time_calls(lambda: model.predict_beam(seed, k), repeats)
+            print({
+                'bench': 'beam',
+                'seed': seed,
+                'k': k,
+                'greedy_ms': round(greedy_time * 1000, 3),
+                'beam_ms': round(beam_time * 1000, 3),
+                'top_name': outputs[0][0][0],
+                'top_log_prob': round(outputs[0][0][1], 4)
+            })
+
+
+def bench_score(model, chunk_sizes=(1, 256, 4096)):
+    '''
+    Measure scoring throughput on the training corpus for several chunk sizes
+    (a chunk size of 1 is equivalent to scoring one name at a time).
+
+        Parameters:
+            model (LSTMGenerator): model to benchmark
+            chunk_sizes (tuple): numbers of names per forward pass
+    '''
+
+    with open(CORPUS_JSON, 'r') as f:
+        corpus = json.load(f)
+    for chunk_size in chunk_sizes:
+        score_time, outputs = time_calls(lambda: model.score(corpus, chunk_size), 1)
+        print({
+            'bench': 'score',
+            'chunk_size': chunk_size,
+            'names_per_sec': round(len(corpus) / score_time, 1),
+            'mean_log_likelihood': round(float(outputs[0][0].mean()), 4)
+        })
+
+
+def bench_encoders(model, chunk_size=256):
+    '''
+    Compare the lookup table encoders against the original per character encoders on the training corpus,
+    one name at a time and as a collated batch. The model is not used.
+
+        Parameters:
+            model (LSTMGenerator): unused, for a uniform benchmark signature
+            chunk_size (int): number of names per collated batch
+    '''
+
+    with open(CORPUS_JSON, 'r') as f:
+        corpus = [name + ' ' for name in json.load(f)]
+    chunks = [corpus[start:start + chunk_size] for start in range(0, len(corpus), chunk_size)]
+
+    # Original implementations: one np.eye row and one dict lookup per character
+    legacy_onehot = lambda name: np.array(list(map(encode_char_onehot, list(name)))).T
+    legacy_label = lambda name: np.array([LABEL_DICT[ch] for ch in list(name)])
+    cases = [
+        ('onehot', lambda: [legacy_onehot(name) for name in corpus], lambda: [encode_onehot(name) for name in corpus]),
+        ('label', lambda: [legacy_label(name) for name in corpus], lambda: [encode_label(name) for name in corpus]),
+        ('collate', lambda: [collate_pad([(legacy_onehot(name), legacy_label(name)) for name in chunk]) for chunk in chunks],
+         lambda: [collate_names(chunk) for chunk in chunks])
+    ]
+    for case, legacy_fn, table_fn in cases:
+        legacy_time, _ = time_calls(legacy_fn, 1)
+        table_time, _ = time_calls(table_fn, 3)
+        print({
+            'bench': 'encoders',
+            'case': case,
+            'legacy_us_per_name': round(legacy_time / len(corpus) * 1e6, 3),
+            'table_us_per_name': round(table_time / len(corpus) * 1e6, 3),
+            'speedup': round(legacy_time / table_time, 2)
+        })
+
+
+def bench_corpus(model, batch_size=128, epochs=3):
+    '''
+    Compare the per-epoch data loading cost of the JSON name list (encoded item by item) against the
+    memory-mapped pre-encoded corpus. The model is not used.
+
+        Parameters:
+            model (LSTMGenerator): unused, for a uniform benchmark signature
+            batch_size (int): number of names per batch
+            epochs (int): number of passes over each dataset
+    '''
+
+    if corpus_is_stale():
+        build_corpus()
+    with open(CORPUS_JSON, 'r') as f:
+        names = json.load(f)
+    loaders = {
+        'json': DataLoader(BrandNameDataset(names), batch_size=batch_size, shuffle=True, collate_fn=collate_pad),
+        'corpus': DataLoader(CorpusDataset(), batch_size=batch_size, shuffle=True, collate_fn=collate_corpus)
+    }
+    times = {}
+    for name, loader in loaders.items():
+        times[name], _ = time_calls(lambda: sum(len(batch_y) for _, batch_y in loader), epochs)
+    print({
+        'bench': 'corpus',
+        'names': len(names),
+        'json_ms_per_epoch': round(times['json'] * 1000, 3),
+        'corpus_ms_per_epoch': round(times['corpus'] * 1000, 3),
+        'speedup': round(times['json'] / times['corpus'], 2)
+    })
+
+
+def bench_sampler(model, batch_size=128, max_tokens=2048, epochs=1):
+    '''
+    Train a fresh copy of the model shape for a few epochs with fixed order batches, length bucketed
+    batches and token budget batches; train reports the throughput and padding ratio of each epoch.
+
+        Parameters:
+            model (LSTMGenerator): model whose shape is trained, its weights are left untouched
+            batch_size (int): number of names per batch for the fixed size batches
+            max_tokens (int): padded letter budget of the token budget batches
+            epochs (int): number of epochs per batching
+    '''
+
+    if corpus_is_stale():
+        build_corpus()
+    dataset = CorpusDataset()
+    samplers = {
+        'fixed_order': None,
+        'bucketed': BucketBatchSampler(dataset.lengths(), batch_size, seed=0),
+        'token_budget': BucketBatchSampler(dataset.lengths(), max_tokens=max_tokens, seed=0)
+    }
+    for name, batch_sampler in samplers.items():
+        print({'bench': 'sampler', 'batching': name})
+        fresh = LSTMGenerator(model.hidden_size, model.num_layers)
+        train(dataset, fresh, batch_size, epochs, 0.01, collate_fn=collate_corpus, batch_sampler=batch_sampler)
+
+
+def bench_embedding(model, batch_size=128, steps=20, sizes=(1, 100, 4000), seed='a'):
+    '''
+    Compare the one-hot input path against the letter index path of EmbeddingLSTMGenerator, loaded with
+    the same weights: training step time and input bytes on length bucketed corpus batches, and decoding
+    time of predict_batch. The model is trained on copies, its weights are left untouched.
+
+        Parameters:
+            model (LSTMGenerator): model whose weights both paths load
+            batch_size (int): number of names per training batch
+            steps (int): number of training steps timed per path
+            sizes (tuple): numbers of names generated per decoding call
+            seed (str): seed of the generated names
+    '''
+
+    if corpus_is_stale():
+        build_corpus()
+    dataset = CorpusDataset()
+    batch_sampler = BucketBatchSampler(dataset.lengths(), batch_size, seed=0)
+    batches = [dataset.__getitems__(indices) for indices, _ in zip(batch_sampler, range(steps))]
+    paths = {
+        'onehot': (LSTMGenerator(model.hidden_size, model.num_layers), collate_corpus),
+        'embedding': (EmbeddingLSTMGenerator(model.hidden_size, model.num_layers), collate_indices)
+    }
+    loss_fn = torch.nn.CrossEntropyLoss()
+
+    for name, (copy, collate_fn) in paths.items():
+        copy.load_state_dict(model.state_dict())
+        collated = [collate_fn(batch) for batch in batches]
+        optimizer = torch.optim.Adam(copy.parameters(), lr=0.01)
+
+        # Same step as train, starting every batch from zero states
+        def step():
+            for batch_x, batch_y in collated:
+                states = copy._init_states(len(batch_y))
+                optimizer.zero_grad()
+                pred_y, _ = copy(batch_x, states)
+                keep = (batch_y.flatten() != -1).nonzero().flatten()
+                loss = loss_fn(pred_y.index_select(0, keep)[:-1], batch_y.flatten().index_select(0, keep)[1:])
+                loss.backward()
+                optimizer.step()
+
+        copy.train()
+        step_time, _ = time_calls(step, 1)
+        copy.load_state_dict(model.state_dict())
+        input_bytes = sum(batch_x.data.element_size() * batch_x.data.nelement() for batch_x, _ in collated)
+        result = {
+            'bench': 'embedding',
+            'path': name,
+            'train_ms_per_step': round(step_time / len(collated) * 1000, 3),
+            'input_bytes_per_batch': input_bytes // len(collated)
+        }
+        for n in sizes:
+            decode_time, _ = time_calls(lambda: copy.predict_batch(seed, n, rng_seed=0), 3)
+            result[f'decode_{n}_ms'] = round(decode_time * 1000, 3)
+        print(result)
+
+
+def bench_novelty(model, seeds=('zo', 'a', 'nicm'), n=100):
+    '''
+    Compare two ways of getting n distinct names that are not real brand names: novelty mode,
+    which resamples inside one batch, against repeated predict_batch rounds that discard repeats.
+
+        Parameters:
+            model (LSTMGenerator): model to benchmark
+            seeds (tuple): seed strings to generate from
+            n (int): number of distinct novel names requested
+    '''
+
+    known = load_known_names()
+
+    def discard_rounds():
+        names = set()
+        rounds = 0
+        while len(names) < n:
+            rounds += 1
+            names.update(name for name in model.predict_batch(seed, n) if name not in known)
+        return rounds
+
+    for seed in seeds:
+        torch.manual_seed(0)
+        novel_time, outputs = time_calls(lambda: model.predict_batch(seed, n, novel=True), 1)
+        torch.manual_seed(0)
+        discard_time, rounds = time_calls(discard_rounds, 1)
+        print({
+            'bench': 'novelty',
+            'seed': seed,
+            'n': n,
+            'novel_ms': round(novel_time * 1000, 3),
+            'novel_lstm_calls': count_lstm_calls(model, lambda: model.predict_batch(seed, n, novel=True)),
+            'novel_unique': len(set(outputs[0])),
+            'discard_ms': round(discard_time * 1000, 3),
+            'discard_rounds': rounds[0]
+        })
+
+
+def bench_constraints(model, seeds=('a', 'zo', 'nic'), n=1000):
+    '''
+    Compare constrained decoding (logit masks) with filtering unconstrained samples afterwards,
+    for 6-10 letter names ending in -ex or -ia that avoid a few trademark fragments.
+    Reports the acceptance rate and the number of valid names produced per second.
+
+        Parameters:
+            model (LSTMGenerator): model to benchmark
+            seeds (tuple): seed strings to generate from
+            n (int): number of rows decoded per request
+    '''
+
+    for seed in seeds:
+        constraints = Constraints(6, 10, banned=('zol', 'pril', 'mab', 'vir'), suffixes=('ex', 'ia'))
+        torch.manual_seed(0)
+        masked_time, masked = time_calls(lambda: model.predict_batch(seed, n, constraints=constraints), 1)
+        torch.manual_seed(0)
+        filter_time, sampled = time_calls(lambda: model.predict_batch(seed, n), 1)
+        filtered = [name for name in sampled[0] if constraints.check(name)]
+        print({
+            'bench': 'constraints',
+            'seed': seed,
+            'n': n,
+            'masked_acceptance': round(constraints.acceptance_rate(), 4),
+            'masked_valid_per_sec': round(len(masked[0]) / masked_time, 1),
+            'filter_acceptance': round(len(filtered) / n, 4),
+            'filter_valid_per_sec': round(len(filtered) / filter_time, 1)
+        })
+
+
+# Script run in a fresh interpreter to measure one serving backend from a cold start
+BACKEND_SCRIPT = '''
+import time
+start = time.perf_counter()
+import sys
+sys.path.insert(0, '.')
+if sys.argv[1] == 'numpy':
+    from models.numpy_lstm import NumpyLSTMGenerator
+    model = NumpyLSTMGenerator(sys.argv[2][:-3] + '.npz')
+else:
+    import torch
+    from models.lstm import LSTMGenerator
+    model = LSTMGenerator(128, 2)
+    model.load_state_dict(torch.load(sys.argv[2], map_location='cpu'))
+loaded = time.perf_counter()
+model.predict_batch('a', 100, rng_seed=0)
+done = time.perf_counter()
+with open('/proc/self/status') as f:
+    rss_kb = [line.split()[1] for line in f if line.startswith('VmHWM')][0]    # peak RSS of this process
+print(loaded - start, done - loaded, rss_kb, 'torch' in sys.modules)
+'''
+
+
+def bench_ensemble(model, seeds=('a', 'nicm'), n=1000, repeats=5):
+    '''
+    Compare the stacked ensemble of the four space weight checkpoints against running the
+    checkpoints one after another, both for mixed logits and for per-model samples.
+
+        Parameters:
+            model (LSTMGenerator): model to benchmark, as a single checkpoint reference
+            seeds (tuple): seed strings to generate from
+            n (int): number of names per call
+            repeats (int): number of calls to average over
+    '''
+
+    ensemble = load_ensemble()
+    singles = []
+    for path in SPACE_WEIGHT_CHECKPOINTS:
+        single = LSTMGenerator(128, 2)
+        single.load_state_dict(torch.load(path, map_location='cpu'))
+        singles.append(single)
+    mixes = {position: ensemble.mix(space_weight_mix(position)) for position in (1, 1.5)}
+    mixes['uniform'] = ensemble.mix([1, 1, 1, 1])
+
+    for seed in seeds:
+        torch.manual_seed(0)
+        single_time, _ = time_calls(lambda: model.predict_batch(seed, n), repeats)
+        sequential_time, _ = time_calls(lambda: [single.predict_batch(seed, n) for single in singles], repeats)
+        each_time, _ = time_calls(lambda: ensemble.predict_each(seed, n), repeats)
+        mix_times = {}
+        for position, mixed in mixes.items():
+            mix_times[position], _ = time_calls(lambda: mixed.predict_batch(seed, n), repeats)
+        print({
+            'bench': 'ensemble',
+            'seed': seed,
+            'n': n,
+            'single_ms': round(single_time * 1000, 3),
+            'four_sequential_ms': round(sequential_time * 1000, 3),
+            'each_ms': round(each_time * 1000, 3),
+            'mix_1_ms': round(mix_times[1] * 1000, 3),
+            'mix_1.5_ms': round(mix_times[1.5] * 1000, 3),
+            'mix_uniform_ms': round(mix_times['uniform'] * 1000, 3)
+        })
+
+
+def bench_scheduler(model, clients=(1, 4, 16, 64), n=50, max_waits=(0.002, 0.01)):
+    '''
+    Compare concurrent clients calling predict_batch directly on one shared model against the same
+    clients going through the micro-batching scheduler. Every client asks for n names with its own
+    seed and temperature at the same moment.
+
+        Parameters:
+            model (LSTMGenerator): model shared by all clients
+            clients (tuple): numbers of concurrent clients
+            n (int): number of names per request
+            max_waits (tuple): scheduler batching windows to compare, in seconds
+    '''
+
+    seeds = ['a', 'zo', 'nic', 'bel', 'xy', 'pra', 'le', 'cor']
+
+    def run_clients(num_clients, call):
+        latencies = [None] * num_clients
+        barrier = threading.Barrier(num_clients)
+
+        def client(ind):
+            barrier.wait()
+            start = time.perf_counter()
+            call(seeds[ind % len(seeds)], 0.8 + 0.05 * (ind % 8))
+            latencies[ind] = time.perf_counter() - start
+
+        threads = [threading.Thread(target=client, args=(ind,)) for ind in range(num_clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start, sum(latencies) / num_clients
+
+    for num_clients in clients:
+        wall, latency = run_clients(num_clients, lambda seed, temp: model.predict_batch(seed, n, temperature=temp))
+        result = {
+            'bench': 'scheduler',
+            'clients': num_clients,
+            'n': n,
+            'direct_wall_ms': round(wall * 1000, 1),
+            'direct_latency_ms': round(latency * 1000, 1)
+        }
+        for max_wait in max_waits:
+            scheduler = BatchScheduler(model, max_batch_size=2048, max_wait=max_wait)
+            wall, latency = run_clients(num_clients, lambda seed, temp: scheduler.generate(seed, n, temperature=temp))
+            stats = scheduler.stats()
+            scheduler.close()
+            result.update({
+                f'wait{max_wait}_wall_ms': round(wall * 1000, 1),
+                f'wait{max_wait}_latency_ms': round(latency * 1000, 1),
+                f'wait{max_wait}_batches': stats['batches'],
+                f'wait{max_wait}_max_queue_depth': stats['max_queue_depth']
+            })
+        print(result)
+
+
+def bench_backends(model, repeats=3):
+    '''
+    Compare cold start time, peak resident memory and time to generate 100 names between the
+    torch model and the NumPy engine, each measured in a fresh interpreter (memory is read from
+    /proc, so Linux only).
+    Requires the .npz export of the benchmark checkpoint (python models/numpy_lstm.py).
+
+        Parameters:
+            model (LSTMGenerator): unused, benchmarks load their own model in a subprocess
+            repeats (int): number of fresh interpreters started per backend
+    '''
+
+    for backend in ('torch', 'numpy'):
+        runs = []
+        for _ in range(repeats):
+            output = subprocess.run(
+                [sys.executable, '-c', BACKEND_SCRIPT, backend, CHECKPOINT],
+                capture_output=True, text=True, check=True, cwd=REPO_ROOT
+            ).stdout.split()
+            runs.append(output)
+        print({
+            'bench': 'backends',
+            'backend': backend,
+            'cold_start_ms': round(min(float(run[0]) for run in runs) * 1000, 1),
+            'generate_100_ms': round(min(float(run[1]) for run in runs) * 1000, 1),
+            'peak_rss_mb': round(min(int(run[2]) for run in runs) / 1024, 1),
+            'torch_imported': runs[0][3] == 'True'
+        })
+
+
+MMAP_SCRIPT = '''
+import time
+import sys
+sys.path.insert(0, '.')
+import torch
+from models.lstm import LSTMGenerator
+from models.mmap_checkpoint import load_mmap
+start = time.perf_counter()
+if sys.argv[1].endswith('.rxw'):
+    model = load_mmap(sys.argv[1])
+else:
+    model = LSTMGenerator(int(sys.argv[2]), int(sys.argv[3]))
+    model.load_state_dict(torch.load(sys.argv[1], map_location='cpu'))
+loaded = time.perf_counter()
+model.predict_batch('a', 10, rng_seed=0)
+with open('/proc/self/status') as f:
+    status = dict(line.split(':', 1) for line in f)
+print(loaded - start, status['RssAnon'].split()[0], status['RssFile'].split()[0])
+'''
+
+
+def bench_mmap(model, sizes=((128, 2), (1024, 3)), repeats=3):
+    '''
+    Compare loading .pt checkpoints with torch.load against memory-mapping .rxw checkpoints, for the
+    trained model size and a larger random model, each in a fresh interpreter. Reports load time and
+    the memory of the process after generating: private (RssAnon, one copy per worker) and file backed
+    (RssFile, shared between workers through the page cache). Linux only.
+
+        Parameters:
+            model (LSTMGenerator): unused, benchmarks load their own model in a subprocess
+            sizes (tuple): (hidden_size, num_layers) pairs of the models to compare
+            repeats (int): number of fresh interpreters started per file
+    '''
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for hidden_size, num_layers in sizes:
+            pt_path = os.path.join(tmp, f'lstm{num_layers}_hs{hidden_size}.pt')
+            if (hidden_size, num_layers) == (128, 2):
+                pt_path = CHECKPOINT
+            else:
+                torch.save(LSTMGenerator(hidden_size, num_layers).state_dict(), pt_path)
+            mmap_path = export_mmap(pt_path, os.path.join(tmp, f'lstm{num_layers}_hs{hidden_size}.rxw'))
+            for path in (pt_path, mmap_path):
+                runs = []
+                for _ in range(repeats):
+                    output = subprocess.run(
+                        [sys.executable, '-c', MMAP_SCRIPT, path, str(hidden_size), str(num_layers)],
+                        capture_output=True, text=True, check=True, cwd=REPO_ROOT
+                    ).stdout.split()
+                    runs.append(output)
+                print({
+                    'bench': 'mmap',
+                    'hidden_size': hidden_size,
+                    'num_layers': num_layers,
+                    'format': os.path.splitext(path)[1],
+                    'file_mb': round(os.path.getsize(path) / 2 ** 20, 1),
+                    'load_ms': round(min(float(run[0]) for run in runs) * 1000, 1),
+                    'private_mb': round(min(int(run[1]) for run in runs) / 1024, 1),
+                    'shared_mb': round(min(int(run[2]) for run in runs) / 1024, 1)
+                })
+
+
+def bench_script(model, seeds=('a', 'nicm'), sizes=(1, 100), repeats=20):
+    '''
+    Compare eager predict_batch against the TorchScript generation loop, for single names
+    and for batches. Requires the scripted checkpoint (python models/script.py).
+
+        Parameters:
+            model (LSTMGenerator): eager model to benchmark
+            seeds (tuple): seed strings to generate from
+            sizes (tuple): numbers of names generated per call
+            repeats (int): number of calls timed per seed and size
+    '''
+
+    scripted = torch.jit.load(os.path.splitext(CHECKPOINT)[0] + '.torchscript')
+    for seed in seeds:
+        for n in sizes:
+            # Warm up the profiling executor before timing
+            for _ in range(3):
+                scripted(seed, n)
+            torch.manual_seed(0)
+            eager_time, _ = time_calls(lambda: model.predict_batch(seed, n), repeats)
+            torch.manual_seed(0)
+            script_time, _ = time_calls(lambda: scripted(seed, n), repeats)
+            print({
+                'bench': 'script',
+                'seed': seed,
+                'n': n,
+                'eager_ms': round(eager_time * 1000, 3),
+                'script_ms': round(script_time * 1000, 3),
+                'speedup': round(eager_time / script_time, 2)
+            })
+
+
+# Map of benchmark names to functions, selectable from the command line
+BENCHMARKS = {
+    'incremental': bench_incremental,
+    'batch': bench_batch,
+    'seeds': bench_seeds,
+    'cache': bench_cache,
+    'beam': bench_beam,
+    'score': bench_score,
+    'encoders': bench_encoders,
+    'corpus': bench_corpus,
+    'sampler': bench_sampler,
+    'embedding': bench_embedding,
+    'backends': bench_backends,
+    'script': bench_script,
+    'novelty': bench_novelty,
+    'constraints': bench_constraints,
+    'ensemble': bench_ensemble,
+    'mmap': bench_mmap,
+    'scheduler': bench_scheduler,
+}
+
+
+def main():
+    '''Main execution function: run the benchmarks named on the command line (all by default).'''
+
+    names = sys.argv[1:] or list(BENCHMARKS)
+    model = load_model()
+    for name in names:
+        BENCHMARKS[name](model)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+from collections import OrderedDict
+import threading
+
+
+class PrefixCache:
+    '''
+    Bounded least-recently-used cache of LSTM states after a seed has been consumed.
+    Entries are keyed by (checkpoint, seed) so one cache can be shared between several models,
+    and a lock makes lookups, inserts and evictions safe from concurrent request threads.
+
+        Attributes:
+            max_size (int): maximum number of entries kept before the oldest is evicted
+            entries (OrderedDict): cached entries, ordered from least to most recently used
+            hits (int): number of lookups that found an entry
+            misses (int): number of lookups that did not find an entry
+            evictions (int): number of entries removed to respect max_size
+            lock (threading.Lock): lock held while the entries or counters change
+
+        Methods:
+            get: look up the cached entry for a checkpoint and seed
+            put: store the entry for a checkpoint and seed
+            clear: remove every entry and reset the counters
+            stats: return the counters and current size
+    '''
+
+    def __init__(self, max_size=1024):
+        '''
+        Construct the object.
+
+            Parameters:
+                max_size (int): maximum number of entries kept before the oldest is evicted
+        '''
+
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        '''Return the number of cached entries.'''
+
+        return len(self.entries)
+
+    def get(self, checkpoint, seed):
+        '''
+        Look up the cached entry for a checkpoint and seed, marking it as recently used.
+
+            Parameters:
+                checkpoint (str): identifier of the model weights the entry was computed with
+                seed (str): seed string that was consumed
+
+            Returns:
+                entry (tuple): (logits_next, (state_h, state_c)) or None if not cached
+        '''
+
+        key = (checkpoint, seed)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+        return entry
+
+    def put(self, checkpoint, seed, logits_next, states):
+        '''
+        Store the entry for a checkpoint and seed, evicting the least recently used entries if full.
+
+            Parameters:
+                checkpoint (str): identifier of the model weights the entry was computed with
+                seed (str): seed string that was consumed
+                logits_next (torch.Tensor): 1D tensor of logits for the letter following the seed
+                states (tuple): unbatched tensors of the LSTM states after the last seed letter
+        '''
+
+        key = (checkpoint, seed)
+        with self.lock:
+            self.entries[key] = (logits_next, states)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        '''Remove every entry and reset the counters.'''
+
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        '''
+        Return the cache counters.
+
+            Returns:
+                stats (dict): hits, misses, evictions, current size and maximum size
+        '''
+
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self.entries),
+                'max_size': self.max_size
+            }
@@ -0,0 +1,252 @@
+import torch
+import numpy as np
+from collections import deque
+import threading
+import sys
+import os
+
+# Custom module imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from models.utils import ALPHABET, LABEL_DICT
+
+# Distance used for automaton states that can never reach an allowed ending
+UNREACHABLE = 10 ** 6
+
+
+class PatternAutomaton:
+    '''
+    Aho-Corasick automaton over the lowercase alphabet, matching many patterns in one left-to-right pass.
+    Every state records which kind of pattern ends at the current position of the text.
+
+        Attributes:
+            transitions (np.array): 2D array giving the next state for each state and letter index
+            banned (np.array): 1D bool array, True if a banned pattern ends in this state
+            suffix (np.array): 1D bool array, True if a required suffix ends in this state
+
+        Methods:
+            run: state reached after reading a whole string
+    '''
+
+    def __init__(self, banned=(), suffixes=()):
+        '''
+        Construct the object.
+
+            Parameters:
+                banned (iterable): substrings that may not appear in a name
+                suffixes (iterable): endings of which a name must have at least one
+        '''
+
+        # Trie of all patterns
+        goto = [{}]
+        banned_end = [False]
+        suffix_end = [False]
+        for patterns, ends in ((banned, banned_end), (suffixes, suffix_end)):
+            for pattern in patterns:
+                state = 0
+                for letter in pattern:
+                    if letter not in goto[state]:
+                        goto.append({})
+                        banned_end.append(False)
+                        suffix_end.append(False)
+                        goto[state][letter] = len(goto) - 1
+                    state = goto[state][letter]
+                ends[state] = True
+
+        # Breadth first pass adding failure links and filling in the full transition table
+        transitions = np.zeros((len(goto), 26), dtype=np.int64)
+        fail = [0] * len(goto)
+        queue = deque()
+        for letter_ind, letter in enumerate(ALPHABET):
+            if letter in goto[0]:
+                transitions[0, letter_ind] = goto[0][letter]
+                queue.append(goto[0][letter])
+        while queue:
+            state = queue.popleft()
+            banned_end[state] = banned_end[state] or banned_end[fail[state]]
+            suffix_end[state] = suffix_end[state] or suffix_end[fail[state]]
+            for letter_ind, letter in enumerate(ALPHABET):
+                if letter in goto[state]:
+                    child = goto[state][letter]
+                    fail[child] = transitions[fail[state], letter_ind]
+                    transitions[state, letter_ind] = child
+                    queue.append(child)
+                else:
+                    transitions[state, letter_ind] = transitions[fail[state], letter_ind]
+
+        self.transitions = transitions
+        self.banned = np.array(banned_end)
+        self.suffix = np.array(suffix_end)
+
+    def run(self, string, state=0):
+        '''
+        Read a string through the automaton.
+
+            Parameters:
+                string (str): lowercase letters to read
+                state (int): state to start from
+
+            Returns:
+                state (int): state after the last letter, or -1 if a banned pattern was matched
+        '''
+
+        for letter in string:
+            state = self.transitions[state, LABEL_DICT[letter]]
+            if self.banned[state]:
+                return -1
+        return int(state)
+
+
+class Constraints:
+    '''
+    Name constraints applied as logit masks at every decoding step: minimum and maximum length,
+    banned substrings and required suffixes. A letter is only allowed if the name can still be
+    completed validly within the maximum length, so rows are steered towards valid names instead
+    of being thrown away afterwards. Rows left with no allowed letter are dropped and counted; the
+    counters are updated under a lock, so one object can be shared by concurrent requests.
+
+        Attributes:
+            min_length (int): minimum name length, None for no minimum
+            max_length (int): maximum name length, None for no maximum
+            automaton (PatternAutomaton): matcher for the banned substrings and required suffixes
+            transitions (torch.Tensor): automaton transition table
+            distance (torch.Tensor): fewest letters needed from each state to reach a state where the name
+                may end, without passing a banned state
+            attempted (int): number of rows decoded under these constraints
+            accepted (int): number of rows that finished with a valid name
+            lock (threading.Lock): lock held while the counters change
+
+        Methods:
+            start: automaton state after reading a seed
+            mask: mask the logits of disallowed letters
+            advance: move rows to their next automaton states
+            check: check a finished name against the constraints
+            record: add the row counts of one decoded batch
+            acceptance_rate: fraction of decoded rows that produced a valid name
+    '''
+
+    def __init__(self, min_length=None, max_length=None, banned=(), suffixes=()):
+        '''
+        Construct the object.
+
+            Parameters:
+                min_length (int): minimum name length, None for no minimum
+                max_length (int): maximum name length, None for no maximum
+                banned (iterable): lowercase substrings that may not appear in a name
+                suffixes (iterable): lowercase endings of which a name must have one, empty for any ending
+        '''
+
+        self.min_length = min_length
+        self.max_length = max_length
+        self.suffixes = tuple(suffixes)
+        self.automaton = PatternAutomaton(banned, self.suffixes)
+        can_end = self.automaton.suffix if self.suffixes else np.ones(len(self.automaton.banned), dtype=bool)
+
+        # Relax distances until stable, at most one round per state
+        distance = np.where(can_end & ~self.automaton.banned, 0, UNREACHABLE)
+        for _ in range(len(distance)):
+            through = np.minimum(distance, distance[self.automaton.transitions].min(axis=1) + 1)
+            through = np.where(self.automaton.banned, UNREACHABLE, np.minimum(through, UNREACHABLE))
+            if (through == distance).all():
+                break
+            distance = through
+
+        self.transitions = torch.from_numpy(self.automaton.transitions)
+        self.banned_states = torch.from_numpy(self.automaton.banned)
+        self.distance = torch.from_numpy(distance)
+        self.attempted = 0
+        self.accepted = 0
+        self.lock = threading.Lock()
+
+    def start(self, seed):
+        '''
+        Find the automaton state after reading a seed, checking the seed can lead to a valid name.
+
+            Parameters:
+                seed (str): substring that the names should start with
+
+            Returns:
+                state (int): automaton state after the seed
+        '''
+
+        state = self.automaton.run(seed)
+        if state == -1:
+            raise ValueError(f'Seed "{seed}" contains a banned substring')
+        if self.max_length is not None and len(seed) + int(self.distance[state]) > self.max_length:
+            raise ValueError(f'No name starting with "{seed}" can satisfy the constraints')
+        return state
+
+    def mask(self, logits, states, lengths):
+        '''
+        Set the logits of every letter that would break the constraints to -inf.
+
+            Parameters:
+                logits (torch.Tensor): 2D tensor of next letter logits, one row per name
+                states (torch.Tensor): automaton state of each row
+                lengths (torch.Tensor): current name length of each row
+
+            Returns:
+                logits (torch.Tensor): masked copy of the logits
+        '''
+
+        next_distance = self.distance[self.transitions[states]]
+        if self.max_length is None:
+            letters_ok = next_distance < UNREACHABLE
+        else:
+            letters_ok = next_distance <= (self.max_length - lengths - 1).unsqueeze(1)
+        space_ok = self.distance[states] == 0
+        if self.min_length is not None:
+            space_ok = space_ok & (lengths >= self.min_length)
+        allowed = torch.cat([letters_ok, space_ok.unsqueeze(1)], dim=1).to(logits.device)
+        return logits.masked_fill(~allowed, -float('inf'))
+
+    def advance(self, states, letter_inds):
+        '''
+        Move rows to the automaton states reached by their new letters.
+
+            Parameters:
+                states (torch.Tensor): automaton state of each row
+                letter_inds (torch.Tensor): letter index added to each row (no spaces)
+
+            Returns:
+                states (torch.Tensor): new automaton state of each row
+        '''
+
+        return self.transitions[states, letter_inds.cpu()]
+
+    def check(self, name):
+        '''
+        Check a finished name against the constraints, e.g. to filter unconstrained samples.
+
+            Parameters:
+                name (str): lowercase name
+
+            Returns:
+                valid (bool): True if the name satisfies every constraint
+        '''
+
+        if self.min_length is not None and len(name) < self.min_length:
+            return False
+        if self.max_length is not None and len(name) > self.max_length:
+            return False
+        if self.automaton.run(name) == -1:
+            return False
+        return not self.suffixes or name.endswith(self.suffixes)
+
+    def record(self, attempted, accepted):
+        '''
+        Add the row counts of one decoded batch to the counters.
+
+            Parameters:
+                attempted (int): number of rows decoded
+                accepted (int): number of those rows that finished with a valid name
+        '''
+
+        with self.lock:
+            self.attempted += attempted
+            self.accepted += accepted
+
+    def acceptance_rate(self):
+        '''Return the fraction of decoded rows that finished with a valid name, over all recorded batches.'''
+
+        with self.lock:
+            return self.accepted / self.attempted if self.attempted else 0.0
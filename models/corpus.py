@@ -0,0 +1,262 @@
+import numpy as np
+import json
+import sys
+import os
+
+# Custom module imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from models.utils import encode_label_batch
+from models.registry import REPO_ROOT
+
+# Pre-encoded training corpus, in CSR layout: the labels of every name (with its terminating space)
+# back to back in one uint8 array, and the int32 offset of each name's first label plus the total length
+CORPUS_JSON = os.path.join(REPO_ROOT, 'data', 'names_clean.json')
+CORPUS_PREFIX = os.path.join(REPO_ROOT, 'data', 'names_clean')
+
+
+def corpus_paths(prefix=CORPUS_PREFIX):
+    '''
+    Get the file paths of a pre-encoded corpus.
+
+        Parameters:
+            prefix (str): path of the corpus files without their suffix
+
+        Returns:
+            labels_path (str): path of the flat uint8 label array
+            offsets_path (str): path of the int32 offset array
+    '''
+
+    return f'{prefix}_labels.npy', f'{prefix}_offsets.npy'
+
+
+def build_corpus(json_path=CORPUS_JSON, prefix=CORPUS_PREFIX):
+    '''
+    Encode a JSON list of names once into the pre-encoded corpus files.
+
+        Parameters:
+            json_path (str): path of the JSON list of lowercase names
+            prefix (str): path of the corpus files to write, without their suffix
+
+        Returns:
+            num_names (int): number of names written
+    '''
+
+    with open(json_path, 'r') as f:
+        names = [name + ' ' for name in json.load(f)]
+    labels, lengths = encode_label_batch(names)
+    offsets = np.zeros(len(names) + 1, dtype=np.int32)
+    np.cumsum(lengths, out=offsets[1:])
+
+    labels_path, offsets_path = corpus_paths(prefix)
+    np.save(labels_path, labels[labels != -1].astype(np.uint8))
+    np.save(offsets_path, offsets)
+    return len(names)
+
+
+def corpus_is_stale(json_path=CORPUS_JSON, prefix=CORPUS_PREFIX):
+    '''Check whether the pre-encoded corpus files are missing or older than the JSON list of names.'''
+
+    source_mtime = os.stat(json_path).st_mtime
+    return any(not os.path.exists(path) or os.stat(path).st_mtime < source_mtime for path in corpus_paths(prefix))
+
+
+class CorpusDataset:
+    '''
+    Dataset (for a PyTorch DataLoader) of the names of a pre-encoded corpus, memory-mapped so it is
+    neither decoded nor held in memory. Fetching a batch gathers the labels of all its names with one
+    vectorized NumPy indexing call (a DataLoader calls __getitems__ with the indices of a whole batch),
+    and collate_corpus expands them into the model inputs with one tensor op.
+
+        Attributes:
+            labels (np.memmap): labels of every name back to back
+            offsets (np.memmap): offset of each name's first label, followed by the total number of labels
+
+        Methods:
+            __len__: get the length of the dataset
+            __getitem__: return the labels of one name
+            __getitems__: return the padded labels and lengths of several names
+            lengths: return the length of every name, for BucketBatchSampler
+    '''
+
+    def __init__(self, prefix=CORPUS_PREFIX):
+        '''
+        Construct the object.
+
+            Parameters:
+                prefix (str): path of the corpus files without their suffix
+        '''
+
+        labels_path, offsets_path = corpus_paths(prefix)
+        self.labels = np.load(labels_path, mmap_mode='r')
+        self.offsets = np.load(offsets_path, mmap_mode='r')
+
+    def __len__(self):
+        '''Return the length of the entire dataset.'''
+
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        '''
+        Get the labels of one name, including its terminating space.
+
+            Parameters:
+                idx (int): index of the item in the dataset
+
+            Returns:
+                labels (np.array): 1D uint8 array of letter indices
+        '''
+
+        return np.asarray(self.labels[self.offsets[idx]:self.offsets[idx + 1]])
+
+    def __getitems__(self, indices):
+        '''
+        Get the labels of several names at once, padded into one matrix.
+
+            Parameters:
+                indices (list): indices of the items in the dataset
+
+            Returns:
+                labels (np.array): 2D int64 array with one row of letter indices per name, padded with -1
+                lengths (np.array): 1D array of the name lengths, including the terminating space
+        '''
+
+        indices = np.asarray(indices)
+        starts = self.offsets[indices].astype(np.int64)
+        lengths = self.offsets[indices + 1] - starts
+        positions = starts[:, None] + np.arange(lengths.max(initial=0))
+        pad = positions >= (starts + lengths)[:, None]
+        labels = self.labels[np.minimum(positions, len(self.labels) - 1)].astype(np.int64)
+        labels[pad] = -1
+        return labels, lengths
+
+    def lengths(self):
+        '''
+        Get the length of every name, read from the offsets alone.
+
+            Returns:
+                lengths (np.array): 1D array of the name lengths, including the terminating space
+        '''
+
+        return np.diff(self.offsets)
+
+
+class BucketBatchSampler:
+    '''
+    Batch sampler (for the batch_sampler argument of a PyTorch DataLoader) grouping names of similar
+    length, so batches need little padding. Each epoch the names are shuffled within their length
+    bucket and the resulting batches are shuffled, both from a seeded generator, so the order differs
+    between epochs but is reproducible. Batches hold either a fixed number of names or as many names
+    as fit in a budget of padded letters.
+
+        Attributes:
+            lengths (np.array): length of each name in the dataset
+            batch_size (int): number of names per batch, used when max_tokens is None
+            max_tokens (int): maximum number of letters of a batch once padded, None for fixed size batches
+            bucket_width (int): number of consecutive lengths shuffled together
+            seed (int): base seed of the shuffles
+            epoch (int): number of the next epoch, advanced by every pass over the sampler
+
+        Methods:
+            __iter__: yield the batches of the next epoch
+            __len__: get the number of batches of the next epoch
+            set_epoch: choose the epoch (and so the shuffle) of the next pass
+    '''
+
+    def __init__(self, lengths, batch_size=128, max_tokens=None, bucket_width=1, seed=0):
+        '''
+        Construct the object.
+
+            Parameters:
+                lengths (list): length of each name in the dataset, e.g. CorpusDataset.lengths()
+                batch_size (int): number of names per batch, used when max_tokens is None
+                max_tokens (int): maximum number of letters of a batch once padded, None for fixed size batches
+                bucket_width (int): number of consecutive lengths shuffled together
+                seed (int): base seed of the shuffles
+        '''
+
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+        self.bucket_width = bucket_width
+        self.seed = seed
+        self.epoch = 0
+        if max_tokens is not None and max_tokens < self.lengths.max(initial=0):
+            raise ValueError(f'max_tokens {max_tokens} is shorter than the longest name')
+
+    def set_epoch(self, epoch):
+        '''
+        Choose the epoch of the next pass, to resume training with the same shuffles.
+
+            Parameters:
+                epoch (int): number of the epoch
+        '''
+
+        self.epoch = epoch
+
+    def _batches(self, epoch):
+        '''Build the batches of an epoch, as lists of dataset indices.'''
+
+        rng = np.random.default_rng([self.seed, epoch])
+        order = np.lexsort((rng.random(len(self.lengths)), self.lengths // self.bucket_width))
+        if self.max_tokens is None:
+            batches = [order[start:start + self.batch_size].tolist() for start in range(0, len(order), self.batch_size)]
+        else:
+            # Every name of a batch is padded to its longest one
+            batches = []
+            longest = 0
+            for ind, length in zip(order.tolist(), self.lengths[order].tolist()):
+                if not batches or (len(batches[-1]) + 1) * max(longest, length) > self.max_tokens:
+                    batches.append([])
+                    longest = 0
+                batches[-1].append(ind)
+                longest = max(longest, length)
+        return [batches[ind] for ind in rng.permutation(len(batches))]
+
+    def __iter__(self):
+        '''Yield the batches of the next epoch, then advance to the following epoch.'''
+
+        batches = self._batches(self.epoch)
+        self.epoch += 1
+        yield from batches
+
+    def __len__(self):
+        '''Return the number of batches of the next epoch.'''
+
+        return len(self._batches(self.epoch))
+
+
+def collate_corpus(batch, onehot=True):
+    '''
+    Collation function for CorpusDataset batches, building the same batch as collate_pad.
+    The inputs are expanded from the labels in one tensor op per batch.
+
+        Parameters:
+            batch (tuple): padded labels and lengths of a batch, from CorpusDataset.__getitems__
+            onehot (bool): flag for one-hot encoding the inputs, or else keeping them as letter indices
+
+        Returns:
+            batch_x (torch.nn.utils.rnn.PackedSequence): packed batch of one-hot encoded (or label encoded) strings
+            batch_y (torch.Tensor): padded/fixed-length batch of label encoded strings
+    '''
+
+    # Imported here so the corpus can be built without torch installed
+    import torch
+    from torch.nn.functional import one_hot
+    from torch.nn.utils.rnn import pack_padded_sequence
+
+    labels, lengths = batch
+    batch_y = torch.from_numpy(labels)
+    batch_x = one_hot(batch_y.clamp(min=0), 27).float() if onehot else batch_y.clamp(min=0)
+    batch_x = pack_padded_sequence(batch_x, torch.from_numpy(lengths), batch_first=True, enforce_sorted=False)
+    return batch_x, batch_y
+
+
+def main():
+    '''Main execution function: if file is called directly, build the pre-encoded training corpus.'''
+
+    num_names = build_corpus()
+    print({'names': num_names, 'files': corpus_paths()})
+
+
+if __name__ == '__main__':
+    main()
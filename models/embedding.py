@@ -0,0 +1,146 @@
+import torch
+from torch import nn
+from torch.nn.utils.rnn import PackedSequence
+from functools import partial
+import sys
+import os
+
+# Custom module imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from models.lstm import LSTMGenerator
+from models.utils import encode_label, collate_names
+from models.corpus import collate_corpus
+
+# Collation of CorpusDataset batches for the index inputs of EmbeddingLSTMGenerator
+collate_indices = partial(collate_corpus, onehot=False)
+
+
+class EmbeddingLSTMGenerator(LSTMGenerator):
+    '''
+    LSTMGenerator fed letter indices instead of 27-wide one-hot vectors.
+    An embedding lookup turns the indices into the first layer's inputs, and every layer, the first one
+    included, stays in torch.nn.LSTM with its fused kernel. The embedding starts as the identity (each
+    letter's row is its one-hot vector), so checkpoints of LSTMGenerator load losslessly (see
+    load_state_dict), and onehot_state_dict folds the embedding into the first layer's input weights,
+    so both models share the .pt format.
+
+        Attributes:
+            hidden_size (int): the number of features in the hidden state of the LSTM
+            num_layers (int): number of LSTM modules to stack
+            embedding (torch.nn.Embedding): first layer inputs of each letter, 27 features per letter
+            lstm (torch.nn.LSTM): PyTorch LSTM module
+            lin (torch.nn.Linear): PyTorch linear transformation module
+
+        Methods:
+            load_state_dict: load the weights of an LSTMGenerator or EmbeddingLSTMGenerator
+            onehot_state_dict: get the weights in the layout of LSTMGenerator
+    '''
+
+    def __init__(self, hidden_size, num_layers=1):
+        '''
+        Construct the object, initialized like LSTMGenerator.
+
+            Parameters:
+                hidden_size (int): number of features in the hidden state of the LSTM
+                num_layers (int): number of LSTM modules to stack
+        '''
+
+        super().__init__(hidden_size, num_layers)
+        self.embedding = nn.Embedding(27, 27)
+        with torch.no_grad():
+            self.embedding.weight.copy_(torch.eye(27))
+
+    def load_state_dict(self, state_dict, strict=True, assign=False):
+        '''
+        Load weights, starting from the identity embedding for the state dict of an LSTMGenerator
+        (e.g. a models/trained checkpoint), so the loaded model computes the same function.
+
+            Parameters:
+                state_dict (dict): weights of an LSTMGenerator or EmbeddingLSTMGenerator
+                strict (bool): see torch.nn.Module.load_state_dict
+                assign (bool): see torch.nn.Module.load_state_dict
+
+            Returns:
+                result (NamedTuple): missing and unexpected keys, see torch.nn.Module.load_state_dict
+        '''
+
+        if 'embedding.weight' not in state_dict:
+            state_dict = dict(state_dict)
+            state_dict['embedding.weight'] = torch.eye(27, dtype=state_dict['lstm.weight_ih_l0'].dtype)
+        return super().load_state_dict(state_dict, strict=strict, assign=assign)
+
+    def onehot_state_dict(self):
+        '''
+        Get the weights in the layout of LSTMGenerator, to save a checkpoint that every model format can load.
+
+            Returns:
+                state_dict (dict): weights loadable by LSTMGenerator.load_state_dict
+        '''
+
+        # Feeding a letter's embedding row x to the first layer multiplies it by weight_ih_l0, which for
+        # one-hot inputs is the letter's column of weight_ih_l0 @ embedding.T (exact for the identity)
+        state_dict = self.state_dict()
+        embedding = state_dict.pop('embedding.weight')
+        state_dict['lstm.weight_ih_l0'] = state_dict['lstm.weight_ih_l0'] @ embedding.t()
+        return state_dict
+
+    def _run_lstm(self, x, prev_states):
+        '''
+        Run the recurrent layers over letter indices, like LSTMGenerator over one-hot inputs.
+
+            Parameters:
+                x (torch.Tensor or PackedSequence): letter indices of shape (batch, length), or the same packed
+                    with pack_padded_sequence
+                prev_states (tuple): (state_h, state_c) tensors to start from
+
+            Returns:
+                output (torch.Tensor or PackedSequence): last layer hidden states at every position
+                states (tuple): (state_h, state_c) tensors after the last position of each sequence
+        '''
+
+        if isinstance(x, PackedSequence):
+            x = PackedSequence(self.embedding(x.data), x.batch_sizes, x.sorted_indices, x.unsorted_indices)
+        else:
+            x = self.embedding(x)
+        return self.lstm(x, prev_states)
+
+    def input_buffer(self, rows):
+        '''Allocate the inputs of a decoding loop once: letter indices of shape (rows, 1), see step_inputs.'''
+
+        return torch.zeros(rows, 1, dtype=torch.long, device=self.device)
+
+    def step_inputs(self, buffer, letter_inds):
+        '''Write the letter indices of one decoding step into a buffer from input_buffer, returning the filled view.'''
+
+        x = buffer[:len(letter_inds)]
+        x[:, 0] = torch.as_tensor(letter_inds)
+        return x
+
+    def _name_inputs(self, name):
+        '''Build the model inputs of one whole string: its letter indices, of shape (1, length).'''
+
+        return torch.from_numpy(encode_label(name)).to(self.device).unsqueeze(0)
+
+    def _name_batch(self, names):
+        '''Build the packed letter indices and padded labels of several strings, see collate_names.'''
+
+        return collate_names(names, onehot=False)
+
+
+def load_embedding(pt_path, hidden_size=128, num_layers=2, device='cpu'):
+    '''
+    Load an LSTMGenerator checkpoint into an EmbeddingLSTMGenerator.
+
+        Parameters:
+            pt_path (str): path of the .pt checkpoint
+            hidden_size (int): number of features in the hidden state of the LSTM
+            num_layers (int): number of LSTM modules to stack
+            device (torch.device): device to load the model onto
+
+        Returns:
+            model (EmbeddingLSTMGenerator): loaded model
+    '''
+
+    model = EmbeddingLSTMGenerator(hidden_size, num_layers)
+    model.load_state_dict(torch.load(pt_path, map_location=device))
+    return model.to(device)
@@ -0,0 +1,439 @@
+import torch
+from torch import nn
+from torch.nn.utils.rnn import PackedSequence
+from collections import OrderedDict
+import threading
+import sys
+import os
+
+# Custom module imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from models.lstm import LSTMGenerator, sample_letters, make_generator
+from models.utils import LETTER_DICT
+from models.registry import TRAINED_DIR
+
+# The four trained space weights, in slider order
+SPACE_WEIGHT_CHECKPOINTS = [
+    os.path.join(TRAINED_DIR, 'lstm2_hs128_bs128_ep100_sw0-01.pt'),
+    os.path.join(TRAINED_DIR, 'lstm2_hs128_bs128_ep100_sw0-05.pt'),
+    os.path.join(TRAINED_DIR, 'lstm2_hs128_bs128_ep100_sw0-1.pt'),
+    os.path.join(TRAINED_DIR, 'lstm2_hs128_bs128_ep100_sw0-5.pt')
+]
+
+
+class StackedLSTM(nn.Module):
+    '''
+    Several trained LSTMs of the same shape run side by side as one module.
+    The weights of every model are stacked along a leading model dimension, so each layer of all
+    models is computed by one batched matmul per step. States keep the torch.nn.LSTM layout
+    (num_layers, batch, features), with the hidden features of all models concatenated.
+
+        Attributes:
+            num_models (int): number of stacked models
+            hidden_size (int): number of features in the hidden state of each model
+            num_layers (int): number of layers of each model
+            w_ih (list): per layer input weights of shape (num_models, in_features, 4 * hidden_size)
+            w_hh (list): per layer hidden weights of shape (num_models, hidden_size, 4 * hidden_size)
+            bias (list): per layer summed biases of shape (num_models, 1, 4 * hidden_size)
+
+        Methods:
+            forward: run the stacked models over a (packed or padded) batch of sequences
+            step_grouped: advance a batch of rows that each belong to one of the models
+            select: create a stack holding only some of the models
+    '''
+
+    def __init__(self, state_dicts):
+        '''
+        Construct the object.
+
+            Parameters:
+                state_dicts (list): LSTMGenerator state dicts with identical shapes, one per model
+        '''
+
+        super().__init__()
+        self.num_models = len(state_dicts)
+        self.num_layers = len([key for key in state_dicts[0] if key.startswith('lstm.weight_ih_l')])
+        self.hidden_size = state_dicts[0]['lstm.weight_hh_l0'].shape[1]
+        for layer in range(self.num_layers):
+            w_ih = torch.stack([sd[f'lstm.weight_ih_l{layer}'].t() for sd in state_dicts])
+            w_hh = torch.stack([sd[f'lstm.weight_hh_l{layer}'].t() for sd in state_dicts])
+            bias = torch.stack([sd[f'lstm.bias_ih_l{layer}'] + sd[f'lstm.bias_hh_l{layer}'] for sd in state_dicts])
+            self.register_buffer(f'w_ih_l{layer}', w_ih.contiguous().float())
+            self.register_buffer(f'w_hh_l{layer}', w_hh.contiguous().float())
+            self.register_buffer(f'bias_l{layer}', bias.unsqueeze(1).float())
+
+    @property
+    def w_ih(self):
+        '''Per layer stacked input weights.'''
+
+        return [getattr(self, f'w_ih_l{layer}') for layer in range(self.num_layers)]
+
+    @property
+    def w_hh(self):
+        '''Per layer stacked hidden weights.'''
+
+        return [getattr(self, f'w_hh_l{layer}') for layer in range(self.num_layers)]
+
+    @property
+    def bias(self):
+        '''Per layer stacked biases.'''
+
+        return [getattr(self, f'bias_l{layer}') for layer in range(self.num_layers)]
+
+    def select(self, inds):
+        '''
+        Create a stack holding only some of the models, sharing nothing with this one.
+
+            Parameters:
+                inds (list): indices of the models to keep, in the new order
+
+            Returns:
+                stack (StackedLSTM): stack of the selected models
+        '''
+
+        stack = StackedLSTM.__new__(StackedLSTM)
+        nn.Module.__init__(stack)
+        stack.num_models = len(inds)
+        stack.num_layers = self.num_layers
+        stack.hidden_size = self.hidden_size
+        for name, buffer in self.named_buffers():
+            stack.register_buffer(name, buffer[inds].clone())
+        return stack
+
+    def _step(self, x, state_h, state_c):
+        '''
+        Advance every model by one letter.
+
+            Parameters:
+                x (torch.Tensor): 2D one-hot input, (batch, 27) shared by all models or
+                    (batch, num_models * 27) with a separate letter per model
+                state_h (torch.Tensor): hidden states of shape (num_layers, batch, num_models * hidden_size)
+                state_c (torch.Tensor): cell states of shape (num_layers, batch, num_models * hidden_size)
+
+            Returns:
+                output (torch.Tensor): last layer hidden state of shape (batch, num_models * hidden_size)
+                state_h (torch.Tensor): new hidden states
+                state_c (torch.Tensor): new cell states
+        '''
+
+        batch = x.shape[0]
+        m, hs = self.num_models, self.hidden_size
+        if x.shape[1] == 27:
+            inputs = x.unsqueeze(0).expand(m, batch, 27)
+        else:
+            inputs = x.view(batch, m, 27).transpose(0, 1)
+
+        new_h, new_c = [], []
+        for layer in range(self.num_layers):
+            prev_h = state_h[layer].view(batch, m, hs).transpose(0, 1)
+            prev_c = state_c[layer].view(batch, m, hs).transpose(0, 1)
+            gates = torch.baddbmm(self.bias[layer], inputs, self.w_ih[layer])
+            gates = gates.baddbmm(prev_h, self.w_hh[layer])
+
+            # Gate order follows torch.nn.LSTM: input, forget, cell, output
+            i, f, g, o = gates.chunk(4, dim=2)
+            cell = torch.sigmoid(f) * prev_c + torch.sigmoid(i) * torch.tanh(g)
+            inputs = torch.sigmoid(o) * torch.tanh(cell)
+            new_h.append(inputs.transpose(0, 1).reshape(batch, m * hs))
+            new_c.append(cell.transpose(0, 1).reshape(batch, m * hs))
+
+        return new_h[-1], torch.stack(new_h), torch.stack(new_c)
+
+    def step_grouped(self, letter_inds, state_h, state_c, counts):
+        '''
+        Advance rows that each belong to a single model by one letter.
+        The rows are grouped by model, so each model runs its own matmuls on its slice of the batch
+        and no row is computed by a model it does not belong to.
+
+            Parameters:
+                letter_inds (torch.Tensor): 1D tensor of input letter indices, one per row
+                state_h (torch.Tensor): hidden states of shape (num_layers, batch, hidden_size)
+                state_c (torch.Tensor): cell states of shape (num_layers, batch, hidden_size)
+                counts (list): number of rows belonging to each model, in model order
+
+            Returns:
+                state_h (torch.Tensor): new hidden states
+                state_c (torch.Tensor): new cell states
+        '''
+
+        new_h = torch.empty_like(state_h)
+        new_c = torch.empty_like(state_c)
+        start = 0
+        for model, count in enumerate(counts):
+            rows = slice(start, start + count)
+            start += count
+            if count == 0:
+                continue
+            for layer in range(self.num_layers):
+
+                # The first layer's input is one-hot, so its input matmul is just a row lookup
+                if layer == 0:
+                    gates = self.w_ih[0][model][letter_inds[rows]] + self.bias[0][model]
+                else:
+                    gates = torch.addmm(self.bias[layer][model], inputs, self.w_ih[layer][model])
+                gates = gates.addmm_(state_h[layer, rows], self.w_hh[layer][model])
+                i, f, g, o = gates.chunk(4, dim=1)
+                cell = torch.sigmoid(f) * state_c[layer, rows] + torch.sigmoid(i) * torch.tanh(g)
+                inputs = torch.sigmoid(o) * torch.tanh(cell)
+                new_h[layer, rows] = inputs
+                new_c[layer, rows] = cell
+
+        return new_h, new_c
+
+    def forward(self, x, prev_states):
+        '''
+        Run the stacked models over a batch of sequences, like torch.nn.LSTM with batch_first=True.
+
+            Parameters:
+                x (torch.Tensor or PackedSequence): one-hot inputs of shape (batch, length, 27 or num_models * 27),
+                    or the same packed with pack_padded_sequence
+                prev_states (tuple): (state_h, state_c) tensors to start from
+
+            Returns:
+                output (torch.Tensor or PackedSequence): last layer hidden states at every position
+                states (tuple): (state_h, state_c) tensors after the last position of each sequence
+        '''
+
+        state_h, state_c = prev_states
+        if not isinstance(x, PackedSequence):
+            outputs = []
+            for t in range(x.shape[1]):
+                output, state_h, state_c = self._step(x[:, t, :], state_h, state_c)
+                outputs.append(output)
+            return torch.stack(outputs, dim=1), (state_h, state_c)
+
+        # Packed sequences are sorted longest first, so each step runs on a shrinking prefix of the batch
+        if x.sorted_indices is not None:
+            state_h = state_h.index_select(1, x.sorted_indices)
+            state_c = state_c.index_select(1, x.sorted_indices)
+        state_h, state_c = state_h.clone(), state_c.clone()
+        outputs = []
+        start = 0
+        for size in x.batch_sizes.tolist():
+            output, step_h, step_c = self._step(x.data[start:start + size], state_h[:, :size], state_c[:, :size])
+            state_h[:, :size] = step_h
+            state_c[:, :size] = step_c
+            outputs.append(output)
+            start += size
+        if x.unsorted_indices is not None:
+            state_h = state_h.index_select(1, x.unsorted_indices)
+            state_c = state_c.index_select(1, x.unsorted_indices)
+        output = PackedSequence(torch.cat(outputs), x.batch_sizes, x.sorted_indices, x.unsorted_indices)
+        return output, (state_h, state_c)
+
+
+class EnsembleGenerator(LSTMGenerator):
+    '''
+    Several trained LSTMGenerators decoding together, e.g. the checkpoints trained with different space weights.
+    All models run in one StackedLSTM call per step. Their next letter logits are averaged with mixing
+    weights, which is folded into a single linear layer over the concatenated hidden states, so every
+    LSTMGenerator method (batching, streaming, novelty, constraints, beam search, scoring) works unchanged.
+    Since softmax ignores a constant shift, averaging logits is the same as averaging log probabilities.
+
+        Attributes:
+            num_models (int): number of models in the ensemble
+            weights (torch.Tensor): mixing weight of each model, summing to 1
+            lstm (StackedLSTM): the stacked LSTMs of all models
+            lin (torch.nn.Linear): mixed output layer over the concatenated hidden states
+            lin_each_weight (torch.Tensor): output layer weights of each model, (num_models, 27, hidden_size)
+            lin_each_bias (torch.Tensor): output layer biases of each model, (num_models, 27)
+            base_checkpoint (str): identifier of the ensemble weights, without the mixing weights
+            mixes (OrderedDict): recently used mixes of this ensemble, keyed by their normalized weights
+            lock (threading.Lock): lock held while the mixes are looked up, added or evicted
+
+        Methods:
+            mix: get the ensemble with other mixing weights, dropping models with weight 0
+            predict_each: generate names from every model separately, side by side in one batch
+    '''
+
+    def __init__(self, stack, lin_each_weight, lin_each_bias, weights=None):
+        '''
+        Construct the object.
+
+            Parameters:
+                stack (StackedLSTM): the stacked LSTMs of all models
+                lin_each_weight (torch.Tensor): output layer weights of each model, (num_models, 27, hidden_size)
+                lin_each_bias (torch.Tensor): output layer biases of each model, (num_models, 27)
+                weights (list): mixing weight of each model, normalized to sum to 1 (None for equal weights)
+        '''
+
+        # LSTMGenerator.__init__ is skipped since the stacked LSTM replaces its own
+        nn.Module.__init__(self)
+        self.num_models = stack.num_models
+        self.hidden_size = stack.num_models * stack.hidden_size
+        self.num_layers = stack.num_layers
+        self.lstm = stack
+        self.register_buffer('lin_each_weight', lin_each_weight)
+        self.register_buffer('lin_each_bias', lin_each_bias)
+        if weights is None:
+            weights = [1.0] * self.num_models
+        weights = torch.tensor(weights, dtype=torch.float32, device=lin_each_weight.device)
+        self.weights = weights / weights.sum()
+
+        # Mixed logits: sum over models of weight * (W h + b), as one linear layer
+        self.lin = nn.Linear(self.hidden_size, 27).to(lin_each_weight.device)
+        with torch.no_grad():
+            self.lin.weight.copy_((lin_each_weight * self.weights[:, None, None]).permute(1, 0, 2).reshape(27, -1))
+            self.lin.bias.copy_((lin_each_bias * self.weights[:, None]).sum(dim=0))
+        self.lin.requires_grad_(False)
+
+        self.prefix_cache = None
+        self.checkpoint = None
+        self.base_checkpoint = None
+        self.mixes = OrderedDict()
+        self.lock = threading.Lock()
+
+    def enable_prefix_cache(self, cache, checkpoint):
+        '''
+        Start every prediction from cached seed states where possible, see LSTMGenerator.enable_prefix_cache.
+        The mixing weights are added to the identifier, so each mix has its own entries.
+
+            Parameters:
+                cache (PrefixCache): cache to read from and store new seed states in, None to only set the identifier
+                checkpoint (str): identifier of the ensemble weights, e.g. the joined checkpoint paths
+        '''
+
+        self.prefix_cache = cache
+        self.base_checkpoint = checkpoint
+        self.checkpoint = f'{checkpoint}|mix=' + ','.join(f'{w:.4f}' for w in self.weights.tolist())
+
+    def mix(self, weights):
+        '''
+        Get this ensemble with other mixing weights. Models with weight 0 are left out of the stack,
+        so they cost nothing while decoding. Recent mixes are kept and reused.
+
+            Parameters:
+                weights (list): mixing weight of each model in this ensemble, at least one above 0
+
+            Returns:
+                ensemble (EnsembleGenerator): ensemble of the models with a positive weight
+        '''
+
+        key = tuple(round(float(w) / sum(weights), 4) for w in weights)
+        with self.lock:
+            if key in self.mixes:
+                self.mixes.move_to_end(key)
+                return self.mixes[key]
+
+            inds = [ind for ind, weight in enumerate(key) if weight > 0]
+            stack = self.lstm if len(inds) == self.num_models else self.lstm.select(inds)
+            ensemble = EnsembleGenerator(
+                stack,
+                self.lin_each_weight[inds],
+                self.lin_each_bias[inds],
+                [key[ind] for ind in inds]
+            )
+
+            # The identifier also keys results in the web app, so it is set with or without a prefix cache
+            ensemble.enable_prefix_cache(self.prefix_cache, f'{self.base_checkpoint}|models={inds}')
+            self.mixes[key] = ensemble
+            while len(self.mixes) > 32:
+                self.mixes.popitem(last=False)
+        return ensemble
+
+    def predict_each(self, seed, n, temperature=1.0, top_k=None, top_p=None, rng_seed=None):
+        '''
+        Given a starting input substring generate n random names from every model separately, in one batch.
+        Rows are grouped by model and advanced with StackedLSTM.step_grouped, so every model only
+        computes its own unfinished rows, however different the name lengths of the models are.
+
+            Parameters:
+                seed (str): substring that the names should start with
+                n (int): number of names to generate per model
+                temperature (float): sampling temperature, see sample_letters
+                top_k (int): sample only from the k most likely letters, see sample_letters
+                top_p (float): nucleus sampling threshold, see sample_letters
+                rng_seed (int): seed making the results reproducible, None for random results
+
+            Returns:
+                names (list): one list of n generated names per model, in model order
+        '''
+
+        m = self.num_models
+        hs = self.hidden_size // m
+        self.eval()
+        with torch.inference_mode():
+
+            # Split the seed state into one row per model and name, grouped by model
+            _, (state_h, state_c) = self._consume_seed(seed)
+            state_h = state_h.view(self.num_layers, m, 1, hs).expand(-1, -1, n, -1).reshape(self.num_layers, m * n, hs)
+            state_c = state_c.view(self.num_layers, m, 1, hs).expand(-1, -1, n, -1).reshape(self.num_layers, m * n, hs)
+            row_models = torch.arange(m, device=self.device).repeat_interleave(n)
+            active = torch.arange(m * n)
+            sampling = {
+                'temperature': temperature,
+                'top_k': top_k,
+                'top_p': top_p,
+                'generator': make_generator(rng_seed, self.device)
+            }
+            letters = [[seed] for _ in range(m * n)]
+            names = [None] * (m * n)
+            counts = [n] * m
+            while True:
+                logits_next = torch.empty(len(active), 27, device=self.device)
+                start = 0
+                for model, count in enumerate(counts):
+                    rows = slice(start, start + count)
+                    torch.addmm(self.lin_each_bias[model], state_h[-1, rows], self.lin_each_weight[model].t(),
+                                out=logits_next[rows])
+                    start += count
+                letter_inds = sample_letters(logits_next, **sampling)
+                keep = letter_inds != 26
+                for row, letter_ind in zip(active[keep].tolist(), letter_inds[keep].tolist()):
+                    letters[row].append(LETTER_DICT[letter_ind])
+                for row in active[~keep].tolist():
+                    names[row] = ''.join(letters[row])
+
+                # Drop the finished rows, which keeps the rows grouped by model
+                if not keep.all():
+                    active = active[keep.cpu()]
+                    letter_inds = letter_inds[keep]
+                    row_models = row_models[keep]
+                    state_h = state_h[:, keep, :]
+                    state_c = state_c[:, keep, :]
+                    counts = torch.bincount(row_models, minlength=m).tolist()
+                if len(active) == 0:
+                    break
+                state_h, state_c = self.lstm.step_grouped(letter_inds, state_h, state_c, counts)
+
+        return [names[model * n:(model + 1) * n] for model in range(m)]
+
+
+def load_ensemble(pt_paths=SPACE_WEIGHT_CHECKPOINTS, weights=None, device='cpu'):
+    '''
+    Load several LSTMGenerator checkpoints of the same shape into one ensemble.
+
+        Parameters:
+            pt_paths (list): paths of the float .pt checkpoints
+            weights (list): mixing weight of each checkpoint (None for equal weights)
+            device (torch.device): device to load the ensemble onto
+
+        Returns:
+            ensemble (EnsembleGenerator): ensemble of the checkpoints
+    '''
+
+    state_dicts = [torch.load(path, map_location=device) for path in pt_paths]
+    stack = StackedLSTM(state_dicts)
+    lin_each_weight = torch.stack([sd['lin.weight'] for sd in state_dicts]).float()
+    lin_each_bias = torch.stack([sd['lin.bias'] for sd in state_dicts]).float()
+    ensemble = EnsembleGenerator(stack, lin_each_weight, lin_each_bias, weights)
+    ensemble.enable_prefix_cache(None, ','.join(pt_paths))
+    return ensemble
+
+
+def space_weight_mix(position, num_models=len(SPACE_WEIGHT_CHECKPOINTS)):
+    '''
+    Turn a slider position into mixing weights, blending linearly between neighboring checkpoints.
+    Whole positions select a single checkpoint, e.g. 1 is sw0-05 and 1.5 mixes sw0-05 and sw0-1 equally.
+
+        Parameters:
+            position (float): slider position between 0 and num_models - 1
+            num_models (int): number of checkpoints on the slider
+
+        Returns:
+            weights (list): mixing weight of each checkpoint
+    '''
+
+    position = min(max(float(position), 0), num_models - 1)
+    weights = [max(0.0, 1 - abs(position - ind)) for ind in range(num_models)]
+    return weights
@@ -2,20 +2,78 @@ import torch
 from torch import nn, optim, index_select
 from torch.utils.data import Dataset, DataLoader
 from torch.nn.utils.rnn import pad_packed_sequence
-from torch.nn.functional import softmax
+from torch.nn.functional import softmax, log_softmax, one_hot
 import numpy as np
+import time
 import sys 
 import os
 import json
 
 # Custom module imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
-from models.utils import encode_label, encode_onehot, collate_pad, LETTER_DICT
+from models.utils import encode_label, encode_onehot, collate_pad, collate_names, LETTER_DICT
+from models.novelty import load_known_names
+from models.registry import format_checkpoint_name, TRAINED_DIR
+from models.corpus import CorpusDataset, BucketBatchSampler, build_corpus, corpus_is_stale
 
 # Identify device
 device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 
 
+def sample_letters(logits, temperature=1.0, top_k=None, top_p=None, generator=None):
+    '''
+    Sample one letter index per row of next letter logits, entirely on tensors.
+
+        Parameters:
+            logits (torch.Tensor): 2D tensor of next letter logits, one row per name
+            temperature (float): divides the logits, < 1 sharpens and > 1 flattens the distribution, 0 is greedy
+            top_k (int): only sample from the k most likely letters (None to disable)
+            top_p (float): only sample from the smallest set of letters with total probability >= top_p (None to disable)
+            generator (torch.Generator): random number generator to sample with (None for the global one)
+
+        Returns:
+            letter_inds (torch.Tensor): 1D tensor of sampled letter indices
+    '''
+
+    if temperature == 0:
+        return logits.argmax(dim=1)
+    logits = logits / temperature
+
+    # Top-k: drop every letter scoring below the k-th best
+    if top_k is not None and top_k < logits.shape[1]:
+        kth_best = logits.topk(top_k, dim=1).values[:, -1:]
+        logits = logits.masked_fill(logits < kth_best, -float('inf'))
+    probs = softmax(logits, dim=1)
+
+    # Top-p: drop the tail once the more likely letters already cover top_p
+    if top_p is not None and top_p < 1:
+        sorted_probs, sorted_inds = probs.sort(dim=1, descending=True)
+        tail = sorted_probs.cumsum(dim=1) - sorted_probs >= top_p
+        probs = probs.scatter(1, sorted_inds, sorted_probs.masked_fill(tail, 0))
+
+    letter_inds = torch.multinomial(probs, 1, generator=generator).squeeze(1)
+    return letter_inds
+
+
+def make_generator(rng_seed, device='cpu'):
+    '''
+    Create a seeded random number generator for one request, or None to use the global one.
+
+        Parameters:
+            rng_seed (int): seed for the generator, None for non-reproducible sampling
+            device (torch.device): device the sampling happens on
+
+        Returns:
+            generator (torch.Generator): seeded generator, or None if rng_seed is None
+    '''
+
+    if rng_seed is None:
+        return None
+    generator = torch.Generator(device=device)
+    generator.manual_seed(rng_seed)
+    return generator
+
+
 class BrandNameDataset(Dataset):
     '''
     PyTorch dataset class for arrays of names.
@@ -73,11 +131,23 @@ class LSTMGenerator(nn.Module):
             num_layers (int): number of LSTM modules to stack
             lstm (torch.nn.LSTM): PyTorch LSTM module
             lin (torch.nn.Linear): PyTorch linear transformation module
+            prefix_cache (PrefixCache): optional cache of LSTM states after consuming a seed
+            checkpoint (str): identifier of the loaded weights, used as part of the cache key
 
         Methods:
             forward: required PyTorch method detailing the forward propagation
+            enable_prefix_cache: start predictions from cached seed states
+            consume_seeds: encode several seed phrases in one packed pass, for batched decoders
+            input_buffer: allocate the reusable inputs of a decoding loop
+            step_inputs: write the inputs of one decoding step into such a buffer
             predict: generate a random name given a length and a seed phrase
             predict_max: generate the most likely name given a length and seed phrase
+            predict_batch: generate several random names at once given a seed phrase
+            predict_seeds: generate random names for a list of seed phrases at once
+            iter_names: generate random names, yielding each as soon as it is finished
+            predict_beam: find the k most likely names given a seed phrase using beam search
+            score: compute the log-likelihood and per-letter surprisal of a list of names
+            iter_scores: lazily score names in constant memory chunks
     '''
 
     def __init__(self, hidden_size, num_layers=1):
@@ -98,6 +168,8 @@ class LSTMGenerator(nn.Module):
             batch_first=True
         )
         self.lin = nn.Linear(hidden_size, 27)
+        self.prefix_cache = None
+        self.checkpoint = None
 
     def forward(self, x, prev_states, train=True):
         '''
@@ -116,7 +188,7 @@ class LSTMGenerator(nn.Module):
         '''
 
         # Pass inputs into LSTM
-        x, (state_h, state_c) = self.lstm(x, prev_states)
+        x, (state_h, state_c) = self._run_lstm(x, prev_states)
 
         # If training we have variable length inputs so have to handle padding
         if train:
@@ -128,7 +200,369 @@ class LSTMGenerator(nn.Module):
 
         return output, (state_h, state_c)
 
-    def predict(self, seed):
+    @property
+    def device(self):
+        '''Device holding the model's parameters (dynamically quantized models have none and run on the CPU).'''
+
+        param = next(self.parameters(), None)
+        return param.device if param is not None else torch.device('cpu')
+
+    def _init_states(self, batch_size=None):
+        '''
+        Create zeroed hidden and cell states for a new prediction.
+
+            Parameters:
+                batch_size (int): number of sequences decoded together, None for an unbatched state
+
+            Returns:
+                state_h (torch.Tensor): zeroed hidden state of the LSTM model
+                state_c (torch.Tensor): zeroed cell state of the LSTM model
+        '''
+
+        shape = (self.num_layers, self.hidden_size) if batch_size is None else (self.num_layers, batch_size, self.hidden_size)
+        state_h = torch.zeros(shape, device=self.device)
+        state_c = torch.zeros(shape, device=self.device)
+        return state_h, state_c
+
+    def _run_lstm(self, x, prev_states):
+        '''Run the recurrent layers over model inputs, see forward.'''
+
+        return self.lstm(x, prev_states)
+
+    def input_buffer(self, rows):
+        '''
+        Allocate the inputs of a decoding loop once, to be refilled in place at every step (see step_inputs).
+
+            Parameters:
+                rows (int): largest number of rows fed in one step
+
+            Returns:
+                buffer (torch.Tensor): zeroed one-hot inputs of shape (rows, 1, 27)
+        '''
+
+        return torch.zeros(rows, 1, 27, device=self.device)
+
+    def step_inputs(self, buffer, letter_inds):
+        '''
+        Write the inputs of one decoding step into a buffer from input_buffer.
+
+            Parameters:
+                buffer (torch.Tensor): inputs allocated by input_buffer
+                letter_inds (torch.Tensor or list): letter index fed to each row
+
+            Returns:
+                x (torch.Tensor): view of the buffer holding the one-hot inputs, shape (rows, 1, 27)
+        '''
+
+        x = buffer[:len(letter_inds)]
+        x.zero_()
+        x[torch.arange(len(letter_inds)), 0, letter_inds] = 1
+        return x
+
+    def _name_inputs(self, name):
+        '''
+        Build the model inputs of one whole string.
+
+            Parameters:
+                name (str): lowercase string to encode
+
+            Returns:
+                x (torch.Tensor): one-hot inputs of shape (1, length, 27)
+        '''
+
+        return torch.from_numpy(encode_onehot(name).T).float().to(self.device).unsqueeze(0)
+
+    def _name_batch(self, names):
+        '''
+        Build the packed model inputs and padded labels of several strings, see collate_names.
+
+            Parameters:
+                names (list): lowercase strings to encode, each with at least one letter
+
+            Returns:
+                batch_x (torch.nn.utils.rnn.PackedSequence): packed batch of one-hot encoded strings
+                batch_y (torch.Tensor): padded/fixed-length batch of label encoded strings
+        '''
+
+        return collate_names(names)
+
+    def enable_prefix_cache(self, cache, checkpoint):
+        '''
+        Start every prediction from cached seed states where possible.
+        The checkpoint identifier must change whenever different weights are loaded into the model.
+
+            Parameters:
+                cache (PrefixCache): cache to read from and store new seed states in, None to only set the identifier
+                checkpoint (str): identifier of the weights currently loaded, e.g. the checkpoint path
+        '''
+
+        self.prefix_cache = cache
+        self.checkpoint = checkpoint
+
+    def _consume_seed(self, seed):
+        '''
+        Feed the whole seed through the LSTM once, starting from a zero state.
+        The result is read from and stored in the prefix cache if one is enabled.
+
+            Parameters:
+                seed (str): substring that the name should start with, may be empty
+
+            Returns:
+                logits_next (torch.Tensor): 1D tensor of logits for the letter following the seed
+                states (tuple): tensors of the LSTM states after the last seed letter
+        '''
+
+        if self.prefix_cache is not None:
+            entry = self.prefix_cache.get(self.checkpoint, seed)
+            if entry is not None:
+                return entry
+
+        # An empty seed starts from the zero state and its logits
+        state_h, state_c = self._init_states(1)
+        if seed:
+            x = self._name_inputs(seed)
+            y, (state_h, state_c) = self(x, (state_h, state_c), train=False)
+            logits_next = y[-1, :]
+        else:
+            logits_next = self.lin(state_h[-1])[0]
+        states = (state_h[:, 0, :], state_c[:, 0, :])
+
+        if self.prefix_cache is not None:
+            self.prefix_cache.put(self.checkpoint, seed, logits_next, states)
+        return logits_next, states
+
+    def consume_seeds(self, seeds):
+        '''
+        Feed several seeds of different lengths through the LSTM in one packed pass.
+        Uses the same padding and packing as the training batches (see collate_names).
+        Seeds found in the prefix cache are skipped and newly encoded seeds are stored in it.
+
+            Parameters:
+                seeds (list): distinct substrings to encode, possibly including the empty seed
+
+            Returns:
+                logits_next (torch.Tensor): 2D tensor of logits for the letter following each seed
+                states (tuple): tensors of the LSTM states after each seed's last letter
+        '''
+
+        entries = {}
+        if self.prefix_cache is not None:
+            for seed in seeds:
+                entry = self.prefix_cache.get(self.checkpoint, seed)
+                if entry is not None:
+                    entries[seed] = entry
+
+        # An empty seed starts from the zero state and its logits, the others are encoded together
+        if '' in seeds:
+            state_h, state_c = self._init_states()
+            entries[''] = (self.lin(state_h[-1].unsqueeze(0))[0], (state_h, state_c))
+        missing = [seed for seed in seeds if seed not in entries]
+        if missing:
+            batch_x, _ = self._name_batch(missing)
+            batch_x = batch_x.to(self.device)
+            _, (state_h, state_c) = self._run_lstm(batch_x, self._init_states(len(missing)))
+            logits_missing = self.lin(state_h[-1])
+            for row, seed in enumerate(missing):
+                entries[seed] = (logits_missing[row].clone(), (state_h[:, row, :].clone(), state_c[:, row, :].clone()))
+                if self.prefix_cache is not None:
+                    self.prefix_cache.put(self.checkpoint, seed, *entries[seed])
+
+        logits_next = torch.stack([entries[seed][0] for seed in seeds])
+        state_h = torch.stack([entries[seed][1][0] for seed in seeds], dim=1)
+        state_c = torch.stack([entries[seed][1][1] for seed in seeds], dim=1)
+        return logits_next, (state_h, state_c)
+
+    def _predict_incremental(self, seed, greedy, sampling=None):
+        '''
+        Stateful decoding loop: the seed is fed once, then only the newly chosen letter
+        is fed at each step, continuing from the carried LSTM state.
+
+            Parameters:
+                seed (str): substring that the name should start with
+                greedy (bool): pick the most likely letter instead of sampling
+                sampling (dict): keyword arguments for sample_letters when not greedy
+
+            Returns:
+                name (str): generated name
+                prob_total (float): probability of the chosen letters
+        '''
+
+        y_next, (state_h, state_c) = self._consume_seed(seed)
+        states = (state_h.unsqueeze(1), state_c.unsqueeze(1))
+
+        letters = [seed]
+        prob_total = 1
+        x_buffer = self.input_buffer(1)
+        while True:
+            if greedy:
+                probs_next = softmax(y_next, dim=0)    # convert logits to probabilities
+                letter_ind = int(probs_next.argmax())
+                prob_total *= float(probs_next[letter_ind])
+            else:
+                letter_ind = int(sample_letters(y_next.unsqueeze(0), **sampling)[0])
+            if letter_ind == 26:
+                break
+            letters.append(LETTER_DICT[letter_ind])
+            x = self.step_inputs(x_buffer, [letter_ind])
+            y, states = self(x, states, train=False)
+            y_next = y[-1, :]
+
+        return ''.join(letters), prob_total
+
+    def _decode_batch(self, logits_next, states, prefixes, sampling, known=None, constraints=None):
+        '''
+        Sample a batch of names at once and return them in row order, see _iter_decode.
+
+            Parameters:
+                logits_next (torch.Tensor): 2D tensor of next letter logits, one row per name
+                states (tuple): tensors of the LSTM states, batch along the second dimension
+                prefixes (list): strings each row has already generated (usually its seed)
+                sampling (dict): keyword arguments for sample_letters
+                known (KnownNames): names to avoid, None to disable novelty mode
+                constraints (Constraints): length, substring and suffix rules, None for no rules
+
+            Returns:
+                names (list): generated names, in the same order as the rows (None for dropped rows)
+        '''
+
+        names = [None] * len(prefixes)
+        for row, name in self._iter_decode(logits_next, states, prefixes, sampling, known, constraints):
+            names[row] = name
+        return names
+
+    def _iter_decode(self, logits_next, states, prefixes, sampling, known=None, constraints=None, emitted=None):
+        '''
+        Sample a batch of names at once, one row per name, all rows sharing each LSTM call.
+        Rows that generate a space are finished and dropped from the batch until no rows remain.
+        In novelty mode a row whose space would finish a known name, or a name already generated
+        in this batch, samples again from its other letters within the same step.
+        With constraints, disallowed letters are masked before sampling and rows left with no
+        allowed letter are dropped without a name.
+
+            Parameters:
+                logits_next (torch.Tensor): 2D tensor of next letter logits, one row per name
+                states (tuple): tensors of the LSTM states, batch along the second dimension
+                prefixes (list): strings each row has already generated (usually its seed)
+                sampling (dict): keyword arguments for sample_letters
+                known (KnownNames): names to avoid, None to disable novelty mode
+                constraints (Constraints): length, substring and suffix rules, None for no rules
+                emitted (set): names already generated that novelty mode must not repeat, updated in place
+
+            Returns:
+                names (generator): (row, name) pairs in the order rows finish, name is None for dropped rows
+        '''
+
+        state_h, state_c = states
+        n = len(prefixes)
+        letters = [[prefix] for prefix in prefixes]
+        accepted = 0
+        active = torch.arange(n)
+        if known is not None:
+            nodes = [known.node(prefix) for prefix in prefixes]
+            emitted = set() if emitted is None else emitted
+        if constraints is not None:
+            auto_states = torch.tensor([constraints.start(prefix) for prefix in prefixes])
+            lengths = torch.tensor([len(prefix) for prefix in prefixes])
+
+        x_buffer = self.input_buffer(n)
+        while True:
+            if constraints is not None:
+                logits_next = constraints.mask(logits_next, auto_states, lengths)
+                letter_inds = self._sample_allowed(logits_next, sampling)
+            else:
+                letter_inds = sample_letters(logits_next, **sampling)
+            if known is not None:
+                self._resample_known(logits_next, letter_inds, active, letters, nodes, known, emitted, sampling)
+            keep = (letter_inds != 26) & (letter_inds != -1)
+            for row, letter_ind in zip(active[keep].tolist(), letter_inds[keep].tolist()):
+                letters[row].append(LETTER_DICT[letter_ind])
+                if known is not None:
+                    nodes[row] = known.advance(nodes[row], LETTER_DICT[letter_ind])
+
+            # Hand over the finished rows
+            for row, letter_ind in zip(active[~keep].tolist(), letter_inds[~keep].tolist()):
+                if letter_ind == 26:
+                    accepted += 1
+                    yield row, ''.join(letters[row])
+                else:
+                    yield row, None
+
+            # Drop the finished rows
+            if not keep.all():
+                active = active[keep]
+                letter_inds = letter_inds[keep]
+                state_h = state_h[:, keep, :]
+                state_c = state_c[:, keep, :]
+                if constraints is not None:
+                    auto_states = auto_states[keep.cpu()]
+                    lengths = lengths[keep.cpu()]
+            if len(active) == 0:
+                break
+            if constraints is not None:
+                auto_states = constraints.advance(auto_states, letter_inds)
+                lengths += 1
+
+            x = self.step_inputs(x_buffer, letter_inds)
+            logits_next, (state_h, state_c) = self(x, (state_h, state_c), train=False)
+
+        if constraints is not None:
+            constraints.record(n, accepted)
+
+    @staticmethod
+    def _sample_allowed(logits, sampling):
+        '''
+        Sample like sample_letters, but return -1 for rows where every letter has been masked out.
+
+            Parameters:
+                logits (torch.Tensor): 2D tensor of masked next letter logits, one row per name
+                sampling (dict): keyword arguments for sample_letters
+
+            Returns:
+                letter_inds (torch.Tensor): 1D tensor of sampled letter indices, -1 for rows with no options
+        '''
+
+        alive = torch.isfinite(logits).any(dim=1)
+        if alive.all():
+            return sample_letters(logits, **sampling)
+        letter_inds = torch.full((len(logits),), -1, dtype=torch.long, device=logits.device)
+        if alive.any():
+            letter_inds[alive] = sample_letters(logits[alive], **sampling)
+        return letter_inds
+
+    @staticmethod
+    def _resample_known(logits_next, letter_inds, active, letters, nodes, known, emitted, sampling):
+        '''
+        Novelty check for one decoding step, see _decode_batch.
+        Finishing rows are accepted in order; a row that would finish a known or already emitted name
+        has its letter resampled in place with the space excluded.
+
+            Parameters:
+                logits_next (torch.Tensor): 2D tensor of next letter logits of the active rows
+                letter_inds (torch.Tensor): sampled letter indices of the active rows, updated in place
+                    (-1 when a rejected row has no other allowed letter)
+                active (torch.Tensor): original row number of each active row
+                letters (list): letters generated so far by each original row
+                nodes (list): trie node reached by each original row
+                known (KnownNames): names to avoid
+                emitted (set): names already finished in this batch, updated in place
+                sampling (dict): keyword arguments for sample_letters
+        '''
+
+        rejected = []
+        for pos in (letter_inds == 26).nonzero().flatten().tolist():
+            row = int(active[pos])
+            name = ''.join(letters[row])
+            if known.is_known(nodes[row]) or name in emitted:
+                rejected.append(pos)
+            else:
+                emitted.add(name)
+        if rejected:
+            rejected = torch.tensor(rejected, device=logits_next.device)
+            logits_rejected = logits_next[rejected].clone()
+            logits_rejected[:, 26] = -float('inf')
+            letter_inds[rejected] = LSTMGenerator._sample_allowed(logits_rejected, sampling)
+
+    def predict(self, seed, temperature=1.0, top_k=None, top_p=None, rng_seed=None, constraints=None):
         '''
         Given a desired output length and a starting input substring generate a random name.
         Selects each new letter randomly from the probabilities generated by the model.
@@ -137,31 +571,31 @@ class LSTMGenerator(nn.Module):
 
             Parameters:
                 seed (str): substring that the name should start with
+                temperature (float): sampling temperature, see sample_letters
+                top_k (int): sample only from the k most likely letters, see sample_letters
+                top_p (float): nucleus sampling threshold, see sample_letters
+                rng_seed (int): seed making the result reproducible, None for a random result
+                constraints (Constraints): length, substring and suffix rules applied while decoding
             
             Returns:
-                name (str): generated name
+                name (str): generated name (None if the constraints could not be satisfied)
         '''
 
+        # Constrained decoding is handled by the batched decoder with a batch of one
+        if constraints is not None:
+            names = self.predict_batch(seed, 1, temperature, top_k, top_p, rng_seed, constraints=constraints)
+            return names[0] if names else None
+
         # Prepare model for new prediction
         self.eval()
-        state_h = torch.zeros(self.num_layers, self.hidden_size)
-        state_c = torch.zeros(self.num_layers, self.hidden_size)
-
-        # Main prediction loop
-        name = seed
-        continue_generation = True
-        while continue_generation:
-            x = encode_onehot(name).T
-            x = torch.from_numpy(x).float()
-            y, (state_h, state_c) = self(x, (state_h, state_c), train=False)
-            y_next = y[-1, :]
-            probs_next = softmax(y_next, dim=0).detach().numpy()    # convert logits to probabilities
-            letter_ind = np.random.choice(27, p=probs_next)
-            letter = LETTER_DICT[letter_ind]
-            if letter == ' ':
-                continue_generation = False
-            else:
-                name += letter
+        with torch.inference_mode():
+            sampling = {
+                'temperature': temperature,
+                'top_k': top_k,
+                'top_p': top_p,
+                'generator': make_generator(rng_seed, self.device)
+            }
+            name, _ = self._predict_incremental(seed, greedy=False, sampling=sampling)
 
         return name
 
@@ -181,33 +615,303 @@ class LSTMGenerator(nn.Module):
 
         # Prepare model for new prediction
         self.eval()
-        state_h = torch.zeros(self.num_layers, self.hidden_size)
-        state_c = torch.zeros(self.num_layers, self.hidden_size)
-
-        # Main prediction loop
-        name = seed
-        prob_total = 1
-        continue_generation = True
-        while continue_generation:
-            x = encode_onehot(name).T
-            x = torch.from_numpy(x).float()
-            y, (state_h, state_c) = self(x, (state_h, state_c), train=False)
-            y_next = y[-1, :]
-            probs_next = softmax(y_next, dim=0).detach().numpy()    # convert logits to probabilities
-            letter_ind = int(probs_next.argmax())
-            prob = probs_next[letter_ind]
-            letter = LETTER_DICT[letter_ind]
-            prob_total *= prob
-            if letter == ' ':
-                continue_generation = False
-            else:
-                name += letter
+        with torch.inference_mode():
+            name, prob_total = self._predict_incremental(seed, greedy=True)
 
         return name, prob_total
 
+    def predict_batch(self, seed, n, temperature=1.0, top_k=None, top_p=None, rng_seed=None, novel=False,
+                      constraints=None):
+        '''
+        Given a starting input substring generate several random names together in one batch.
+        Equivalent to calling predict n times, but each step runs a single LSTM call for all
+        unfinished names, so the cost follows the longest name rather than n.
+
+            Parameters:
+                seed (str): substring that the names should start with
+                n (int): number of names to generate
+                temperature (float): sampling temperature, see sample_letters
+                top_k (int): sample only from the k most likely letters, see sample_letters
+                top_p (float): nucleus sampling threshold, see sample_letters
+                rng_seed (int): seed making the results reproducible, None for random results
+                novel (bool): only generate distinct names that are not real brand names
+                constraints (Constraints): length, substring and suffix rules applied while decoding;
+                    rows that cannot satisfy them are dropped, so fewer than n names may be returned
+
+            Returns:
+                names (list): generated names
+        '''
+
+        # Prepare model for new prediction
+        self.eval()
+        with torch.inference_mode():
+            y_next, (state_h, state_c) = self._consume_seed(seed)
+            logits_next = y_next.expand(n, -1)
+            state_h = state_h.unsqueeze(1).repeat(1, n, 1)
+            state_c = state_c.unsqueeze(1).repeat(1, n, 1)
+            sampling = {
+                'temperature': temperature,
+                'top_k': top_k,
+                'top_p': top_p,
+                'generator': make_generator(rng_seed, self.device)
+            }
+            known = load_known_names() if novel else None
+            names = self._decode_batch(logits_next, (state_h, state_c), [seed] * n, sampling, known, constraints)
+
+        names = [name for name in names if name is not None]
+        return names
+
+    def predict_seeds(self, seed_counts, temperature=1.0, top_k=None, top_p=None, rng_seed=None, novel=False,
+                      constraints=None):
+        '''
+        Generate random names for a whole list of seeds in one shared batch.
+        All distinct seeds are encoded together in a single packed LSTM pass, after which every
+        requested name is decoded in the same batch regardless of which seed it started from.
+
+            Parameters:
+                seed_counts (list): (seed, count) pairs giving how many names to generate per seed
+                temperature (float): sampling temperature, see sample_letters
+                top_k (int): sample only from the k most likely letters, see sample_letters
+                top_p (float): nucleus sampling threshold, see sample_letters
+                rng_seed (int): seed making the results reproducible, None for random results
+                novel (bool): only generate distinct names that are not real brand names
+                constraints (Constraints): length, substring and suffix rules applied while decoding;
+                    rows that cannot satisfy them are dropped, so lists may be shorter than requested
+
+            Returns:
+                names (list): one list of generated names per (seed, count) pair, in input order
+        '''
+
+        # Prepare model for new prediction
+        self.eval()
+        with torch.inference_mode():
+            prefixes = [seed for seed, count in seed_counts for _ in range(count)]
+            if not prefixes:
+                return [[] for _ in seed_counts]
+            seeds = list(dict.fromkeys(prefixes))
+            seed_rows = {seed: row for row, seed in enumerate(seeds)}
+            logits_seeds, (state_h, state_c) = self.consume_seeds(seeds)
+
+            # Expand each seed's state into one row per requested name
+            rows = torch.tensor([seed_rows[seed] for seed in prefixes], device=logits_seeds.device)
+            states = (state_h.index_select(1, rows), state_c.index_select(1, rows))
+            sampling = {
+                'temperature': temperature,
+                'top_k': top_k,
+                'top_p': top_p,
+                'generator': make_generator(rng_seed, self.device)
+            }
+            known = load_known_names() if novel else None
+            flat_names = self._decode_batch(logits_seeds.index_select(0, rows), states, prefixes, sampling, known,
+                                            constraints)
+
+        # Split the flat batch back up by request
+        names = []
+        start = 0
+        for _, count in seed_counts:
+            names.append([name for name in flat_names[start:start + count] if name is not None])
+            start += count
+
+        return names
+
+    def iter_names(self, seed, n, chunk_size=256, temperature=1.0, top_k=None, top_p=None, rng_seed=None,
+                   novel=False, constraints=None):
+        '''
+        Given a starting input substring generate random names, yielding each one as soon as it finishes.
+        The seed is fed once, then names are decoded in batches of at most chunk_size rows, so the time to
+        the first name does not grow with n. Names from one batch arrive in the order they finish (shortest first).
+
+            Parameters:
+                seed (str): substring that the names should start with
+                n (int): number of names to generate
+                chunk_size (int): maximum number of names decoded together
+                temperature (float): sampling temperature, see sample_letters
+                top_k (int): sample only from the k most likely letters, see sample_letters
+                top_p (float): nucleus sampling threshold, see sample_letters
+                rng_seed (int): seed making the results reproducible, None for random results
+                novel (bool): only generate distinct names that are not real brand names (across all chunks)
+                constraints (Constraints): length, substring and suffix rules applied while decoding;
+                    rows that cannot satisfy them are skipped, so fewer than n names may be yielded
+
+            Returns:
+                names (generator): generated names
+        '''
+
+        # Prepare model for new prediction, the seed is fed once for every chunk
+        self.eval()
+        generator = make_generator(rng_seed, self.device)
+        known = load_known_names() if novel else None
+        emitted = set()
+        sampling = {
+            'temperature': temperature,
+            'top_k': top_k,
+            'top_p': top_p,
+            'generator': generator
+        }
+        with torch.inference_mode():
+            y_next, (seed_h, seed_c) = self._consume_seed(seed)
+        for start in range(0, n, chunk_size):
+            size = min(chunk_size, n - start)
+            with torch.inference_mode():
+                logits_next = y_next.expand(size, -1)
+                state_h = seed_h.unsqueeze(1).repeat(1, size, 1)
+                state_c = seed_c.unsqueeze(1).repeat(1, size, 1)
+            finished = self._iter_decode(logits_next, (state_h, state_c), [seed] * size, sampling, known,
+                                         constraints, emitted)
+
+            # Decode under inference mode but hand each name over outside of it, so the caller's
+            # code between names does not run in inference mode
+            while True:
+                with torch.inference_mode():
+                    item = next(finished, None)
+                if item is None:
+                    break
+                if item[1] is not None:
+                    yield item[1]
+
+    def predict_beam(self, seed, k=5, max_length=30):
+        '''
+        Given a starting input substring find the k most likely complete names using beam search.
+        All live beams advance together in one batched LSTM call per step. A name is complete once
+        a space is generated; beams reaching max_length without one are dropped, and the search
+        stops early once no live beam can beat the k-th best complete name.
+
+            Parameters:
+                seed (str): substring that the names should start with
+                k (int): number of names to return (and number of beams kept)
+                max_length (int): maximum length of a returned name, including the seed
+
+            Returns:
+                results (list): up to k (name, log_prob) pairs, most likely first
+        '''
+
+        # Prepare model for new prediction
+        self.eval()
+        with torch.inference_mode():
+            y_next, (state_h, state_c) = self._consume_seed(seed)
+            logits_next = y_next.unsqueeze(0)
+            state_h = state_h.unsqueeze(1)
+            state_c = state_c.unsqueeze(1)
+            beam_names = [seed]
+            beam_scores = torch.zeros(1, dtype=torch.float64, device=logits_next.device)
+            finished = []
+
+            x_buffer = self.input_buffer(k)
+            for length in range(len(seed), max_length + 1):
+
+                # Score every one-letter extension of every beam, in float64 to avoid underflow
+                scores = beam_scores.unsqueeze(1) + log_softmax(logits_next.double(), dim=1)
+                if length == max_length:
+                    scores[:, :26] = -float('inf')     # at the length limit only the space can follow
+                top_scores, top_inds = scores.flatten().topk(min(2 * k, scores.numel()))
+                beam_inds = (top_inds // 27).tolist()
+                letter_inds = (top_inds % 27).tolist()
+
+                # Split candidates into complete names and beams to extend
+                keep_beams, keep_letters, keep_scores = [], [], []
+                for score, beam_ind, letter_ind in zip(top_scores.tolist(), beam_inds, letter_inds):
+                    if score == -float('inf'):
+                        continue
+                    elif letter_ind == 26:
+                        finished.append((beam_names[beam_ind], score))
+                    elif len(keep_beams) < k:
+                        keep_beams.append(beam_ind)
+                        keep_letters.append(letter_ind)
+                        keep_scores.append(score)
+                finished = sorted(finished, key=lambda x: x[1], reverse=True)[:k]
+
+                # Prune once the best live beam cannot enter the top k
+                if not keep_beams or (len(finished) == k and keep_scores[0] <= finished[-1][1]):
+                    break
+
+                beam_names = [beam_names[b] + LETTER_DICT[l] for b, l in zip(keep_beams, keep_letters)]
+                beam_scores = torch.tensor(keep_scores, dtype=torch.float64, device=logits_next.device)
+                rows = torch.tensor(keep_beams, device=logits_next.device)
+                state_h = state_h.index_select(1, rows)
+                state_c = state_c.index_select(1, rows)
+                x = self.step_inputs(x_buffer, torch.tensor(keep_letters))
+                logits_next, (state_h, state_c) = self(x, (state_h, state_c), train=False)
+
+        return finished
+
+    def iter_scores(self, names, chunk_size=1024):
+        '''
+        Score names under the model, yielding one result per name in input order.
+        Names are processed in chunks, each as one packed forward pass like a training batch, so
+        memory stays constant for arbitrarily long (or lazily generated) name lists.
+        As in training, the first letter is given and every following letter plus the terminating
+        space is predicted, so a name of length n has n surprisal values.
+
+            Parameters:
+                names (iterable): lowercase names to score
+                chunk_size (int): number of names per forward pass
+
+            Returns:
+                scores (generator): (log_likelihood, surprisal) pairs, where log_likelihood (float) is the
+                    natural log probability of the name and surprisal (np.array) is -log p per predicted letter
+        '''
+
+        chunk = []
+        for name in names:
+            chunk.append(name)
+            if len(chunk) == chunk_size:
+                yield from self._score_chunk(chunk)
+                chunk = []
+        if chunk:
+            yield from self._score_chunk(chunk)
+
+    def _score_chunk(self, names):
+        '''
+        Score one chunk of names in a single packed forward pass.
+
+            Parameters:
+                names (list): lowercase names to score
+
+            Returns:
+                scores (list): (log_likelihood, surprisal) pairs, see iter_scores
+        '''
+
+        self.eval()
+        with torch.inference_mode():
+            batch_x, batch_y = self._name_batch([name + ' ' for name in names])
+            batch_x = batch_x.to(self.device)
+            batch_y = batch_y.to(self.device)
+            pred_y, _ = self(batch_x, self._init_states(len(names)))
+
+            # Log probability of each actual next letter, padding positions masked out
+            log_probs = log_softmax(pred_y.double(), dim=1).reshape(len(names), -1, 27)
+            targets = batch_y[:, 1:]
+            mask = targets != -1
+            picked = log_probs[:, :-1, :].gather(2, targets.clamp(min=0).unsqueeze(2)).squeeze(2)
+            surprisal = (-picked * mask).cpu().numpy()
+            lengths = mask.sum(dim=1).tolist()
+
+        return [(-float(row[:length].sum()), row[:length]) for row, length in zip(surprisal, lengths)]
+
+    def score(self, names, chunk_size=1024):
+        '''
+        Score a list of names under the model, see iter_scores for details.
+
+            Parameters:
+                names (iterable): lowercase names to score
+                chunk_size (int): number of names per forward pass
+
+            Returns:
+                log_likelihoods (np.array): natural log probability of each name
+                surprisals (list): arrays of -log p per predicted letter of each name
+        '''
+
+        log_likelihoods = []
+        surprisals = []
+        for log_likelihood, surprisal in self.iter_scores(names, chunk_size):
+            log_likelihoods.append(log_likelihood)
+            surprisals.append(surprisal)
+
+        return np.array(log_likelihoods), surprisals
+
 
 # Define our training function
-def train(dataset, model, batch_size, epochs, lr, space_weight=1):
+def train(dataset, model, batch_size, epochs, lr, space_weight=1, collate_fn=collate_pad, batch_sampler=None):
     '''
     Train an instance of the LSTMGenerator model class defined above.
 
@@ -219,11 +923,20 @@ def train(dataset, model, batch_size, epochs, lr, space_weight=1):
             lr (float): learning rate of the optimizer
             space_weight (float): weight in the loss function given to space character,
                 < 1 indicates predict less spaces, > 1 indicates predict more spaces
+            collate_fn (function): batch collation function of the dataset, collate_corpus for a CorpusDataset
+            batch_sampler (BucketBatchSampler): optional sampler choosing the names of each batch, replacing
+                the fixed order batches of batch_size names
+
+        Returns:
+            avg_loss (float): average batch loss of the last epoch
     '''
 
     # Initialize model, data, optimizer, and loss function
     model = model.to(device)
-    dataloader = DataLoader(dataset, batch_size=batch_size, collate_fn=collate_pad)
+    if batch_sampler is None:
+        dataloader = DataLoader(dataset, batch_size=batch_size, collate_fn=collate_fn)
+    else:
+        dataloader = DataLoader(dataset, batch_sampler=batch_sampler, collate_fn=collate_fn)
     optimizer = optim.Adam(model.parameters(), lr=lr)
     weights = torch.ones(27).to(device)
     weights[26] = space_weight
@@ -235,6 +948,10 @@ def train(dataset, model, batch_size, epochs, lr, space_weight=1):
         model.train()
         train_loss = 0
         train_counter = 0
+        num_names = 0
+        num_letters = 0
+        num_padded = 0
+        start_time = time.perf_counter()
         state_h = torch.zeros(model.num_layers, batch_size, model.hidden_size).to(device)
         state_c = torch.zeros(model.num_layers, batch_size, model.hidden_size).to(device)
 
@@ -243,6 +960,11 @@ def train(dataset, model, batch_size, epochs, lr, space_weight=1):
             batch_x = batch_x.to(device)
             batch_y = batch_y.to(device)
 
+            # Batches of another size than the carried states start from zero states
+            if state_h.shape[1] != len(batch_y):
+                state_h = torch.zeros(model.num_layers, len(batch_y), model.hidden_size).to(device)
+                state_c = torch.zeros(model.num_layers, len(batch_y), model.hidden_size).to(device)
+
             # Forward propagation and assessment of loss
             optimizer.zero_grad()
             pred_y, (state_h, state_c) = model(batch_x, (state_h, state_c))
@@ -262,11 +984,48 @@ def train(dataset, model, batch_size, epochs, lr, space_weight=1):
 
             train_loss += loss.item()
             train_counter += 1
+            num_names += len(batch_y)
+            num_letters += len(padded_indices)
+            num_padded += batch_y.numel()
 
+        # Throughput, and share of the padded batches that is padding
+        epoch_time = time.perf_counter() - start_time
         avg_loss = train_loss/train_counter
-        print(device, {'epoch': epoch, 'avg_loss': avg_loss})
+        print(device, {
+            'epoch': epoch,
+            'avg_loss': avg_loss,
+            'names_per_sec': round(num_names / epoch_time, 1),
+            'letters_per_sec': round(num_letters / epoch_time, 1),
+            'padding_ratio': round(1 - num_letters / num_padded, 4)
+        })
+
+    return avg_loss
             
 
+def save_model(model, metadata, directory=TRAINED_DIR):
+    '''
+    Save a trained model as a .pt checkpoint named after its hyperparameters, with the hyperparameters
+    in a .json file alongside for the model registry.
+
+        Parameters:
+            model (LSTMGenerator or EmbeddingLSTMGenerator): trained model
+            metadata (dict): hyperparameters, at least the ones in the checkpoint name (see format_checkpoint_name)
+            directory (str): directory to save into
+
+        Returns:
+            path (str): path of the saved checkpoint
+    '''
+
+    mname = format_checkpoint_name(metadata['num_layers'], metadata['hidden_size'], metadata['batch_size'],
+                                   metadata['epochs'], metadata['space_weight'])
+    path = os.path.join(directory, f'{mname}.pt')
+    state_dict = model.onehot_state_dict() if hasattr(model, 'onehot_state_dict') else model.state_dict()
+    torch.save(state_dict, path)
+    with open(os.path.join(directory, f'{mname}.json'), 'w') as f:
+        json.dump(metadata, f, indent=4)
+    return path
+
+
 # Train and export a model if the file is called directly
 def main():
     '''Main execution function: if file is called directly, train and export a model.'''
@@ -279,18 +1038,27 @@ def main():
     learning_rate = 0.01
     space_weight = 0.05
 
-    # Name of file for saving
-    mname = f'lstm{lstm_layers}_hs{hidden_size}_bs{batch_size}_ep{epochs}_sw{"-".join(str(space_weight).split("."))}'
-
-    # Instantiate dataset and model
-    with open('data/names_clean.json', 'r') as f:
-        names = json.load(f)
-    dataset = BrandNameDataset(names)
-    model = LSTMGenerator(hidden_size, lstm_layers)
+    # Instantiate dataset (pre-encoded once from data/names_clean.json, see corpus.py) and model,
+    # trained on letter indices and saved in the one-hot layout that every model format loads
+    from models.embedding import EmbeddingLSTMGenerator, collate_indices
+    if corpus_is_stale():
+        build_corpus()
+    dataset = CorpusDataset()
+    batch_sampler = BucketBatchSampler(dataset.lengths(), batch_size, seed=0)
+    model = EmbeddingLSTMGenerator(hidden_size, lstm_layers)
 
-    # Train and save the model
-    train(dataset, model, batch_size, epochs, learning_rate, space_weight)
-    torch.save(model.state_dict(), f'models/trained/{mname}.pt')
+    # Train and save the model, with its hyperparameters alongside for the model registry
+    train(dataset, model, batch_size, epochs, learning_rate, space_weight, collate_fn=collate_indices,
+          batch_sampler=batch_sampler)
+    metadata = {
+        'num_layers': lstm_layers,
+        'hidden_size': hidden_size,
+        'batch_size': batch_size,
+        'epochs': epochs,
+        'learning_rate': learning_rate,
+        'space_weight': space_weight
+    }
+    save_model(model, metadata)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,194 @@
+import numpy as np
+import glob
+import json
+import sys
+import os
+
+# Custom module imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from models.utils import ALPHABET
+from models.registry import TRAINED_DIR
+
+# Letters of the one-hot inputs and outputs in index order, the space ends a name
+VOCABULARY = ''.join(ALPHABET) + ' '
+
+# File layout: magic, header length (little endian uint64), JSON header, then every tensor
+# as a contiguous little endian buffer starting on an ALIGNMENT byte boundary
+MAGIC = b'RXLSTM01'
+ALIGNMENT = 64
+
+
+def _aligned(offset):
+    '''Round an offset up to the next ALIGNMENT byte boundary.'''
+
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def save_mmap(arrays, path, metadata):
+    '''
+    Write named arrays into a memory-mappable checkpoint file.
+
+        Parameters:
+            arrays (dict): float32 NumPy arrays keyed by state dict name
+            path (str): path of the file to write
+            metadata (dict): JSON serializable model description stored in the header
+    '''
+
+    tensors = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array, dtype='<f4')
+        tensors[name] = {'shape': list(array.shape), 'offset': offset, 'nbytes': array.nbytes}
+        offset = _aligned(offset + array.nbytes)
+    header = json.dumps({**metadata, 'dtype': 'float32', 'tensors': tensors}).encode()
+
+    # Tensor offsets are relative to the aligned end of the header
+    data_start = _aligned(len(MAGIC) + 8 + len(header))
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, 'little'))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + tensors[name]['offset'])
+            f.write(np.ascontiguousarray(array, dtype='<f4').tobytes())
+        f.truncate(data_start + offset)
+
+
+def read_header(path):
+    '''
+    Read the header of a memory-mappable checkpoint without touching the weights.
+
+        Parameters:
+            path (str): path of the checkpoint file
+
+        Returns:
+            header (dict): model description and tensor layout
+            data_start (int): byte offset of the first tensor
+    '''
+
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a memory-mappable RX checkpoint')
+        header_length = int.from_bytes(f.read(8), 'little')
+        header = json.loads(f.read(header_length))
+    data_start = _aligned(len(MAGIC) + 8 + header_length)
+    return header, data_start
+
+
+def load_mmap_arrays(path):
+    '''
+    Memory-map the tensors of a checkpoint. Nothing is read until a tensor is used, and every
+    process mapping the same file shares one copy of it in the page cache. The mapping is
+    copy-on-write, so the arrays are writable without ever changing the file.
+
+        Parameters:
+            path (str): path of the checkpoint file
+
+        Returns:
+            header (dict): model description and tensor layout
+            arrays (dict): float32 NumPy arrays backed by the file, keyed by state dict name
+    '''
+
+    header, data_start = read_header(path)
+    buffer = np.memmap(path, dtype=np.uint8, mode='c')
+    arrays = {}
+    for name, tensor in header['tensors'].items():
+        start = data_start + tensor['offset']
+        arrays[name] = buffer[start:start + tensor['nbytes']].view('<f4').reshape(tensor['shape'])
+    return header, arrays
+
+
+def load_mmap(path):
+    '''
+    Load an LSTMGenerator whose parameters are the memory-mapped buffers of the file, so load time
+    does not depend on the model size and the weights are not copied into the process.
+
+        Parameters:
+            path (str): path of the checkpoint file
+
+        Returns:
+            model (LSTMGenerator): model backed by the file, on the CPU
+    '''
+
+    import torch
+    from models.lstm import LSTMGenerator
+
+    header, arrays = load_mmap_arrays(path)
+    if header['vocabulary'] != VOCABULARY:
+        raise ValueError(f'{path} was trained on a different vocabulary')
+
+    # Build the modules without allocating weights, then adopt the mapped buffers as parameters
+    with torch.device('meta'):
+        model = LSTMGenerator(header['hidden_size'], header['num_layers'])
+    state_dict = {name: torch.from_numpy(array) for name, array in arrays.items()}
+    model.load_state_dict(state_dict, assign=True)
+    return model
+
+
+def export_mmap(pt_path, mmap_path=None):
+    '''
+    Convert a trained LSTMGenerator .pt checkpoint into the memory-mappable format.
+    The header records the shape read from the weights, the vocabulary, and the training
+    hyperparameters known to the model registry (from a .json file or the file name).
+
+        Parameters:
+            pt_path (str): path of the .pt checkpoint to convert
+            mmap_path (str): path of the file to write, defaults to pt_path with a .rxw extension
+
+        Returns:
+            mmap_path (str): path of the written file
+    '''
+
+    import torch
+    from models.registry import read_checkpoint_info
+
+    if mmap_path is None:
+        mmap_path = os.path.splitext(pt_path)[0] + '.rxw'
+    state_dict = torch.load(pt_path, map_location='cpu')
+    arrays = {name: tensor.numpy() for name, tensor in state_dict.items()}
+    info = read_checkpoint_info(pt_path) or {}
+    hyperparameters = {
+        key: info[key] for key in ('batch_size', 'epochs', 'learning_rate', 'space_weight') if key in info
+    }
+    metadata = {
+        'hidden_size': arrays['lin.weight'].shape[1],
+        'num_layers': len([name for name in arrays if name.startswith('lstm.weight_ih_l')]),
+        'vocabulary': VOCABULARY,
+        'hyperparameters': hyperparameters
+    }
+    save_mmap(arrays, mmap_path, metadata)
+    return mmap_path
+
+
+def export_pt(mmap_path, pt_path=None):
+    '''
+    Convert a memory-mappable checkpoint back into a regular .pt state dict.
+
+        Parameters:
+            mmap_path (str): path of the checkpoint to convert
+            pt_path (str): path of the .pt file to write, defaults to mmap_path with a .pt extension
+
+        Returns:
+            pt_path (str): path of the written file
+    '''
+
+    import torch
+
+    if pt_path is None:
+        pt_path = os.path.splitext(mmap_path)[0] + '.pt'
+    _, arrays = load_mmap_arrays(mmap_path)
+    state_dict = {name: torch.from_numpy(np.array(array)) for name, array in arrays.items()}
+    torch.save(state_dict, pt_path)
+    return pt_path
+
+
+def main():
+    '''Main execution function: if file is called directly, convert every float checkpoint to the mmap format.'''
+
+    for pt_path in sorted(glob.glob(os.path.join(TRAINED_DIR, '*.pt'))):
+        if not pt_path.endswith('_int8.pt'):     # quantized checkpoints have no float weights to export
+            print(export_mmap(pt_path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+import json
+import glob
+import string
+import sys
+import os
+from functools import lru_cache
+
+# Custom module imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from models.registry import REPO_ROOT
+
+# Files holding the names of real drugs: the training corpus and the raw scraped lists in data/raw
+DATA_DIR = os.path.join(REPO_ROOT, 'data')
+
+
+def known_name_files():
+    '''
+    Find the JSON files holding the names of real drugs, relative to the repository.
+
+        Returns:
+            paths (tuple): the training corpus followed by the raw scraped lists, sorted
+    '''
+
+    raw_files = sorted(glob.glob(os.path.join(DATA_DIR, 'raw', '*.json')))
+    return (os.path.join(DATA_DIR, 'names_clean.json'),) + tuple(raw_files)
+
+
+def normalize_name(name):
+    '''
+    Clean a raw scraped name the same way as data/clean.ipynb (first word, lowercase, longest
+    hyphen-separated part, no commas or accents).
+
+        Parameters:
+            name (str): raw brand name
+
+        Returns:
+            name (str): cleaned name, or None if it still contains non-letters
+    '''
+
+    name = name.split(' ')[0].lower()
+    name = max(name.split('-'), key=len)
+    name = name.strip().replace(',', '').replace('é', 'e')
+    if not name or set(name).difference(string.ascii_lowercase):
+        return None
+    return name
+
+
+class KnownNames:
+    '''
+    Hash set and prefix trie of real brand names, used to keep generated names novel.
+    The trie lets a decoder follow each name letter by letter and check whether it is complete
+    and known in constant time; the set answers whole-name lookups.
+
+        Attributes:
+            names (frozenset): all known names
+            trie (dict): nested dicts keyed by letter, a ' ' key marks the end of a known name
+
+        Methods:
+            node: trie node reached by a prefix
+            advance: trie node reached by adding one letter
+            is_known: check if a trie node ends a known name
+    '''
+
+    def __init__(self, names):
+        '''
+        Construct the object.
+
+            Parameters:
+                names (iterable): lowercase names to treat as known
+        '''
+
+        self.names = frozenset(names)
+        self.trie = {}
+        for name in self.names:
+            node = self.trie
+            for letter in name:
+                node = node.setdefault(letter, {})
+            node[' '] = {}
+
+    def __contains__(self, name):
+        '''Check if a whole name is known.'''
+
+        return name in self.names
+
+    def node(self, prefix):
+        '''
+        Find the trie node reached by a prefix.
+
+            Parameters:
+                prefix (str): start of a name
+
+            Returns:
+                node (dict): trie node, or None if no known name starts with the prefix
+        '''
+
+        node = self.trie
+        for letter in prefix:
+            node = node.get(letter)
+            if node is None:
+                break
+        return node
+
+    @staticmethod
+    def advance(node, letter):
+        '''
+        Follow one letter down the trie.
+
+            Parameters:
+                node (dict): current trie node, None once off the trie
+                letter (str): letter added to the name
+
+            Returns:
+                node (dict): next trie node, or None if no known name continues this way
+        '''
+
+        return None if node is None else node.get(letter)
+
+    @staticmethod
+    def is_known(node):
+        '''Check if the name that led to a trie node is a complete known name.'''
+
+        return node is not None and ' ' in node
+
+
+@lru_cache(maxsize=None)
+def load_known_names(paths=None):
+    '''
+    Load and normalize the real brand names from the training corpus and the raw scraped lists.
+    Loaded once per process.
+
+        Parameters:
+            paths (tuple): JSON files containing lists of names, None for known_name_files()
+
+        Returns:
+            known (KnownNames): set and trie of the known names
+    '''
+
+    names = set()
+    for path in paths or known_name_files():
+        with open(path, 'r') as f:
+            names.update(filter(None, map(normalize_name, json.load(f))))
+    return KnownNames(names)
@@ -0,0 +1,451 @@
+import numpy as np
+import glob
+import sys
+import os
+
+# Custom module imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from models.utils import encode_label, LETTER_DICT
+from models.novelty import load_known_names
+from models.registry import TRAINED_DIR
+
+
+def export_npz(pt_path, npz_path=None):
+    '''
+    Convert a trained LSTMGenerator state dict into a compact float32 .npz file.
+    This is the only part of the module that needs torch.
+
+        Parameters:
+            pt_path (str): path of the .pt checkpoint to convert
+            npz_path (str): path of the .npz file to write, defaults to pt_path with a .npz extension
+
+        Returns:
+            npz_path (str): path of the written file
+    '''
+
+    import torch
+
+    if npz_path is None:
+        npz_path = os.path.splitext(pt_path)[0] + '.npz'
+    state_dict = torch.load(pt_path, map_location='cpu')
+    arrays = {key: value.numpy().astype(np.float32) for key, value in state_dict.items()}
+    np.savez(npz_path, **arrays)
+    return npz_path
+
+
+def sigmoid(x):
+    '''Logistic function, computed through tanh for numerical stability.'''
+
+    return 0.5 * (np.tanh(0.5 * x) + 1)
+
+
+def log_softmax_np(logits):
+    '''Row-wise log softmax of a 2D array of logits.'''
+
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    return shifted - np.log(np.exp(shifted).sum(axis=1, keepdims=True))
+
+
+def sample_letters_np(logits, rng, temperature=1.0, top_k=None, top_p=None):
+    '''
+    Sample one letter index per row of next letter logits, NumPy version of lstm.sample_letters.
+
+        Parameters:
+            logits (np.array): 2D array of next letter logits, one row per name
+            rng (np.random.Generator): random number generator to sample with
+            temperature (float): divides the logits, < 1 sharpens and > 1 flattens the distribution, 0 is greedy
+            top_k (int): only sample from the k most likely letters (None to disable)
+            top_p (float): only sample from the smallest set of letters with total probability >= top_p (None to disable)
+
+        Returns:
+            letter_inds (np.array): 1D array of sampled letter indices
+    '''
+
+    if temperature == 0:
+        return logits.argmax(axis=1)
+    logits = logits / temperature
+    if top_k is not None and top_k < logits.shape[1]:
+        kth_best = -np.partition(-logits, top_k - 1, axis=1)[:, top_k - 1:top_k]
+        logits = np.where(logits < kth_best, -np.inf, logits)
+    probs = np.exp(log_softmax_np(logits))
+    if top_p is not None and top_p < 1:
+        order = np.argsort(-probs, axis=1, kind='stable')
+        sorted_probs = np.take_along_axis(probs, order, axis=1)
+        tail = np.cumsum(sorted_probs, axis=1) - sorted_probs >= top_p
+        np.put_along_axis(probs, order, np.where(tail, 0, sorted_probs), axis=1)
+
+    # Inverse CDF sampling, one uniform draw per row
+    cumulative = np.cumsum(probs, axis=1)
+    draws = rng.random((len(probs), 1)) * cumulative[:, -1:]
+    letter_inds = np.minimum((cumulative < draws).sum(axis=1), logits.shape[1] - 1)
+    return letter_inds
+
+
+class NumpyLSTMGenerator:
+    '''
+    Pure NumPy inference engine matching LSTMGenerator, for serving without torch.
+    Loads weights exported with export_npz and reproduces the model's decoding methods.
+    Samples are drawn from NumPy random generators, so a given rng_seed gives different (but
+    equally reproducible) names than the torch model.
+
+        Attributes:
+            hidden_size (int): the number of features in the hidden state of the LSTM
+            num_layers (int): number of stacked LSTM layers
+            w_ih (list): per layer input weights, transposed for row-major matmuls
+            w_hh (list): per layer hidden weights, transposed for row-major matmuls
+            bias (list): per layer sum of the input and hidden biases
+            lin_w (np.array): transposed output layer weights
+            lin_b (np.array): output layer bias
+            prefix_cache (PrefixCache): optional cache of LSTM states after consuming a seed
+            checkpoint (str): identifier of the loaded weights, used as part of the cache key
+
+        Methods:
+            enable_prefix_cache: start predictions from cached seed states
+            predict: generate a random name given a seed phrase
+            predict_max: generate the most likely name given a seed phrase
+            predict_batch: generate several random names at once given a seed phrase
+            iter_names: generate random names, yielding each as soon as it is finished
+            predict_beam: find the k most likely names given a seed phrase using beam search
+    '''
+
+    def __init__(self, npz_path):
+        '''
+        Construct the object.
+
+            Parameters:
+                npz_path (str): path of a .npz file written by export_npz
+        '''
+
+        with np.load(npz_path) as weights:
+            self.num_layers = len([key for key in weights.files if key.startswith('lstm.weight_ih_l')])
+            self.hidden_size = weights['lin.weight'].shape[1]
+            self.w_ih = [np.ascontiguousarray(weights[f'lstm.weight_ih_l{l}'].T) for l in range(self.num_layers)]
+            self.w_hh = [np.ascontiguousarray(weights[f'lstm.weight_hh_l{l}'].T) for l in range(self.num_layers)]
+            self.bias = [weights[f'lstm.bias_ih_l{l}'] + weights[f'lstm.bias_hh_l{l}'] for l in range(self.num_layers)]
+            self.lin_w = np.ascontiguousarray(weights['lin.weight'].T)
+            self.lin_b = weights['lin.bias']
+        self.prefix_cache = None
+        self.checkpoint = None
+
+    def enable_prefix_cache(self, cache, checkpoint):
+        '''
+        Start every prediction from cached seed states where possible.
+
+            Parameters:
+                cache (PrefixCache): cache to read from and store new seed states in, None to only set the identifier
+                checkpoint (str): identifier of the weights currently loaded, e.g. the .npz path
+        '''
+
+        self.prefix_cache = cache
+        self.checkpoint = checkpoint
+
+    def _step(self, letter_inds, states):
+        '''
+        Advance the LSTM by one letter for every row of a batch.
+        The first layer's input is one-hot, so its input matmul is just a row lookup.
+
+            Parameters:
+                letter_inds (np.array): 1D array of input letter indices, one per row
+                states (tuple): (state_h, state_c) arrays of shape (num_layers, batch, hidden_size)
+
+            Returns:
+                logits_next (np.array): 2D array of next letter logits, one row per name
+                states (tuple): new (state_h, state_c) arrays
+        '''
+
+        state_h, state_c = states
+        new_h = np.empty_like(state_h)
+        new_c = np.empty_like(state_c)
+        x = None
+        hs = self.hidden_size
+        for layer in range(self.num_layers):
+            if layer == 0:
+                gates = self.w_ih[0][letter_inds]
+            else:
+                gates = x @ self.w_ih[layer]
+            gates = gates + state_h[layer] @ self.w_hh[layer] + self.bias[layer]
+
+            # Gate order follows torch.nn.LSTM: input, forget, cell, output
+            i = sigmoid(gates[:, :hs])
+            f = sigmoid(gates[:, hs:2 * hs])
+            g = np.tanh(gates[:, 2 * hs:3 * hs])
+            o = sigmoid(gates[:, 3 * hs:])
+            new_c[layer] = f * state_c[layer] + i * g
+            new_h[layer] = o * np.tanh(new_c[layer])
+            x = new_h[layer]
+
+        logits_next = x @ self.lin_w + self.lin_b
+        return logits_next, (new_h, new_c)
+
+    def _consume_seed(self, seed):
+        '''
+        Feed the whole seed through the LSTM once, starting from a zero state.
+
+            Parameters:
+                seed (str): substring that the name should start with, may be empty
+
+            Returns:
+                logits_next (np.array): 1D array of logits for the letter following the seed
+                states (tuple): (state_h, state_c) arrays of shape (num_layers, hidden_size)
+        '''
+
+        if self.prefix_cache is not None:
+            entry = self.prefix_cache.get(self.checkpoint, seed)
+            if entry is not None:
+                return entry
+
+        # An empty seed starts from the zero state and its logits
+        shape = (self.num_layers, 1, self.hidden_size)
+        states = (np.zeros(shape, dtype=np.float32), np.zeros(shape, dtype=np.float32))
+        logits_next = states[0][-1] @ self.lin_w + self.lin_b
+        for letter_ind in encode_label(seed):
+            logits_next, states = self._step(np.array([letter_ind]), states)
+        logits_next, states = logits_next[0], (states[0][:, 0, :], states[1][:, 0, :])
+
+        if self.prefix_cache is not None:
+            self.prefix_cache.put(self.checkpoint, seed, logits_next, states)
+        return logits_next, states
+
+    def _expand_seed(self, seed, n, seed_state=None):
+        '''
+        Consume a seed and repeat its state into a batch of n rows.
+
+            Parameters:
+                seed (str): substring that the names should start with
+                n (int): number of rows
+                seed_state (tuple): logits and states of the seed from _consume_seed, None to consume it here
+
+            Returns:
+                logits_next (np.array): 2D array of next letter logits, one row per name
+                states (tuple): (state_h, state_c) arrays of shape (num_layers, n, hidden_size)
+        '''
+
+        logits_next, (state_h, state_c) = seed_state or self._consume_seed(seed)
+        logits_next = np.repeat(logits_next[None, :], n, axis=0)
+        state_h = np.repeat(state_h[:, None, :], n, axis=1)
+        state_c = np.repeat(state_c[:, None, :], n, axis=1)
+        return logits_next, (state_h, state_c)
+
+    def _iter_decode(self, seed, n, rng, sampling, known=None, emitted=None, seed_state=None):
+        '''
+        Sample a batch of names at once, yielding each row as soon as it finishes.
+        Rows that generate a space are finished and dropped from the batch until no rows remain.
+        In novelty mode a row whose space would finish a known or already generated name samples
+        again from its other letters within the same step, as in LSTMGenerator.
+
+            Parameters:
+                seed (str): substring that the names should start with
+                n (int): number of names to generate
+                rng (np.random.Generator): random number generator to sample with
+                sampling (dict): temperature, top_k and top_p keyword arguments for sample_letters_np
+                known (KnownNames): names to avoid, None to disable novelty mode
+                emitted (set): names already generated that novelty mode must not repeat, updated in place
+                seed_state (tuple): logits and states of the seed from _consume_seed, None to consume it here
+
+            Returns:
+                names (generator): (row, name) pairs in the order rows finish
+        '''
+
+        logits_next, (state_h, state_c) = self._expand_seed(seed, n, seed_state)
+        letters = [[seed] for _ in range(n)]
+        active = np.arange(n)
+        if known is not None:
+            nodes = [known.node(seed)] * n
+            emitted = set() if emitted is None else emitted
+        while True:
+            letter_inds = sample_letters_np(logits_next, rng, **sampling)
+            if known is not None:
+
+                # Accept finishing rows in order, resample the ones repeating a name without the space
+                rejected = []
+                for pos in np.flatnonzero(letter_inds == 26).tolist():
+                    name = ''.join(letters[active[pos]])
+                    if known.is_known(nodes[active[pos]]) or name in emitted:
+                        rejected.append(pos)
+                    else:
+                        emitted.add(name)
+                if rejected:
+                    logits_rejected = logits_next[rejected].copy()
+                    logits_rejected[:, 26] = -np.inf
+                    letter_inds[rejected] = sample_letters_np(logits_rejected, rng, **sampling)
+
+            keep = letter_inds != 26
+            for row, letter_ind in zip(active[keep].tolist(), letter_inds[keep].tolist()):
+                letters[row].append(LETTER_DICT[letter_ind])
+                if known is not None:
+                    nodes[row] = known.advance(nodes[row], LETTER_DICT[letter_ind])
+            for row in active[~keep].tolist():
+                yield row, ''.join(letters[row])
+
+            # Drop the finished rows
+            if not keep.all():
+                active = active[keep]
+                letter_inds = letter_inds[keep]
+                state_h = state_h[:, keep, :]
+                state_c = state_c[:, keep, :]
+            if len(active) == 0:
+                break
+            logits_next, (state_h, state_c) = self._step(letter_inds, (state_h, state_c))
+
+    def predict_batch(self, seed, n, temperature=1.0, top_k=None, top_p=None, rng_seed=None, novel=False):
+        '''
+        Given a starting input substring generate several random names together in one batch, see _iter_decode.
+
+            Parameters:
+                seed (str): substring that the names should start with
+                n (int): number of names to generate
+                temperature (float): sampling temperature, see sample_letters_np
+                top_k (int): sample only from the k most likely letters, see sample_letters_np
+                top_p (float): nucleus sampling threshold, see sample_letters_np
+                rng_seed (int): seed making the results reproducible, None for random results
+                novel (bool): only generate distinct names that are not real brand names
+
+            Returns:
+                names (list): generated names
+        '''
+
+        rng = np.random.default_rng(rng_seed)
+        known = load_known_names() if novel else None
+        sampling = {'temperature': temperature, 'top_k': top_k, 'top_p': top_p}
+        names = [None] * n
+        for row, name in self._iter_decode(seed, n, rng, sampling, known):
+            names[row] = name
+        return names
+
+    def iter_names(self, seed, n, chunk_size=256, temperature=1.0, top_k=None, top_p=None, rng_seed=None,
+                   novel=False):
+        '''
+        Given a starting input substring generate random names, yielding each one as soon as it finishes.
+        The seed is fed once, then names are decoded in batches of at most chunk_size rows, as in
+        LSTMGenerator.iter_names.
+
+            Parameters:
+                seed (str): substring that the names should start with
+                n (int): number of names to generate
+                chunk_size (int): maximum number of names decoded together
+                temperature (float): sampling temperature, see sample_letters_np
+                top_k (int): sample only from the k most likely letters, see sample_letters_np
+                top_p (float): nucleus sampling threshold, see sample_letters_np
+                rng_seed (int): seed making the results reproducible, None for random results
+                novel (bool): only generate distinct names that are not real brand names (across all chunks)
+
+            Returns:
+                names (generator): generated names
+        '''
+
+        rng = np.random.default_rng(rng_seed)
+        known = load_known_names() if novel else None
+        sampling = {'temperature': temperature, 'top_k': top_k, 'top_p': top_p}
+        emitted = set()
+        seed_state = self._consume_seed(seed)
+        for start in range(0, n, chunk_size):
+            size = min(chunk_size, n - start)
+            for _, name in self._iter_decode(seed, size, rng, sampling, known, emitted, seed_state):
+                yield name
+
+    def predict(self, seed, temperature=1.0, top_k=None, top_p=None, rng_seed=None):
+        '''
+        Given a starting input substring generate a random name, see predict_batch.
+
+            Parameters:
+                seed (str): substring that the name should start with
+                temperature (float): sampling temperature, see sample_letters_np
+                top_k (int): sample only from the k most likely letters, see sample_letters_np
+                top_p (float): nucleus sampling threshold, see sample_letters_np
+                rng_seed (int): seed making the result reproducible, None for a random result
+
+            Returns:
+                name (str): generated name
+        '''
+
+        return self.predict_batch(seed, 1, temperature, top_k, top_p, rng_seed)[0]
+
+    def predict_max(self, seed):
+        '''
+        Given a starting input substring generate the most likely name, picking the most
+        likely letter at every step.
+
+            Parameters:
+                seed (str): substring that the name should start with
+
+            Returns:
+                name (str): generated name
+                prob_total (float): probability of this name being generated
+        '''
+
+        logits_next, states = self._expand_seed(seed, 1)
+        name = seed
+        log_prob = 0.0
+        while True:
+            log_probs = log_softmax_np(logits_next.astype(np.float64))[0]
+            letter_ind = int(log_probs.argmax())
+            log_prob += log_probs[letter_ind]
+            if letter_ind == 26:
+                break
+            name += LETTER_DICT[letter_ind]
+            logits_next, states = self._step(np.array([letter_ind]), states)
+
+        return name, float(np.exp(log_prob))
+
+    def predict_beam(self, seed, k=5, max_length=30):
+        '''
+        Given a starting input substring find the k most likely complete names using beam search.
+        Follows LSTMGenerator.predict_beam step for step.
+
+            Parameters:
+                seed (str): substring that the names should start with
+                k (int): number of names to return (and number of beams kept)
+                max_length (int): maximum length of a returned name, including the seed
+
+            Returns:
+                results (list): up to k (name, log_prob) pairs, most likely first
+        '''
+
+        logits_next, states = self._expand_seed(seed, 1)
+        beam_names = [seed]
+        beam_scores = np.zeros(1)
+        finished = []
+        for length in range(len(seed), max_length + 1):
+            scores = beam_scores[:, None] + log_softmax_np(logits_next.astype(np.float64))
+            if length == max_length:
+                scores[:, :26] = -np.inf     # at the length limit only the space can follow
+            flat = scores.ravel()
+            top_inds = np.argsort(-flat, kind='stable')[:2 * k]
+
+            # Split candidates into complete names and beams to extend
+            keep_beams, keep_letters, keep_scores = [], [], []
+            for ind in top_inds.tolist():
+                score = flat[ind]
+                beam_ind, letter_ind = divmod(ind, 27)
+                if score == -np.inf:
+                    continue
+                elif letter_ind == 26:
+                    finished.append((beam_names[beam_ind], float(score)))
+                elif len(keep_beams) < k:
+                    keep_beams.append(beam_ind)
+                    keep_letters.append(letter_ind)
+                    keep_scores.append(score)
+            finished = sorted(finished, key=lambda x: x[1], reverse=True)[:k]
+
+            # Prune once the best live beam cannot enter the top k
+            if not keep_beams or (len(finished) == k and keep_scores[0] <= finished[-1][1]):
+                break
+
+            beam_names = [beam_names[b] + LETTER_DICT[l] for b, l in zip(keep_beams, keep_letters)]
+            beam_scores = np.array(keep_scores)
+            states = (states[0][:, keep_beams, :], states[1][:, keep_beams, :])
+            logits_next, states = self._step(np.array(keep_letters), states)
+
+        return finished
+
+
+def main():
+    '''Main execution function: if file is called directly, export every trained checkpoint to .npz.'''
+
+    for pt_path in sorted(glob.glob(os.path.join(TRAINED_DIR, '*.pt'))):
+        if not pt_path.endswith('_int8.pt'):     # quantized checkpoints have no float weights to export
+            print(export_npz(pt_path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+import torch
+from torch import nn
+from torch.nn.functional import log_softmax
+import numpy as np
+import glob
+import time
+import json
+import sys
+import os
+
+# Custom module imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from models.lstm import LSTMGenerator
+from models.utils import collate_names
+from models.registry import TRAINED_DIR
+from models.corpus import CORPUS_JSON
+
+
+def quantize(model):
+    '''
+    Create an int8 dynamically quantized copy of a model for CPU inference.
+    Weights of the LSTM and linear modules are stored as int8, activations stay float.
+
+        Parameters:
+            model (LSTMGenerator): trained model to quantize
+
+        Returns:
+            qmodel (LSTMGenerator): quantized copy of the model
+    '''
+
+    model = model.to('cpu').eval()
+    qmodel = torch.ao.quantization.quantize_dynamic(model, {nn.LSTM, nn.Linear}, dtype=torch.qint8)
+    return qmodel
+
+
+def load_model(pt_path, hidden_size=128, num_layers=2):
+    '''
+    Load a float checkpoint onto the CPU.
+
+        Parameters:
+            pt_path (str): path of the float .pt checkpoint
+            hidden_size (int): number of features in the hidden state of the LSTM
+            num_layers (int): number of LSTM modules to stack
+
+        Returns:
+            model (LSTMGenerator): loaded model
+    '''
+
+    model = LSTMGenerator(hidden_size, num_layers)
+    model.load_state_dict(torch.load(pt_path, map_location='cpu'))
+    return model
+
+
+def load_quantized(path, hidden_size=128, num_layers=2):
+    '''
+    Load a checkpoint written by save_quantized.
+
+        Parameters:
+            path (str): path of the quantized checkpoint
+            hidden_size (int): number of features in the hidden state of the LSTM
+            num_layers (int): number of LSTM modules to stack
+
+        Returns:
+            qmodel (LSTMGenerator): quantized model with the saved weights
+    '''
+
+    qmodel = quantize(LSTMGenerator(hidden_size, num_layers))
+    qmodel.load_state_dict(torch.load(path, map_location='cpu', weights_only=False))
+    return qmodel
+
+
+def save_quantized(pt_path, hidden_size=128, num_layers=2):
+    '''
+    Quantize a float checkpoint and save it next to the original with an _int8 suffix.
+
+        Parameters:
+            pt_path (str): path of the float .pt checkpoint
+            hidden_size (int): number of features in the hidden state of the LSTM
+            num_layers (int): number of LSTM modules to stack
+
+        Returns:
+            qpath (str): path of the written checkpoint
+    '''
+
+    qpath = os.path.splitext(pt_path)[0] + '_int8.pt'
+    qmodel = quantize(load_model(pt_path, hidden_size, num_layers))
+    torch.save(qmodel.state_dict(), qpath)
+    return qpath
+
+
+def next_letter_log_probs(model, names, chunk_size=1024):
+    '''
+    Compute the model's next letter distribution at every position of every name, the same
+    positions that iter_scores scores (after each letter, predicting the next letter or the space).
+
+        Parameters:
+            model (LSTMGenerator): model to evaluate
+            names (list): lowercase names to run through the model
+            chunk_size (int): number of names per packed forward pass
+
+        Returns:
+            log_probs (torch.Tensor): 2D tensor of log probabilities, one row per position
+    '''
+
+    model.eval()
+    rows = []
+    with torch.inference_mode():
+        for start in range(0, len(names), chunk_size):
+            chunk = names[start:start + chunk_size]
+            batch_x, batch_y = collate_names([name + ' ' for name in chunk])
+            pred_y, _ = model(batch_x, model._init_states(len(chunk)))
+            log_probs = log_softmax(pred_y.double(), dim=1).reshape(len(chunk), -1, 27)[:, :-1, :]
+            mask = batch_y[:, 1:] != -1
+            rows.append(log_probs[mask])
+    return torch.cat(rows)
+
+
+def compare(pt_path, qpath, names, n=100, repeats=10):
+    '''
+    Compare a float checkpoint with its quantized variant on speed, size and output drift.
+
+        Parameters:
+            pt_path (str): path of the float .pt checkpoint
+            qpath (str): path of the quantized checkpoint
+            names (list): corpus used to measure drift
+            n (int): number of names generated per timed request
+            repeats (int): number of timed requests per model
+
+        Returns:
+            report (dict): latency, names/sec, size, KL divergence and average log-likelihood
+    '''
+
+    model = load_model(pt_path)
+    qmodel = load_quantized(qpath)
+    report = {'checkpoint': os.path.basename(pt_path)}
+    for label, m, path in (('fp32', model, pt_path), ('int8', qmodel, qpath)):
+        m.predict_batch('a', n)     # warm up
+        torch.manual_seed(0)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            generated = m.predict_batch('a', n)
+        elapsed = (time.perf_counter() - start) / repeats
+        report[f'{label}_latency_ms'] = round(elapsed * 1000, 2)
+        report[f'{label}_names_per_sec'] = round(n / elapsed, 1)
+        report[f'{label}_size_kb'] = round(os.path.getsize(path) / 1024, 1)
+        report[f'{label}_avg_log_likelihood'] = round(float(m.score(names)[0].mean()), 4)
+
+    # KL(fp32 || int8) of the next letter distribution, averaged over all corpus positions
+    log_p = next_letter_log_probs(model, names)
+    log_q = next_letter_log_probs(qmodel, names)
+    kl = (log_p.exp() * (log_p - log_q)).sum(dim=1)
+    report['kl_mean'] = round(float(kl.mean()), 6)
+    report['kl_max'] = round(float(kl.max()), 6)
+    return report
+
+
+def main():
+    '''Main execution function: quantize every trained float checkpoint and report the differences.'''
+
+    with open(CORPUS_JSON, 'r') as f:
+        names = json.load(f)
+    reports = []
+    pt_paths = [path for path in sorted(glob.glob(os.path.join(TRAINED_DIR, '*.pt'))) if not path.endswith('_int8.pt')]
+    for pt_path in pt_paths:
+        qpath = save_quantized(pt_path)
+        report = compare(pt_path, qpath, names)
+        print(report)
+        reports.append(report)
+    with open(os.path.join(TRAINED_DIR, 'quantization_report.json'), 'w') as f:
+        json.dump(reports, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
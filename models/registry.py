@@ -0,0 +1,336 @@
+import threading
+import glob
+import json
+import re
+import sys
+import os
+from collections import OrderedDict
+from decimal import Decimal
+
+# Custom module imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+# Checkpoints are found relative to the repository, not the working directory
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRAINED_DIR = os.path.join(REPO_ROOT, 'models', 'trained')
+
+# Checkpoint file names written by lstm.py (.pt), quantize.py (_int8.pt), numpy_lstm.py (.npz)
+# and mmap_checkpoint.py (.rxw)
+CHECKPOINT_PATTERN = re.compile(
+    r'^lstm(?P<num_layers>\d+)_hs(?P<hidden_size>\d+)_bs(?P<batch_size>\d+)_ep(?P<epochs>\d+)'
+    r'_sw(?P<space_weight>\d+(?:-\d+)?)(?P<int8>_int8)?\.(?P<ext>pt|npz|rxw)$'
+)
+
+
+def format_checkpoint_name(num_layers, hidden_size, batch_size, epochs, space_weight):
+    '''
+    Build the checkpoint file name (without extension) of a set of hyperparameters, see CHECKPOINT_PATTERN.
+
+        Parameters:
+            num_layers (int): number of LSTM modules stacked
+            hidden_size (int): number of features in the hidden state of the LSTM
+            batch_size (int): size of batches used in training
+            epochs (int): number of training epochs
+            space_weight (float): weight of the space character in the loss function
+
+        Returns:
+            name (str): checkpoint name, e.g. lstm2_hs128_bs128_ep100_sw0-05
+    '''
+
+    # Fixed-point digits of the weight (5e-05 is written 0-00005), with the decimal point as a dash
+    weight = format(Decimal(repr(float(space_weight))), 'f')
+    if '.' in weight:
+        weight = weight.rstrip('0').rstrip('.')
+    name = f'lstm{num_layers}_hs{hidden_size}_bs{batch_size}_ep{epochs}_sw{weight.replace(".", "-")}'
+    if CHECKPOINT_PATTERN.match(f'{name}.pt') is None:
+        raise ValueError(f'Hyperparameters do not fit the checkpoint naming scheme: {name}')
+    return name
+
+
+def parse_checkpoint_name(filename):
+    '''
+    Read the hyperparameters and format of a checkpoint from its file name.
+
+        Parameters:
+            filename (str): checkpoint file name, e.g. lstm2_hs128_bs128_ep100_sw0-05_int8.pt
+
+        Returns:
+            info (dict): hyperparameters and format ('pt', 'int8', 'npz' or 'rxw'), None if the name does not match
+    '''
+
+    match = CHECKPOINT_PATTERN.match(os.path.basename(filename))
+    if match is None:
+        return None
+    info = {
+        'num_layers': int(match['num_layers']),
+        'hidden_size': int(match['hidden_size']),
+        'batch_size': int(match['batch_size']),
+        'epochs': int(match['epochs']),
+        'space_weight': float(match['space_weight'].replace('-', '.')),
+        'format': 'int8' if match['int8'] else match['ext']
+    }
+    return info
+
+
+def read_checkpoint_info(path):
+    '''
+    Describe a checkpoint file. Hyperparameters stored in the header of a .rxw file or saved next to
+    the checkpoint in a .json file (see lstm.main) take precedence over the ones parsed from the file name.
+
+        Parameters:
+            path (str): path of the checkpoint file
+
+        Returns:
+            info (dict): hyperparameters, format, path, size in bytes and modification time,
+                None if the file is not a recognized checkpoint
+    '''
+
+    if not path.endswith(('.pt', '.npz', '.rxw')):
+        return None
+    info = parse_checkpoint_name(path)
+    if path.endswith('.rxw'):
+        from models.mmap_checkpoint import read_header
+        header, _ = read_header(path)
+        info = info or {'format': 'rxw'}
+        info.update(header['hyperparameters'])
+        info.update({'num_layers': header['num_layers'], 'hidden_size': header['hidden_size']})
+    metadata_path = re.sub(r'(_int8)?\.(pt|npz|rxw)$', '.json', path)
+    if os.path.exists(metadata_path):
+        with open(metadata_path, 'r') as f:
+            metadata = json.load(f)
+        if info is None:
+            info = {'format': 'int8' if path.endswith('_int8.pt') else os.path.splitext(path)[1][1:]}
+        info.update(metadata)
+    if info is None:
+        return None
+    stat = os.stat(path)
+    info.update({'path': path, 'size': stat.st_size, 'mtime': stat.st_mtime})
+    return info
+
+
+def load_checkpoint(info, device='cpu', embedding=False):
+    '''
+    Load the model stored in a checkpoint file.
+
+        Parameters:
+            info (dict): checkpoint description from read_checkpoint_info
+            device (torch.device): device to load float torch checkpoints onto
+            embedding (bool): load float torch checkpoints as an EmbeddingLSTMGenerator (letter index inputs)
+
+        Returns:
+            model (LSTMGenerator or NumpyLSTMGenerator): loaded model
+    '''
+
+    if info['format'] == 'npz':
+        from models.numpy_lstm import NumpyLSTMGenerator
+        return NumpyLSTMGenerator(info['path'])
+    if info['format'] == 'rxw':
+        from models.mmap_checkpoint import load_mmap
+        return load_mmap(info['path'])
+    if info['format'] == 'int8':
+        from models.quantize import load_quantized
+        return load_quantized(info['path'], info['hidden_size'], info['num_layers'])
+
+    if embedding:
+        from models.embedding import load_embedding
+        return load_embedding(info['path'], info['hidden_size'], info['num_layers'], device)
+
+    import torch
+    from models.lstm import LSTMGenerator
+    model = LSTMGenerator(info['hidden_size'], info['num_layers'])
+    model.load_state_dict(torch.load(info['path'], map_location=device))
+    return model.to(device)
+
+
+class ModelRegistry:
+    '''
+    Catalog of the checkpoints in a directory that loads models lazily on first use.
+    Loaded models stay resident until the total size of their checkpoint files exceeds the
+    memory budget, after which the least recently used ones are evicted. A checkpoint that
+    changes on disk is reloaded the next time it is requested, and rescanning picks up new
+    files, so checkpoints can be swapped without restarting the server.
+
+        Attributes:
+            root (str): directory scanned for checkpoints
+            memory_budget (int): maximum total checkpoint size in bytes of the resident models
+            device (torch.device): device to load float torch checkpoints onto
+            prefix_cache (PrefixCache): optional cache enabled on every loaded model
+            embedding (bool): load float torch checkpoints as EmbeddingLSTMGenerator models
+            checkpoints (dict): checkpoint descriptions keyed by file name
+            models (OrderedDict): resident models keyed by file name (or tuple of file names for
+                ensembles), ordered from least to most recently used
+            loads (int): number of models loaded from disk
+            evictions (int): number of models evicted to respect the memory budget
+
+        Methods:
+            scan: rescan the directory for checkpoints
+            names: list the known checkpoints, optionally of one format
+            get: get a loaded model, loading it if needed
+            get_ensemble: get several float checkpoints loaded as one EnsembleGenerator
+            evict: drop a model from memory
+            stats: return the counters and resident models
+    '''
+
+    def __init__(self, root=TRAINED_DIR, memory_budget=256 * 2 ** 20, device='cpu', prefix_cache=None, embedding=False):
+        '''
+        Construct the object and scan the directory.
+
+            Parameters:
+                root (str): directory scanned for checkpoints
+                memory_budget (int): maximum total checkpoint size in bytes of the resident models
+                device (torch.device): device to load float torch checkpoints onto
+                prefix_cache (PrefixCache): optional cache enabled on every loaded model
+                embedding (bool): load float torch checkpoints as EmbeddingLSTMGenerator models
+        '''
+
+        self.root = root
+        self.memory_budget = memory_budget
+        self.device = device
+        self.prefix_cache = prefix_cache
+        self.embedding = embedding
+        self.checkpoints = {}
+        self.models = OrderedDict()
+        self.loads = 0
+        self.evictions = 0
+        self.lock = threading.RLock()
+        self.scan()
+
+    def scan(self):
+        '''
+        Rescan the directory, adding new checkpoints and forgetting deleted ones.
+
+            Returns:
+                checkpoints (dict): checkpoint descriptions keyed by file name
+        '''
+
+        checkpoints = {}
+        for path in sorted(glob.glob(os.path.join(self.root, '*'))):
+            info = read_checkpoint_info(path)
+            if info is not None:
+                checkpoints[os.path.basename(path)] = info
+        with self.lock:
+            self.checkpoints = checkpoints
+        return checkpoints
+
+    def names(self, fmt=None):
+        '''
+        List the known checkpoints.
+
+            Parameters:
+                fmt (str): only list checkpoints of this format ('pt', 'int8', 'npz' or 'rxw'), None for all
+
+            Returns:
+                names (list): checkpoint file names, sorted
+        '''
+
+        return sorted(name for name, info in self.checkpoints.items() if fmt is None or info['format'] == fmt)
+
+    def _stale(self, key):
+        '''Check whether any checkpoint file of a resident model changed on disk since it was loaded.'''
+
+        names = key if isinstance(key, tuple) else (key,)
+        for name, mtime in zip(names, self.models[key][1]):
+            path = os.path.join(self.root, name)
+            if not os.path.exists(path) or os.stat(path).st_mtime != mtime:
+                return True
+        return False
+
+    def _resident(self, key):
+        '''Return a resident model that is still up to date, marking it most recently used, or None.'''
+
+        if key in self.models:
+            if self._stale(key):
+                self.evict(key)
+            else:
+                self.models.move_to_end(key)
+                return self.models[key][0]
+        return None
+
+    def _admit(self, key, model, infos):
+        '''Make a newly loaded model resident, evicting the least recently used ones over the budget.'''
+
+        # The identifier of the loaded weights is set even without a prefix cache, since it also keys results
+        identifier = ','.join(f'{info["path"]}@{info["mtime"]}' for info in infos)
+        model.enable_prefix_cache(self.prefix_cache, identifier)
+        self.models[key] = (model, [info['mtime'] for info in infos], sum(info['size'] for info in infos))
+        self.loads += 1
+        while len(self.models) > 1 and sum(entry[2] for entry in self.models.values()) > self.memory_budget:
+            self.evict(next(iter(self.models)))
+
+    def _info(self, name):
+        '''Look up a checkpoint description, rescanning once for files added since the last scan.'''
+
+        if name not in self.checkpoints or not os.path.exists(self.checkpoints[name]['path']):
+            self.scan()
+        if name not in self.checkpoints:
+            raise KeyError(f'No checkpoint named {name} in {self.root}')
+        return read_checkpoint_info(self.checkpoints[name]['path'])
+
+    def get(self, name):
+        '''
+        Get a loaded model, loading it on first use or after its file changed.
+
+            Parameters:
+                name (str): checkpoint file name, e.g. lstm2_hs128_bs128_ep100_sw0-05.pt
+
+            Returns:
+                model (LSTMGenerator or NumpyLSTMGenerator): loaded model
+        '''
+
+        with self.lock:
+            model = self._resident(name)
+            if model is None:
+                info = self._info(name)
+                model = load_checkpoint(info, self.device, self.embedding)
+                self._admit(name, model, [info])
+        return model
+
+    def get_ensemble(self, names):
+        '''
+        Get several float checkpoints loaded as one EnsembleGenerator, see ensemble.load_ensemble.
+
+            Parameters:
+                names (list): file names of .pt checkpoints with the same shape
+
+            Returns:
+                ensemble (EnsembleGenerator): ensemble of the checkpoints
+        '''
+
+        key = tuple(names)
+        with self.lock:
+            ensemble = self._resident(key)
+            if ensemble is None:
+                from models.ensemble import load_ensemble
+                infos = [self._info(name) for name in names]
+                ensemble = load_ensemble([info['path'] for info in infos], device=self.device)
+                self._admit(key, ensemble, infos)
+        return ensemble
+
+    def evict(self, key):
+        '''
+        Drop a model from memory, it is loaded again on its next use.
+
+            Parameters:
+                key (str or tuple): checkpoint file name, or tuple of file names for an ensemble
+        '''
+
+        with self.lock:
+            if self.models.pop(key, None) is not None:
+                self.evictions += 1
+
+    def stats(self):
+        '''
+        Report the registry counters.
+
+            Returns:
+                stats (dict): loads, evictions, resident models and their total checkpoint size
+        '''
+
+        with self.lock:
+            return {
+                'loads': self.loads,
+                'evictions': self.evictions,
+                'resident': list(self.models),
+                'resident_bytes': sum(entry[2] for entry in self.models.values()),
+                'memory_budget': self.memory_budget
+            }
@@ -0,0 +1,283 @@
+import torch
+from torch.nn.functional import softmax
+from concurrent.futures import Future
+from collections import Counter
+import threading
+import queue
+import time
+import sys
+import os
+
+# Custom module imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from models.utils import LETTER_DICT
+
+
+def sample_rows(logits, temperature, top_k, top_p, generator=None):
+    '''
+    Sample one letter index per row like sample_letters, but with separate sampling settings per row.
+
+        Parameters:
+            logits (torch.Tensor): 2D tensor of next letter logits, one row per name
+            temperature (torch.Tensor): 1D tensor of temperatures, 0 for greedy rows
+            top_k (torch.Tensor): 1D tensor of top-k limits, 27 for no limit
+            top_p (torch.Tensor): 1D tensor of nucleus thresholds, 1 for no limit
+            generator (torch.Generator): random number generator to sample with (None for the global one)
+
+        Returns:
+            letter_inds (torch.Tensor): 1D tensor of sampled letter indices
+    '''
+
+    greedy = temperature == 0
+    logits = logits / temperature.masked_fill(greedy, 1).unsqueeze(1)
+
+    # Top-k: drop every letter scoring below the row's k-th best
+    sorted_logits, sorted_inds = logits.sort(dim=1, descending=True)
+    kth_best = sorted_logits.gather(1, (top_k - 1).unsqueeze(1))
+    logits = logits.masked_fill(logits < kth_best, -float('inf'))
+    probs = softmax(logits, dim=1)
+
+    # Top-p: drop the tail once the more likely letters already cover the row's top_p
+    sorted_probs = probs.gather(1, sorted_inds)
+    tail = sorted_probs.cumsum(dim=1) - sorted_probs >= top_p.unsqueeze(1)
+    probs = probs.scatter(1, sorted_inds, sorted_probs.masked_fill(tail, 0))
+
+    letter_inds = torch.multinomial(probs, 1, generator=generator).squeeze(1)
+    return torch.where(greedy, sorted_inds[:, 0], letter_inds)
+
+
+class BatchScheduler:
+    '''
+    Micro-batching front end for one model shared by concurrent callers. Requests submitted from any
+    thread are queued; a single worker thread collects the requests arriving within max_wait seconds
+    of the first one (up to max_batch_size names) and decodes them together in one batch, whatever
+    their seeds, counts and sampling settings, then hands each caller its own names.
+    Requests with an rng_seed or in novelty mode are decoded on their own by the model's own methods,
+    so their results are the same as without the scheduler.
+
+        Attributes:
+            model (LSTMGenerator): model shared by all requests
+            max_batch_size (int): maximum number of names decoded in one batch
+            max_wait (float): seconds to wait for more requests after the first one of a batch
+            queue (queue.Queue): submitted requests waiting for the worker
+            batch_sizes (Counter): number of batches run for each batch size in names
+            batch_requests (Counter): number of batches run for each number of requests batched together
+            max_queue_depth (int): highest number of queued requests seen at the start of a batch
+
+        Methods:
+            submit: queue a generation request and return a future of its names
+            generate: submit a request and wait for its names
+            stats: return the queue and batch metrics
+            close: stop the worker thread once the queue is empty
+    '''
+
+    def __init__(self, model, max_batch_size=1024, max_wait=0.005):
+        '''
+        Construct the object and start the worker thread.
+
+            Parameters:
+                model (LSTMGenerator): model shared by all requests
+                max_batch_size (int): maximum number of names decoded in one batch
+                max_wait (float): seconds to wait for more requests after the first one of a batch
+        '''
+
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.batch_sizes = Counter()
+        self.batch_requests = Counter()
+        self.max_queue_depth = 0
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def submit(self, seed, n, temperature=1.0, top_k=None, top_p=None, rng_seed=None, novel=False, on_name=None):
+        '''
+        Queue a generation request, see LSTMGenerator.predict_batch for the generation settings.
+
+            Parameters:
+                seed (str): substring that the names should start with
+                n (int): number of names to generate
+                temperature (float): sampling temperature, see sample_letters
+                top_k (int): sample only from the k most likely letters, see sample_letters
+                top_p (float): nucleus sampling threshold, see sample_letters
+                rng_seed (int): seed making the results reproducible, None for random results
+                novel (bool): only generate distinct names that are not real brand names
+                on_name (function): optional callback called with each name as soon as it finishes,
+                    from the worker thread
+
+            Returns:
+                future (concurrent.futures.Future): resolves to the list of generated names
+        '''
+
+        future = Future()
+        request = {
+            'seed': seed,
+            'n': n,
+            'temperature': temperature,
+            'top_k': top_k,
+            'top_p': top_p,
+            'rng_seed': rng_seed,
+            'novel': novel,
+            'on_name': on_name,
+            'future': future,
+            'names': []
+        }
+        self.queue.put(request)
+        return future
+
+    def generate(self, seed, n, temperature=1.0, top_k=None, top_p=None, rng_seed=None, novel=False):
+        '''
+        Submit a generation request and wait for its names, see submit.
+
+            Returns:
+                names (list): generated names
+        '''
+
+        return self.submit(seed, n, temperature, top_k, top_p, rng_seed, novel).result()
+
+    def stats(self):
+        '''
+        Report the queue and batch metrics.
+
+            Returns:
+                stats (dict): current and highest queue depth, number of batches, and mean names
+                    and requests per batch
+        '''
+
+        batches = sum(self.batch_sizes.values())
+        return {
+            'queue_depth': self.queue.qsize(),
+            'max_queue_depth': self.max_queue_depth,
+            'batches': batches,
+            'mean_batch_size': sum(size * count for size, count in self.batch_sizes.items()) / max(batches, 1),
+            'mean_batch_requests': sum(size * count for size, count in self.batch_requests.items()) / max(batches, 1)
+        }
+
+    def close(self):
+        '''Stop the worker thread once every queued request is finished.'''
+
+        self.queue.put(None)
+        self.worker.join()
+
+    def _run(self):
+        '''Worker loop: collect a batch of requests, run it, repeat until closed.'''
+
+        carry = None
+        while True:
+            request = carry if carry is not None else self.queue.get()
+            carry = None
+            if request is None:
+                return
+            self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize() + 1)
+
+            # Collect more requests until the batch is full or the wait is over
+            batch = [request]
+            size = request['n']
+            deadline = time.perf_counter() + self.max_wait
+            closing = False
+            while size < self.max_batch_size:
+                try:
+                    request = self.queue.get(timeout=max(deadline - time.perf_counter(), 0))
+                except queue.Empty:
+                    break
+                if request is None:
+                    closing = True
+                    break
+                if size + request['n'] > self.max_batch_size:
+                    carry = request
+                    break
+                batch.append(request)
+                size += request['n']
+
+            self._run_batch(batch)
+            if closing:
+                self.queue.put(None)
+
+    def _run_batch(self, batch):
+        '''
+        Run one batch of requests and resolve their futures.
+
+            Parameters:
+                batch (list): requests collected by _run
+        '''
+
+        shared = [request for request in batch if request['rng_seed'] is None and not request['novel']]
+        solo = [request for request in batch if request['rng_seed'] is not None or request['novel']]
+        try:
+            if shared:
+                self._decode(shared)
+                self.batch_sizes[sum(request['n'] for request in shared)] += 1
+                self.batch_requests[len(shared)] += 1
+            for request in solo:
+                for name in self.model.iter_names(request['seed'], request['n'], temperature=request['temperature'],
+                                                  top_k=request['top_k'], top_p=request['top_p'],
+                                                  rng_seed=request['rng_seed'], novel=request['novel']):
+                    self._finish(request, name)
+                self.batch_sizes[request['n']] += 1
+                self.batch_requests[1] += 1
+        except Exception as error:
+            for request in batch:
+                if not request['future'].done():
+                    request['future'].set_exception(error)
+            return
+        for request in batch:
+            request['future'].set_result(request['names'])
+
+    @staticmethod
+    def _finish(request, name):
+        '''Record a finished name for a request and pass it to the request's callback.'''
+
+        request['names'].append(name)
+        if request['on_name'] is not None:
+            request['on_name'](name)
+
+    def _decode(self, requests):
+        '''
+        Decode the names of several requests in one batch, one row per name.
+        All distinct seeds are encoded in one packed pass, then every step samples each row with
+        its own request's settings and runs a single LSTM call for all unfinished rows.
+
+            Parameters:
+                requests (list): requests without an rng_seed or novelty mode
+        '''
+
+        model = self.model
+        model.eval()
+        with torch.inference_mode():
+            owners = [request for request in requests for _ in range(request['n'])]
+            prefixes = [request['seed'] for request in owners]
+            seeds = list(dict.fromkeys(prefixes))
+            seed_rows = {seed: row for row, seed in enumerate(seeds)}
+            logits_seeds, (state_h, state_c) = model.consume_seeds(seeds)
+            rows = torch.tensor([seed_rows[seed] for seed in prefixes], device=logits_seeds.device)
+            logits_next = logits_seeds.index_select(0, rows)
+            state_h, state_c = state_h.index_select(1, rows), state_c.index_select(1, rows)
+
+            # Per row sampling settings, in the neutral form of sample_rows
+            device = logits_next.device
+            temperature = torch.tensor([float(r['temperature']) for r in owners], device=device)
+            top_k = torch.tensor([r['top_k'] or 27 for r in owners], device=device).clamp(1, 27)
+            top_p = torch.tensor([float(r['top_p'] or 1) for r in owners], device=device)
+
+            letters = [[prefix] for prefix in prefixes]
+            active = torch.arange(len(owners))
+            x_buffer = model.input_buffer(len(owners))
+            while True:
+                letter_inds = sample_rows(logits_next, temperature, top_k, top_p)
+                keep = letter_inds != 26
+                for row, letter_ind in zip(active[keep.cpu()].tolist(), letter_inds[keep].tolist()):
+                    letters[row].append(LETTER_DICT[letter_ind])
+                for row in active[~keep.cpu()].tolist():
+                    self._finish(owners[row], ''.join(letters[row]))
+
+                # Drop the finished rows along with their settings
+                if not keep.all():
+                    active = active[keep.cpu()]
+                    letter_inds = letter_inds[keep]
+                    temperature, top_k, top_p = temperature[keep], top_k[keep], top_p[keep]
+                    state_h, state_c = state_h[:, keep, :], state_c[:, keep, :]
+                if len(active) == 0:
+                    break
+                x = model.step_inputs(x_buffer, letter_inds)
+                logits_next, (state_h, state_c) = model(x, (state_h, state_c), train=False)
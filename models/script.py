@@ -0,0 +1,172 @@
+import torch
+from torch import nn
+from torch.nn.functional import softmax
+from typing import List
+import glob
+import sys
+import os
+
+# Custom module imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from models.lstm import LSTMGenerator
+from models.utils import ALPHABET
+from models.registry import TRAINED_DIR
+
+
+class ScriptedGenerator(nn.Module):
+    '''
+    TorchScript-compatible module running the whole name generation loop in compiled code:
+    seed encoding, state carry, sampling and termination on the space index 26.
+    Once scripted and saved it can be loaded with torch.jit.load without any of this repository's code.
+
+        Attributes:
+            hidden_size (int): the number of features in the hidden state of the LSTM
+            num_layers (int): number of LSTM modules to stack
+            alphabet (str): letters ordered by their index, with the space last
+            lstm (torch.nn.LSTM): LSTM module shared with the source model
+            lin (torch.nn.Linear): linear output module shared with the source model
+
+        Methods:
+            forward: generate a batch of names given a seed phrase
+    '''
+
+    def __init__(self, model):
+        '''
+        Construct the object.
+
+            Parameters:
+                model (LSTMGenerator): trained model whose modules are reused
+        '''
+
+        super().__init__()
+        self.hidden_size = model.hidden_size
+        self.num_layers = model.num_layers
+        self.alphabet = ''.join(ALPHABET) + ' '
+        self.lstm = model.lstm
+        self.lin = model.lin
+
+    def _sample(self, logits, temperature: float, top_k: int, top_p: float):
+        '''
+        Pick one letter index per row of logits, same rules as lstm.sample_letters.
+        Uses top_k=0 and top_p=1.0 instead of None to disable those filters.
+        '''
+
+        if temperature == 0:
+            return logits.argmax(dim=1)
+        logits = logits / temperature
+        if 0 < top_k < 27:
+            kth_best = logits.topk(top_k, dim=1).values[:, -1:]
+            logits = logits.masked_fill(logits < kth_best, -float('inf'))
+        probs = softmax(logits, dim=1)
+        if top_p < 1:
+            sorted_probs, sorted_inds = probs.sort(dim=1, descending=True)
+            tail = sorted_probs.cumsum(dim=1) - sorted_probs >= top_p
+            probs = probs.scatter(1, sorted_inds, sorted_probs.masked_fill(tail, 0.0))
+        return torch.multinomial(probs, 1).squeeze(1)
+
+    def forward(self, seed: str, n: int, temperature: float = 1.0, top_k: int = 0, top_p: float = 1.0) -> List[str]:
+        '''
+        Generate n names starting with the seed, decoded together as one shrinking batch until every
+        row has generated a space, like LSTMGenerator.predict_batch.
+        Use torch.manual_seed beforehand for reproducible results.
+
+            Parameters:
+                seed (str): lowercase substring that the names should start with, may be empty
+                n (int): number of names to generate
+                temperature (float): sampling temperature, 0 for greedy decoding
+                top_k (int): sample only from the k most likely letters, 0 to disable
+                top_p (float): nucleus sampling threshold, 1.0 to disable
+
+            Returns:
+                names (list): generated names
+        '''
+
+        device = self.lin.weight.device
+        state_h = torch.zeros(self.num_layers, 1, self.hidden_size, device=device)
+        state_c = torch.zeros(self.num_layers, 1, self.hidden_size, device=device)
+
+        # Feed the seed once from a zero state, an empty seed starts from the zero state itself
+        if len(seed) > 0:
+            x = torch.zeros(1, len(seed), 27, device=device)
+            for position, char in enumerate(seed):
+                letter_ind = self.alphabet.find(char)
+                if letter_ind < 0:
+                    raise ValueError('Invalid character ' + char + ' in seed ' + seed)
+                x[0, position, letter_ind] = 1.0
+            out, (state_h, state_c) = self.lstm(x, (state_h, state_c))
+            logits_next = self.lin(out[:, -1, :])
+        else:
+            logits_next = self.lin(state_h[-1])
+        logits_next = logits_next.repeat(n, 1)
+        state_h = state_h.repeat(1, n, 1)
+        state_c = state_c.repeat(1, n, 1)
+
+        # Decode all rows together, dropping the ones that generate a space
+        steps: List[torch.Tensor] = []
+        active = torch.arange(n, device=device)
+        x_buffer = torch.zeros(n, 1, 27, device=device)
+        while active.numel() > 0:
+            letter_inds = self._sample(logits_next, temperature, top_k, top_p)
+            step_codes = torch.full((n,), 26, dtype=torch.long, device=device)
+            step_codes[active] = letter_inds
+            steps.append(step_codes)
+            keep = letter_inds != 26
+            active = active[keep]
+            if active.numel() == 0:
+                break
+            letter_inds = letter_inds[keep]
+            state_h = state_h[:, keep, :]
+            state_c = state_c[:, keep, :]
+            x = x_buffer[:active.numel()]
+            x.zero_()
+            x[torch.arange(active.numel(), device=device), 0, letter_inds] = 1.0
+            out, (state_h, state_c) = self.lstm(x, (state_h, state_c))
+            logits_next = self.lin(out[:, -1, :])
+
+        # Convert codes to strings, each name ending at its first space
+        rows: List[List[int]] = torch.stack(steps, dim=1).tolist()
+        names: List[str] = []
+        for row in rows:
+            name = seed
+            for code in row:
+                if code == 26:
+                    break
+                name += self.alphabet[code]
+            names.append(name)
+        return names
+
+
+def export_script(pt_path, script_path=None):
+    '''
+    Script the generation loop of a trained checkpoint and save it next to the checkpoint.
+
+        Parameters:
+            pt_path (str): path of the .pt checkpoint (layer sizes are read from the weight shapes)
+            script_path (str): path of the file to write, defaults to pt_path with a .torchscript extension
+
+        Returns:
+            script_path (str): path of the written file
+    '''
+
+    if script_path is None:
+        script_path = os.path.splitext(pt_path)[0] + '.torchscript'
+    state_dict = torch.load(pt_path, map_location='cpu')
+    num_layers = len([key for key in state_dict if key.startswith('lstm.weight_ih_l')])
+    model = LSTMGenerator(state_dict['lin.weight'].shape[1], num_layers)
+    model.load_state_dict(state_dict)
+    model.eval()
+    scripted = torch.jit.script(ScriptedGenerator(model))
+    torch.jit.save(scripted, script_path)
+    return script_path
+
+
+def main():
+    '''Main execution function: if file is called directly, script every trained checkpoint.'''
+
+    for pt_path in sorted(glob.glob(os.path.join(TRAINED_DIR, '*.pt'))):
+        if not pt_path.endswith('_int8.pt'):     # quantized checkpoints have no float weights to export
+            print(export_script(pt_path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+import itertools
+import string
+import time
+import json
+import csv
+import sys
+import os
+import numpy as np
+
+# Custom module imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from models.registry import format_checkpoint_name, TRAINED_DIR
+from models.corpus import CORPUS_JSON, build_corpus, corpus_is_stale
+
+# Hyperparameters searched by a sweep, with the values tried for each
+SWEEP_SPACE = {
+    'hidden_size': [64, 128],
+    'num_layers': [1, 2],
+    'batch_size': [128],
+    'learning_rate': [0.01],
+    'epochs': [100],
+    'space_weight': [0.01, 0.05, 0.1, 0.5]
+}
+
+# Continuous (low, high) ranges sampled log-uniformly by a random search, replacing the grid values
+RANDOM_RANGES = {
+    'learning_rate': (0.001, 0.03),
+    'space_weight': (0.005, 1.0)
+}
+
+# Length limit of the names generated to evaluate a trial (the longest corpus name has 16 letters), so an
+# undertrained model that rarely predicts a space cannot run on unbounded
+MAX_NAME_LENGTH = 30
+
+# Columns of the results table, one row per trial
+RESULT_FIELDS = [
+    'checkpoint', 'num_layers', 'hidden_size', 'batch_size', 'epochs', 'learning_rate', 'space_weight',
+    'final_loss', 'val_log_likelihood', 'mean_length', 'novelty_rate', 'wall_time'
+]
+
+
+def grid_trials(space=SWEEP_SPACE):
+    '''
+    Build the trials of a grid search: every combination of the hyperparameter values.
+
+        Parameters:
+            space (dict): values tried for each hyperparameter
+
+        Returns:
+            trials (list): dicts of hyperparameters, one per trial
+    '''
+
+    return [dict(zip(space, values)) for values in itertools.product(*space.values())]
+
+
+def random_trials(num_trials, space=SWEEP_SPACE, ranges=RANDOM_RANGES, seed=0):
+    '''
+    Build the trials of a random search: hyperparameters with a range are drawn log-uniformly from it
+    (rounded to 3 significant digits), the others uniformly from their values in the space.
+
+        Parameters:
+            num_trials (int): number of trials
+            space (dict): values tried for each hyperparameter
+            ranges (dict): (low, high) range of the hyperparameters sampled continuously
+            seed (int): seed of the draws
+
+        Returns:
+            trials (list): dicts of hyperparameters, one per trial
+    '''
+
+    rng = np.random.default_rng(seed)
+    trials = []
+    for _ in range(num_trials):
+        trial = {}
+        for key, values in space.items():
+            if key in ranges:
+                low, high = ranges[key]
+                trial[key] = float(f'{np.exp(rng.uniform(np.log(low), np.log(high))):.3g}')
+            else:
+                trial[key] = values[rng.integers(len(values))]
+        trials.append(trial)
+    return trials
+
+
+def split_corpus(num_names, val_fraction=0.1, seed=0):
+    '''
+    Split the corpus names into a training and a validation set, the same for every trial of a sweep.
+
+        Parameters:
+            num_names (int): number of names in the corpus
+            val_fraction (float): share of the names held out for validation
+            seed (int): seed of the split
+
+        Returns:
+            train_inds (np.array): sorted indices of the training names
+            val_inds (np.array): sorted indices of the validation names
+    '''
+
+    order = np.random.default_rng(seed).permutation(num_names)
+    num_val = int(num_names * val_fraction)
+    return np.sort(order[num_val:]), np.sort(order[:num_val])
+
+
+def _init_worker(num_threads):
+    '''Limit the torch threads of a worker process, so concurrent trials share the CPU cores.'''
+
+    import torch
+    torch.set_num_threads(num_threads)
+
+
+def run_trial(trial, directory, val_fraction=0.1, names_per_letter=20, max_length=MAX_NAME_LENGTH, seed=0):
+    '''
+    Train and evaluate one model of a sweep, in a worker process. The model is trained like lstm.main on
+    the training split of the corpus, saved with save_model, then evaluated on the held out names and
+    on names it generates from every first letter.
+
+        Parameters:
+            trial (dict): hyperparameters of the trial, see SWEEP_SPACE
+            directory (str): directory to save the checkpoint into
+            val_fraction (float): share of the names held out for validation, see split_corpus
+            names_per_letter (int): number of names generated per first letter
+            max_length (int): maximum length of the generated names, see MAX_NAME_LENGTH
+            seed (int): seed of the split, the weight initialization, the batches and the generated names
+
+        Returns:
+            row (dict): results table row of the trial, see RESULT_FIELDS
+    '''
+
+    # Imported here so only the worker processes load torch
+    import torch
+    from torch.utils.data import Subset
+    from models.lstm import LSTMGenerator, train, save_model
+    from models.corpus import CorpusDataset, BucketBatchSampler, collate_corpus
+    from models.novelty import load_known_names
+    from models.constraints import Constraints
+
+    start_time = time.perf_counter()
+    torch.manual_seed(seed)
+    dataset = CorpusDataset()
+    train_inds, val_inds = split_corpus(len(dataset), val_fraction, seed)
+    batch_sampler = BucketBatchSampler(dataset.lengths()[train_inds], trial['batch_size'], seed=seed)
+    model = LSTMGenerator(trial['hidden_size'], trial['num_layers'])
+    final_loss = train(Subset(dataset, train_inds.tolist()), model, trial['batch_size'], trial['epochs'],
+                       trial['learning_rate'], trial['space_weight'], collate_fn=collate_corpus,
+                       batch_sampler=batch_sampler)
+    path = save_model(model, dict(trial), directory)
+
+    # Mean log likelihood per predicted letter (including the terminating space) of the held out names
+    with open(CORPUS_JSON, 'r') as f:
+        names = json.load(f)
+    log_likelihoods, surprisals = model.score([names[ind] for ind in val_inds])
+    val_log_likelihood = log_likelihoods.sum() / sum(len(surprisal) for surprisal in surprisals)
+
+    # Length and share of real brand names among generated names, which are steered to end by max_length
+    generated = model.predict_seeds([(letter, names_per_letter) for letter in string.ascii_lowercase],
+                                    rng_seed=seed, constraints=Constraints(max_length=max_length))
+    generated = [name for seed_names in generated for name in seed_names]
+    known = load_known_names()
+
+    row = {
+        'checkpoint': os.path.basename(path),
+        'final_loss': round(final_loss, 4),
+        'val_log_likelihood': round(float(val_log_likelihood), 4),
+        'mean_length': round(float(np.mean([len(name) for name in generated])), 2),
+        'novelty_rate': round(sum(name not in known for name in generated) / len(generated), 4),
+        'wall_time': round(time.perf_counter() - start_time, 1)
+    }
+    row.update({key: trial[key] for key in SWEEP_SPACE})
+    return row
+
+
+def run_sweep(trials, directory, num_workers=None, val_fraction=0.1, seed=0):
+    '''
+    Run the trials of a sweep concurrently in a process pool, splitting the CPU cores evenly between
+    the workers. Each finished trial adds a row to results.csv in the checkpoint directory.
+
+        Parameters:
+            trials (list): dicts of hyperparameters, see grid_trials and random_trials
+            directory (str): directory to save the checkpoints and results table into
+            num_workers (int): number of trials run at once, defaults to one per core (up to the number of trials)
+            val_fraction (float): share of the names held out for validation, see split_corpus
+            seed (int): seed of every trial, see run_trial
+
+        Returns:
+            rows (list): results table rows, from the highest validation likelihood to the lowest
+    '''
+
+    # Checkpoint names leave out the learning rate, so trials differing only there would overwrite each other
+    checkpoints = [format_checkpoint_name(trial['num_layers'], trial['hidden_size'], trial['batch_size'],
+                                          trial['epochs'], trial['space_weight']) for trial in trials]
+    if len(set(checkpoints)) != len(checkpoints):
+        raise ValueError('Trials differing only in learning rate share a checkpoint name, sweep them separately')
+
+    if corpus_is_stale():
+        build_corpus()
+    os.makedirs(directory, exist_ok=True)
+    num_cores = os.cpu_count() or 1
+    num_workers = max(1, min(num_workers or num_cores, len(trials)))
+    num_threads = max(1, num_cores // num_workers)
+
+    rows = []
+    results_path = os.path.join(directory, 'results.csv')
+    with open(results_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        with ProcessPoolExecutor(num_workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(num_threads,)) as pool:
+            futures = [pool.submit(run_trial, trial, directory, val_fraction, seed=seed) for trial in trials]
+            for future in as_completed(futures):
+                row = future.result()
+                writer.writerow(row)
+                f.flush()
+                rows.append(row)
+                print({'trial': len(rows), 'of': len(trials), **row})
+
+    return sorted(rows, key=lambda row: row['val_log_likelihood'], reverse=True)
+
+
+def format_results(rows):
+    '''
+    Lay out results table rows as aligned text columns.
+
+        Parameters:
+            rows (list): results table rows, see RESULT_FIELDS
+
+        Returns:
+            table (str): header line followed by one line per row
+    '''
+
+    cells = [RESULT_FIELDS] + [[str(row[field]) for field in RESULT_FIELDS] for row in rows]
+    widths = [max(len(line[col]) for line in cells) for col in range(len(RESULT_FIELDS))]
+    return '\n'.join('  '.join(cell.ljust(width) for cell, width in zip(line, widths)).rstrip() for line in cells)
+
+
+def main():
+    '''
+    Main execution function: if file is called directly, run a sweep over SWEEP_SPACE into models/trained/sweep,
+    e.g. python models/sweep.py grid 4 (every combination, 4 workers) or python models/sweep.py random 6 4
+    (6 random trials, 4 workers).
+    '''
+
+    mode = sys.argv[1] if len(sys.argv) > 1 else 'grid'
+    if mode == 'random':
+        trials = random_trials(int(sys.argv[2]))
+        num_workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    else:
+        trials = grid_trials()
+        num_workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    rows = run_sweep(trials, os.path.join(TRAINED_DIR, 'sweep'), num_workers)
+    print(format_results(rows))
+
+
+if __name__ == '__main__':
+    main()
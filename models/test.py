@@ -1,20 +1,13 @@
-import torch
 import sys
 import os
 
 # Custom module imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
-from models.lstm import LSTMGenerator
+from models.registry import ModelRegistry
 
-# Load a pretrained model
-device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-model = LSTMGenerator(128, 2)
-model.load_state_dict(
-    torch.load(
-        'models/trained/lstm2_hs128_bs128_ep100_sw0-05.pt',
-        map_location=device
-    )
-)
+# Load a pretrained model, found in models/trained regardless of the working directory
+registry = ModelRegistry()
+model = registry.get('lstm2_hs128_bs128_ep100_sw0-05.pt')
     
 # Predict some new name
 print(model.predict('nicm'))
@@ -1,7 +1,5 @@
 import string
 import numpy as np
-from torch import from_numpy
-from torch.nn.utils.rnn import pad_sequence, pack_padded_sequence
 
 # Global variables
 ALPHABET = list(string.ascii_lowercase)
@@ -10,6 +8,11 @@ LABEL_DICT[' '] = 26
 LETTER_DICT = {index: letter for index, letter in enumerate(ALPHABET)}
 LETTER_DICT[26] = ' '
 
+# Lookup table from a character's byte to its label (255 for characters outside the vocabulary), applied
+# to a whole string in one bytes.translate call, and table of the one-hot row of each label
+LABEL_TABLE = bytes(LABEL_DICT.get(chr(byte), 255) for byte in range(256))
+ONEHOT_TABLE = np.eye(27)
+
 
 def encode_char_onehot(char):
     '''
@@ -38,8 +41,7 @@ def encode_onehot(string):
             encoded (np.array): 2D array representing a set of one-hot vectors
     '''
 
-    encoded = list(map(encode_char_onehot, list(string)))
-    encoded = np.array(encoded)
+    encoded = ONEHOT_TABLE.take(_label_bytes(string), axis=0)
     encoded = encoded.T
     return encoded
 
@@ -49,17 +51,71 @@ def encode_label(string):
     Encodes an entire (lowercase English alphabet) string using label encoding.
 
         Parameters:
-            string (str)L string to encode
+            string (str): string to encode
 
         Returns:
             encoded (np.array): 1D array representing the string's letters encoded as indices
     '''
 
-    encoded = [LABEL_DICT[ch] for ch in list(string)]
-    encoded = np.array(encoded)
+    encoded = _label_bytes(string).astype(np.int64)
     return encoded
 
 
+def _label_bytes(string):
+    '''Label encode a string through LABEL_TABLE into a uint8 array, raising a KeyError for characters outside the vocabulary.'''
+
+    encoded = string.encode('latin-1', 'replace').translate(LABEL_TABLE)
+    if 255 in encoded:
+        raise KeyError(string[encoded.index(255)])
+    return np.frombuffer(encoded, dtype=np.uint8)
+
+
+def encode_label_batch(strings, pad_value=-1):
+    '''
+    Encodes a list of strings using label encoding, all at once into one padded matrix.
+
+        Parameters:
+            strings (list): strings to encode
+            pad_value (int): label given to the positions past the end of each string
+
+        Returns:
+            encoded (np.array): 2D array with one row of letter indices per string, padded to the longest one
+            lengths (np.array): 1D array of the string lengths
+    '''
+
+    lengths = np.fromiter(map(len, strings), dtype=np.int64, count=len(strings))
+    encoded = np.full((len(strings), lengths.max(initial=0)), pad_value, dtype=np.int64)
+    mask = np.arange(encoded.shape[1]) < lengths[:, None]
+    encoded[mask] = _label_bytes(''.join(strings))
+    return encoded, lengths
+
+
+def encode_onehot_batch(strings, pad_value=-1):
+    '''
+    Encodes a list of strings using one-hot encoding, all at once into one padded array.
+    The result matches the padded batch built by collate_pad from encode_onehot outputs.
+
+        Parameters:
+            strings (list): strings to encode
+            pad_value (float): value of every feature at the positions past the end of each string
+
+        Returns:
+            encoded (np.array): 3D float32 array of shape (strings, longest length, 27)
+            lengths (np.array): 1D array of the string lengths
+    '''
+
+    labels, lengths = encode_label_batch(strings)
+    encoded = _onehot_labels(labels, pad_value)
+    return encoded, lengths
+
+
+def _onehot_labels(labels, pad_value):
+    '''One-hot encode a padded label matrix, where the -1 padding labels pick an extra last row of pad_value.'''
+
+    table = np.vstack([ONEHOT_TABLE, np.full((1, 27), pad_value)]).astype(np.float32)
+    return table[labels]
+
+
 def collate_pad(batch):
     '''
     Custom collation function to override the PyTorch default.
@@ -73,6 +129,10 @@ def collate_pad(batch):
             batch_y (torch.Tensor): padded/fixed-length batch of label encoded strings
     '''
 
+    # Imported here so the encoders above can be used without torch installed
+    from torch import from_numpy
+    from torch.nn.utils.rnn import pad_sequence, pack_padded_sequence
+
     x_arr = [from_numpy(elem[0].T) for elem in batch]
     y_arr = [from_numpy(elem[1]) for elem in batch]
     lengths = [len(y) for y in y_arr]
@@ -82,3 +142,26 @@ def collate_pad(batch):
     batch_x = batch_x.float()
     batch_y = batch_y.long()
     return batch_x, batch_y
+
+
+def collate_names(names, onehot=True):
+    '''
+    Build the same batch as collate_pad directly from a list of names, encoding all of them in one pass.
+
+        Parameters:
+            names (list): names to encode, each with at least one letter
+            onehot (bool): flag for one-hot encoding the inputs, or else keeping them as letter indices
+
+        Returns:
+            batch_x (torch.nn.utils.rnn.PackedSequence): packed batch of one-hot encoded (or label encoded) strings
+            batch_y (torch.Tensor): padded/fixed-length batch of label encoded strings
+    '''
+
+    from torch import from_numpy
+    from torch.nn.utils.rnn import pack_padded_sequence
+
+    labels, lengths = encode_label_batch(names)
+    inputs = _onehot_labels(labels, -1) if onehot else labels.clip(min=0)
+    batch_x = pack_padded_sequence(from_numpy(inputs), from_numpy(lengths), batch_first=True, enforce_sorted=False)
+    batch_y = from_numpy(labels)
+    return batch_x, batch_y
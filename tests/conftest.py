@@ -0,0 +1,24 @@
+import pytest
+import torch
+import sys
+import os
+
+# Custom module imports
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+from models.lstm import LSTMGenerator
+
+# Pretrained checkpoint the tests run against, without extension
+CHECKPOINT = os.path.join(REPO_ROOT, 'models', 'trained', 'lstm2_hs128_bs128_ep100_sw0-05')
+
+# Seeds covering an empty seed, single letters and longer prefixes
+SEEDS = ['', 'a', 'zo', 'q', 'nicm', 'brand']
+
+
+@pytest.fixture(scope='session')
+def model():
+    '''Float model loaded from the pretrained checkpoint, on the CPU.'''
+
+    model = LSTMGenerator(128, 2)
+    model.load_state_dict(torch.load(f'{CHECKPOINT}.pt', map_location='cpu'))
+    return model
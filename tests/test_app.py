@@ -0,0 +1,159 @@
+from collections import Counter
+import numpy as np
+import pytest
+import string
+import json
+import time
+import os
+
+from web.app import server, runs, runs_lock, summarize_run, start_run, load_names, sampling_settings, \
+    InvalidRequest, NAME_WINDOW, DEFAULT_CHECKPOINT
+from conftest import CHECKPOINT
+
+MODEL = f'{os.path.basename(CHECKPOINT)}.pt'
+
+
+@pytest.fixture(scope='module')
+def client():
+    '''Test client of the Flask server behind the app.'''
+
+    return server.test_client()
+
+
+def test_api_models(client):
+    '''The model list offers the default model and every float checkpoint.'''
+
+    body = client.get('/api/models').get_json()
+    assert body['default'] == DEFAULT_CHECKPOINT
+    assert MODEL in body['models']
+
+
+def test_api_generate(client, model):
+    '''Each request of a batch gets its own names, generated with its own settings.'''
+
+    response = client.post('/api/generate', json={
+        'requests': [{'seed': 'ab', 'n': 20, 'rng_seed': 1}, {'seed': 'Zo', 'n': 10, 'temperature': 0}],
+        'model': MODEL
+    })
+    assert response.status_code == 200
+    first, second = response.get_json()['results']
+    assert first['seed'] == 'ab' and sorted(first['names']) == sorted(model.predict_batch('ab', 20, rng_seed=1))
+    assert second['seed'] == 'zo' and second['names'] == [model.predict_max('zo')[0]] * 10
+
+
+def test_api_generate_stream(client):
+    '''Clients accepting NDJSON get every name on its own line as it finishes.'''
+
+    response = client.post('/api/generate', json={'requests': [{'seed': 'a', 'n': 15}, {'seed': 'b', 'n': 10}]},
+                           headers={'Accept': 'application/x-ndjson'})
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(lines) == 25
+    assert all(line['name'].startswith('ab'[line['index']]) for line in lines)
+
+
+@pytest.mark.parametrize('body', [
+    {'requests': [{'seed': 'ab', 'n': 20, 'temperature': 5}]},
+    {'requests': [{'seed': 'a1', 'n': 20}]},
+    {'requests': [{'seed': 'ab', 'n': 5}]},
+    {'requests': [{'seed': 'ab', 'n': 20}], 'model': 'missing.pt'},
+    {'requests': []},
+    ['ab']
+])
+def test_api_generate_rejects_invalid_input(client, body):
+    '''Input the page would not accept is answered with a 400 error giving the reason.'''
+
+    response = client.post('/api/generate', json=body)
+    assert response.status_code == 400
+    assert response.get_json()['error']
+
+
+def test_sampling_settings():
+    '''The page and the API read sampling settings with the same defaults and limits, temperature 0 included.'''
+
+    assert sampling_settings({}) == {'temperature': 1.0, 'top_k': None, 'top_p': None, 'rng_seed': None}
+    assert sampling_settings({'temperature': 0, 'top_k': 5, 'top_p': 0.5, 'rng_seed': 3}) == \
+        {'temperature': 0, 'top_k': 5, 'top_p': 0.5, 'rng_seed': 3}
+    for settings in [{'top_k': 0}, {'top_k': 2.5}, {'top_p': -0.1}, {'temperature': -1}, {'rng_seed': -1},
+                     {'temperature': '1'}]:
+        with pytest.raises(InvalidRequest):
+            sampling_settings(settings)
+
+
+def test_api_most_likely(client, model):
+    '''Beam search results match predict_beam.'''
+
+    body = client.post('/api/most-likely', json={'seeds': ['nicm'], 'k': 3, 'model': MODEL}).get_json()
+    names = body['results'][0]['names']
+    expected = model.predict_beam('nicm', k=3, max_length=34)
+    assert [entry['name'] for entry in names] == [name for name, _ in expected]
+    assert [entry['log_prob'] for entry in names] == pytest.approx([log_prob for _, log_prob in expected])
+
+
+def test_api_score(client, model):
+    '''Scores match LSTMGenerator.score.'''
+
+    body = client.post('/api/score', json={'names': ['Zonalone', 'abc'], 'model': MODEL}).get_json()
+    log_likelihoods, _ = model.score(['zonalone', 'abc'])
+    assert [entry['name'] for entry in body['results']] == ['zonalone', 'abc']
+    assert [entry['log_likelihood'] for entry in body['results']] == pytest.approx(list(log_likelihoods))
+
+
+def wait_for_run(run_id, timeout=30):
+    '''Wait for a run to finish and return its buffer entry.'''
+
+    deadline = time.perf_counter() + timeout
+    while not runs[run_id]['done']:
+        assert time.perf_counter() < deadline
+        time.sleep(0.01)
+    return runs[run_id]
+
+
+def test_summaries_are_incremental():
+    '''Summaries built as names arrive match counting every name at once.'''
+
+    run = {
+        'run_id': 'test',
+        'names': ['abc', 'abd'],
+        'done': False,
+        'likely': [],
+        'used_seed': 'ab',
+        'name_counts': Counter(),
+        'letter_counts': np.zeros(26, dtype=np.int64),
+        'summarized': 0
+    }
+    assert summarize_run(run)['count'] == 2
+    run['names'] += ['abc', 'abzz', 'ab']
+    summary = summarize_run(run)
+    assert summary['count'] == 5 and summary['unique'] == 4
+    assert summary['top_names'][0] == ('abc', 2)
+    letters = Counter('cdczz')
+    assert summary['letter_freq'] == pytest.approx([letters[letter] / 5 for letter in string.ascii_lowercase])
+
+
+def test_reproducible_runs_are_cached(model):
+    '''A run with a random seed is generated once, then served from the result cache.'''
+
+    settings = ('nicm', 30, 1.0, None, None, 11, False, MODEL)
+    first = wait_for_run(start_run(*settings))
+    second = runs[start_run(*settings)]
+    assert second['done']
+    assert second['names'] == first['names']
+    assert sorted(first['names']) == sorted(model.predict_batch('nicm', 30, rng_seed=11))
+    with runs_lock:
+        summary = summarize_run(second)
+    assert summary['count'] == 30
+    assert summary['likely'] == model.predict_beam('nicm', k=3, max_length=34)
+
+
+def test_name_window():
+    '''The name viewer gets the names around the selected page plus the first and last names.'''
+
+    run_id = start_run('zo', 1000, 1.0, None, None, 2, False, MODEL)
+    names = wait_for_run(run_id)['names']
+    window = load_names({'run_id': run_id, 'page': 500, 'count': 1000})
+    assert window['run_id'] == run_id
+    start = 500 - 1 - NAME_WINDOW // 2
+    expected = [0] + list(range(start, start + NAME_WINDOW)) + [999]
+    assert window['names'] == {str(ind): names[ind] for ind in expected}
+    assert set(load_names({'run_id': run_id, 'page': 1, 'count': 1000})['names']) == \
+        set(str(ind) for ind in list(range(NAME_WINDOW)) + [999])
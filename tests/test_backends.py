@@ -0,0 +1,220 @@
+import pytest
+import torch
+import json
+import os
+
+from models.numpy_lstm import NumpyLSTMGenerator
+from models.script import export_script
+from models.quantize import load_quantized, next_letter_log_probs
+from models.mmap_checkpoint import load_mmap, export_mmap, export_pt, read_header
+from models.embedding import load_embedding
+from conftest import REPO_ROOT, CHECKPOINT, SEEDS
+
+
+@pytest.fixture(scope='module')
+def numpy_model():
+    '''NumPy engine loaded from the exported weights of the test checkpoint.'''
+
+    return NumpyLSTMGenerator(f'{CHECKPOINT}.npz')
+
+
+@pytest.fixture(scope='module')
+def scripted_model():
+    '''Compiled generation loop saved next to the test checkpoint.'''
+
+    return torch.jit.load(f'{CHECKPOINT}.torchscript')
+
+
+@pytest.fixture(scope='module')
+def int8_model():
+    '''Dynamically quantized variant of the test checkpoint.'''
+
+    return load_quantized(f'{CHECKPOINT}_int8.pt')
+
+
+@pytest.fixture(scope='module')
+def mmap_model():
+    '''Model backed by the memory-mapped copy of the test checkpoint.'''
+
+    return load_mmap(f'{CHECKPOINT}.rxw')
+
+
+@pytest.fixture(scope='module')
+def embedding_model():
+    '''Test checkpoint loaded into the letter index (embedding) variant of the model.'''
+
+    return load_embedding(f'{CHECKPOINT}.pt')
+
+
+@pytest.fixture(scope='module')
+def corpus_names():
+    '''First 1000 names of the training corpus.'''
+
+    with open(os.path.join(REPO_ROOT, 'data', 'names_clean.json'), 'r') as f:
+        return json.load(f)[:1000]
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_numpy_greedy_matches(model, numpy_model, seed):
+    '''The NumPy engine decodes the same greedy name with the same probability.'''
+
+    name, prob_total = numpy_model.predict_max(seed)
+    expected_name, expected_prob = model.predict_max(seed)
+    assert name == expected_name
+    assert prob_total == pytest.approx(expected_prob, rel=1e-4)
+    assert numpy_model.predict_batch(seed, 3, temperature=0) == [expected_name] * 3
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_numpy_beam_matches(model, numpy_model, seed):
+    '''The NumPy engine finds the same beam of names with the same log probabilities.'''
+
+    results = numpy_model.predict_beam(seed, k=5)
+    expected = model.predict_beam(seed, k=5)
+    assert [name for name, _ in results] == [name for name, _ in expected]
+    assert [log_prob for _, log_prob in results] == pytest.approx([log_prob for _, log_prob in expected], abs=1e-4)
+
+
+def test_numpy_seeded_sampling_is_reproducible(numpy_model):
+    '''The NumPy engine's names are reproducible from an rng_seed, though not the same as the torch model's.'''
+
+    names = numpy_model.predict_batch('a', 20, rng_seed=3)
+    assert len(names) == 20
+    assert all(name.startswith('a') for name in names)
+    assert numpy_model.predict_batch('a', 20, rng_seed=3) == names
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_script_greedy_matches(model, scripted_model, seed):
+    '''The compiled loop decodes the same greedy names as the model.'''
+
+    name, _ = model.predict_max(seed)
+    assert scripted_model(seed, 3, temperature=0.0) == [name] * 3
+    assert scripted_model(seed, 2, top_k=1) == [name] * 2
+
+
+def test_script_sampling(scripted_model):
+    '''Sampled names start with the seed and are reproducible from torch.manual_seed.'''
+
+    torch.manual_seed(0)
+    names = scripted_model('zo', 50, temperature=0.8, top_k=10, top_p=0.9)
+    assert len(names) == 50 and all(name.startswith('zo') for name in names)
+    torch.manual_seed(0)
+    assert scripted_model('zo', 50, temperature=0.8, top_k=10, top_p=0.9) == names
+
+
+def test_script_seed_checks(scripted_model):
+    '''Unknown seed characters are refused, and an empty seed samples whole names from the zero state.'''
+
+    with pytest.raises(torch.jit.Error, match='Invalid character 1'):
+        scripted_model('a1', 2)
+    torch.manual_seed(0)
+    names = scripted_model('', 50)
+    assert len(names) == 50 and sum(len(name) > 0 for name in names) > 40
+    assert all(set(name) <= set('abcdefghijklmnopqrstuvwxyz') for name in names)
+
+
+def test_script_export(model, tmp_path):
+    '''A freshly exported loop loads without the model code and matches it.'''
+
+    scripted = torch.jit.load(export_script(f'{CHECKPOINT}.pt', str(tmp_path / 'model.torchscript')))
+    assert scripted('nicm', 1, temperature=0.0) == [model.predict_max('nicm')[0]]
+
+
+def test_int8_distribution_drift(model, int8_model, corpus_names):
+    '''Quantization barely moves the next letter distributions over the corpus, see quantize.compare.'''
+
+    log_p = next_letter_log_probs(model, corpus_names)
+    log_q = next_letter_log_probs(int8_model, corpus_names)
+    kl = (log_p.exp() * (log_p - log_q)).sum(dim=1)
+    assert float(kl.mean()) < 0.05
+    assert float((log_p.argmax(dim=1) == log_q.argmax(dim=1)).double().mean()) > 0.9
+    assert int8_model.score(corpus_names)[0].mean() == pytest.approx(model.score(corpus_names)[0].mean(), abs=0.5)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_int8_decodes_every_seed(int8_model, seed):
+    '''The quantized model runs every decoding method, reproducibly from an rng_seed.'''
+
+    name, prob_total = int8_model.predict_max(seed)
+    assert name.startswith(seed) and 0 < prob_total <= 1
+    assert int8_model.predict_beam(seed, k=1)[0][0] == name
+    names = int8_model.predict_batch(seed, 10, rng_seed=1)
+    assert all(name.startswith(seed) for name in names)
+    assert int8_model.predict_batch(seed, 10, rng_seed=1) == names
+
+
+def test_numpy_stream(numpy_model):
+    '''The NumPy engine streams the names of its batch with the same settings.'''
+
+    names = list(numpy_model.iter_names('ab', 30, rng_seed=3))
+    assert sorted(names) == sorted(numpy_model.predict_batch('ab', 30, rng_seed=3))
+    assert len(list(numpy_model.iter_names('ab', 50, chunk_size=16, rng_seed=3))) == 50
+
+
+def test_mmap_weights_match(model, mmap_model):
+    '''The memory-mapped parameters hold exactly the weights of the .pt checkpoint.'''
+
+    mapped = mmap_model.state_dict()
+    for name, tensor in model.state_dict().items():
+        assert torch.equal(mapped[name], tensor)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_mmap_decoding_matches(model, mmap_model, seed):
+    '''The memory-mapped model generates the same names as the float model, sampled ones included.'''
+
+    assert mmap_model.predict_max(seed) == model.predict_max(seed)
+    assert mmap_model.predict_beam(seed, k=3) == model.predict_beam(seed, k=3)
+    assert mmap_model.predict_batch(seed, 20, rng_seed=5) == model.predict_batch(seed, 20, rng_seed=5)
+
+
+def test_mmap_round_trip(model, tmp_path):
+    '''Converting to the memory-mapped format and back gives the original state dict and header.'''
+
+    mmap_path = export_mmap(f'{CHECKPOINT}.pt', str(tmp_path / 'model.rxw'))
+    header, _ = read_header(mmap_path)
+    assert (header['hidden_size'], header['num_layers']) == (128, 2)
+    state_dict = torch.load(export_pt(mmap_path, str(tmp_path / 'model.pt')))
+    for name, tensor in model.state_dict().items():
+        assert torch.equal(state_dict[name], tensor)
+
+
+def test_embedding_converts_back_losslessly(model, embedding_model):
+    '''Converting the embedding model back to one-hot weights gives the original checkpoint.'''
+
+    state_dict = embedding_model.onehot_state_dict()
+    assert list(state_dict) == list(model.state_dict())
+    for name, tensor in model.state_dict().items():
+        assert torch.equal(state_dict[name], tensor)
+
+
+def test_trained_embedding_folds_into_onehot_weights(model, corpus_names):
+    '''Once the embedding has moved away from the identity, the saved one-hot weights still compute the same model.'''
+
+    trained = load_embedding(f'{CHECKPOINT}.pt')
+    with torch.no_grad():
+        trained.embedding.weight.add_(torch.randn(27, 27, generator=torch.Generator().manual_seed(0)) * 0.1)
+    onehot = type(model)(128, 2)
+    onehot.load_state_dict(trained.onehot_state_dict())
+    assert onehot.score(corpus_names[:200])[0] == pytest.approx(trained.score(corpus_names[:200])[0], abs=1e-3)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_embedding_decoding_matches(model, embedding_model, seed):
+    '''The embedding model generates the same names as the one-hot model, sampled ones included.'''
+
+    name, prob_total = embedding_model.predict_max(seed)
+    expected_name, expected_prob = model.predict_max(seed)
+    assert name == expected_name
+    assert prob_total == pytest.approx(expected_prob, rel=1e-4)
+    assert [name for name, _ in embedding_model.predict_beam(seed, k=3)] == \
+        [name for name, _ in model.predict_beam(seed, k=3)]
+    assert embedding_model.predict_batch(seed, 20, rng_seed=5) == model.predict_batch(seed, 20, rng_seed=5)
+
+
+def test_embedding_score_matches(model, embedding_model, corpus_names):
+    '''The embedding model scores names like the one-hot model.'''
+
+    log_likelihoods, _ = embedding_model.score(corpus_names)
+    assert log_likelihoods == pytest.approx(model.score(corpus_names)[0], abs=1e-3)
@@ -0,0 +1,83 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import torch
+
+from models.lstm import LSTMGenerator
+from models.cache import PrefixCache
+from conftest import CHECKPOINT, SEEDS
+
+
+@pytest.fixture
+def cached_model():
+    '''Copy of the test model reading its seed states from a small prefix cache.'''
+
+    model = LSTMGenerator(128, 2)
+    model.load_state_dict(torch.load(f'{CHECKPOINT}.pt', map_location='cpu'))
+    model.enable_prefix_cache(PrefixCache(max_size=3), 'test')
+    return model
+
+
+def test_lru_eviction():
+    '''Entries are evicted least recently used first, and the counters follow the lookups.'''
+
+    cache = PrefixCache(max_size=2)
+    cache.put('m', 'a', 1, (2, 3))
+    cache.put('m', 'b', 4, (5, 6))
+    assert cache.get('m', 'a') == (1, (2, 3))
+    cache.put('m', 'c', 7, (8, 9))
+    assert cache.get('m', 'b') is None
+    assert cache.get('other', 'a') is None
+    assert cache.get('m', 'c') == (7, (8, 9))
+    assert cache.stats() == {'hits': 2, 'misses': 2, 'evictions': 1, 'size': 2, 'max_size': 2}
+    cache.clear()
+    assert len(cache) == 0 and cache.stats()['misses'] == 0
+
+
+def test_cached_states_give_the_same_names(model, cached_model):
+    '''Predictions from cached seed states match the uncached model, on first use and on reuse.'''
+
+    for seed in SEEDS:
+        for _ in range(2):
+            assert cached_model.predict_max(seed) == model.predict_max(seed)
+    stats = cached_model.prefix_cache.stats()
+    assert stats['hits'] > 0 and stats['evictions'] > 0
+
+
+def test_cached_seed_batches(model, cached_model):
+    '''Multi-seed batches mixing cached and new seeds sample the same names as the uncached model.'''
+
+    cached_model.predict_max('zo')
+    seed_counts = [('zo', 5), ('nicm', 5), ('a', 5)]
+    torch.manual_seed(0)
+    names = cached_model.predict_seeds(seed_counts)
+    torch.manual_seed(0)
+    assert names == model.predict_seeds(seed_counts)
+
+
+def test_concurrent_lookups():
+    '''Lookups, inserts and evictions from many threads keep the cache bounded and the counters exact.'''
+
+    cache = PrefixCache(max_size=8)
+
+    def work(thread):
+        for step in range(2000):
+            seed = str((thread * 7 + step) % 20)
+            if cache.get('m', seed) is None:
+                cache.put('m', seed, step, (thread, step))
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(work, range(8)))
+    stats = cache.stats()
+    assert stats['hits'] + stats['misses'] == 8 * 2000
+    assert stats['size'] == len(cache) == 8
+    # Two threads missing the same seed both insert it, and the second insert replaces the first
+    assert 0 < stats['evictions'] <= stats['misses'] - 8
+
+
+def test_streams_feed_the_seed_once(cached_model):
+    '''A stream of several chunks looks its seed up once.'''
+
+    names = list(cached_model.iter_names('zo', 100, chunk_size=16, rng_seed=0))
+    assert len(names) == 100
+    stats = cached_model.prefix_cache.stats()
+    assert (stats['hits'], stats['misses']) == (0, 1)
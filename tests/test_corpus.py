@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+import torch
+import json
+import os
+
+from models.corpus import build_corpus, CorpusDataset, BucketBatchSampler, collate_corpus, CORPUS_PREFIX
+from models.utils import encode_onehot, encode_label, collate_pad
+from conftest import REPO_ROOT
+
+NAMES = ['a', 'zonalone', 'nicm', 'brandate', 'ab']
+
+
+def corpus_batch(names):
+    '''Batch of names with their terminating space, collated the original way.'''
+
+    return collate_pad([(encode_onehot(name + ' '), encode_label(name + ' ')) for name in names])
+
+
+def test_corpus_round_trip(tmp_path):
+    '''Every name reads back from the pre-encoded corpus with its terminating space.'''
+
+    with open(tmp_path / 'names.json', 'w') as f:
+        json.dump(NAMES, f)
+    assert build_corpus(str(tmp_path / 'names.json'), str(tmp_path / 'names')) == len(NAMES)
+    dataset = CorpusDataset(str(tmp_path / 'names'))
+    assert len(dataset) == len(NAMES)
+    for ind, name in enumerate(NAMES):
+        assert np.array_equal(dataset[ind], encode_label(name + ' '))
+
+    # Batches gather any subset of the names, in the requested order
+    labels, lengths = dataset.__getitems__([3, 0, 4])
+    assert list(lengths) == [9, 2, 3]
+    assert np.array_equal(labels[1], [0, 26] + [-1] * 7)
+
+
+def test_collate_corpus_matches_collate_pad(tmp_path):
+    '''Corpus batches build the same packed inputs and padded targets as collate_pad, or packed labels.'''
+
+    with open(tmp_path / 'names.json', 'w') as f:
+        json.dump(NAMES, f)
+    build_corpus(str(tmp_path / 'names.json'), str(tmp_path / 'names'))
+    batch = CorpusDataset(str(tmp_path / 'names')).__getitems__([1, 4, 0, 2])
+    batch_x, batch_y = collate_corpus(batch)
+    expected_x, expected_y = corpus_batch([NAMES[ind] for ind in [1, 4, 0, 2]])
+    assert torch.equal(batch_x.data, expected_x.data)
+    assert torch.equal(batch_x.batch_sizes, expected_x.batch_sizes)
+    assert torch.equal(batch_y, expected_y)
+    index_x, _ = collate_corpus(batch, onehot=False)
+    assert torch.equal(index_x.data, expected_x.data.argmax(dim=1))
+
+
+def test_shipped_corpus_matches_the_names():
+    '''The pre-encoded corpus in data holds the names of names_clean.json.'''
+
+    with open(os.path.join(REPO_ROOT, 'data', 'names_clean.json'), 'r') as f:
+        names = json.load(f)
+    dataset = CorpusDataset(os.path.join(REPO_ROOT, CORPUS_PREFIX))
+    assert len(dataset) == len(names)
+    for ind in [0, 1, len(names) // 2, len(names) - 1]:
+        assert np.array_equal(dataset[ind], encode_label(names[ind] + ' '))
+
+
+@pytest.fixture(scope='module')
+def corpus_lengths():
+    '''Length of every name of the shipped corpus, terminating space included.'''
+
+    return CorpusDataset(os.path.join(REPO_ROOT, CORPUS_PREFIX)).lengths()
+
+
+def test_bucket_batches_cover_every_name(corpus_lengths):
+    '''Each epoch visits every name once, in batches of similar length and of the requested size.'''
+
+    sampler = BucketBatchSampler(corpus_lengths, batch_size=128, bucket_width=2, seed=1)
+    batches = list(sampler)
+    indices = np.concatenate(batches)
+    assert len(indices) == len(corpus_lengths) and len(np.unique(indices)) == len(indices)
+    assert sorted(len(batch) for batch in batches)[1:] == [128] * (len(batches) - 1)
+    spread = [np.ptp(corpus_lengths[batch]) for batch in batches]
+    assert np.mean(spread) <= 2
+
+
+def test_bucket_batches_are_reproducible(corpus_lengths):
+    '''Shuffles differ between epochs, and set_epoch replays an epoch.'''
+
+    sampler = BucketBatchSampler(corpus_lengths, batch_size=64, seed=3)
+    first, second = list(sampler), list(sampler)
+    assert first != second
+    sampler.set_epoch(1)
+    assert list(sampler) == second
+    assert list(BucketBatchSampler(corpus_lengths, batch_size=64, seed=3)) == first
+
+
+def test_token_budget_batches(corpus_lengths):
+    '''Batches built for a token budget never exceed it once padded.'''
+
+    sampler = BucketBatchSampler(corpus_lengths, max_tokens=1024, seed=0)
+    num_batches = len(sampler)
+    batches = list(sampler)
+    assert len(batches) == num_batches
+    assert sum(len(batch) for batch in batches) == len(corpus_lengths)
+    assert all(len(batch) * corpus_lengths[batch].max() <= 1024 for batch in batches)
+    with pytest.raises(ValueError):
+        BucketBatchSampler(corpus_lengths, max_tokens=int(corpus_lengths.max()) - 1)
@@ -0,0 +1,110 @@
+from torch.nn.functional import log_softmax
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import torch
+
+from models.lstm import LSTMGenerator
+from models.ensemble import load_ensemble, space_weight_mix, SPACE_WEIGHT_CHECKPOINTS
+from models.utils import encode_onehot
+
+
+@pytest.fixture(scope='module')
+def ensemble():
+    '''Equally weighted ensemble of the four space weight checkpoints.'''
+
+    return load_ensemble()
+
+
+@pytest.fixture(scope='module')
+def members():
+    '''The four space weight checkpoints loaded as separate models.'''
+
+    models = []
+    for path in SPACE_WEIGHT_CHECKPOINTS:
+        model = LSTMGenerator(128, 2)
+        model.load_state_dict(torch.load(path, map_location='cpu'))
+        models.append(model)
+    return models
+
+
+def name_logits(model, name):
+    '''Logits after every letter of a name, fed in one pass from the zero state.'''
+
+    x = torch.from_numpy(encode_onehot(name).T).float().unsqueeze(0)
+    with torch.inference_mode():
+        y, _ = model(x, model._init_states(1), train=False)
+    return y
+
+
+def test_mixed_logits_are_averaged(ensemble, members):
+    '''The ensemble's next letter distributions come from the weighted mean of the models' logits.'''
+
+    for name in ['nicmor', 'zo', 'brandate']:
+        expected = torch.stack([name_logits(model, name) for model in members]).mean(dim=0)
+        assert torch.allclose(log_softmax(name_logits(ensemble, name), dim=1), log_softmax(expected, dim=1),
+                              atol=1e-5)
+
+
+@pytest.mark.parametrize('ind', range(4))
+def test_single_model_mix(ensemble, members, ind):
+    '''A mix with a single positive weight decodes exactly like that checkpoint.'''
+
+    weights = [0] * 4
+    weights[ind] = 1
+    mixed = ensemble.mix(weights)
+    assert mixed.num_models == 1
+    for seed in ['a', 'zo', 'nicm']:
+        assert mixed.predict_max(seed)[0] == members[ind].predict_max(seed)[0]
+    assert mixed.predict_batch('b', 20, rng_seed=2) == members[ind].predict_batch('b', 20, rng_seed=2)
+
+
+def test_mixes_are_reused(ensemble):
+    '''Recent mixes are kept, whatever the scale of their weights.'''
+
+    mixed = ensemble.mix([0, 1, 1, 0])
+    assert ensemble.mix([0, 0.5, 0.5, 0]) is mixed
+    assert mixed.num_models == 2
+
+
+def test_mixes_are_identified(ensemble):
+    '''Every mix has its own identifier, with or without a prefix cache, and no cache is enabled by default.'''
+
+    identifiers = {ensemble.checkpoint}
+    for weights in ([1, 0, 0, 0], [0, 1, 1, 0], [1, 2, 0, 1]):
+        mixed = ensemble.mix(weights)
+        assert mixed.prefix_cache is None
+        assert mixed.checkpoint.startswith(ensemble.checkpoint.split('|mix=')[0])
+        identifiers.add(mixed.checkpoint)
+    assert None not in identifiers and len(identifiers) == 4
+
+
+def test_concurrent_mixes(ensemble):
+    '''Threads asking for more mixes than are kept all get a mix with the weights they asked for.'''
+
+    weights = [[ind % 4 + 1, ind // 4 % 4, ind // 16 % 4, 1] for ind in range(64)] * 4
+    with ThreadPoolExecutor(8) as pool:
+        mixes = list(pool.map(ensemble.mix, weights))
+    for mix_weights, mixed in zip(weights, mixes):
+        expected = [weight / sum(mix_weights) for weight in mix_weights if weight > 0]
+        assert mixed.weights.tolist() == pytest.approx(expected, abs=1e-4)
+    assert len(ensemble.mixes) == 32
+
+
+def test_predict_each(ensemble, members):
+    '''Names sampled from every model side by side follow each model's own distribution.'''
+
+    results = ensemble.predict_each('nicm', 4, temperature=0)
+    for model, names in zip(members, results):
+        assert names == [model.predict_max('nicm')[0]] * 4
+    results = ensemble.predict_each('a', 10, rng_seed=1)
+    assert [len(names) for names in results] == [10] * 4
+    assert ensemble.predict_each('a', 10, rng_seed=1) == results
+
+
+def test_space_weight_mix():
+    '''Slider positions blend linearly between neighboring checkpoints.'''
+
+    assert space_weight_mix(1) == [0, 1, 0, 0]
+    assert space_weight_mix(1.5) == [0, 0.5, 0.5, 0]
+    assert space_weight_mix(-1) == [1, 0, 0, 0]
+    assert space_weight_mix(7) == [0, 0, 0, 1]
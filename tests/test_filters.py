@@ -0,0 +1,135 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import os
+
+from models.novelty import KnownNames, normalize_name, load_known_names, known_name_files
+from models.constraints import Constraints
+
+
+def test_normalize_name():
+    '''Raw scraped names are cleaned like the training corpus.'''
+
+    assert normalize_name('Tylenol Extra Strength') == 'tylenol'
+    assert normalize_name('Co-Trimoxazole') == 'trimoxazole'
+    assert normalize_name('Café') == 'cafe'
+    assert normalize_name('B12') is None
+
+
+def test_known_names_trie():
+    '''The trie follows names letter by letter and marks the complete ones.'''
+
+    known = KnownNames(['ab', 'abc', 'b'])
+    assert 'abc' in known and 'a' not in known
+    assert KnownNames.is_known(known.node('ab'))
+    assert not KnownNames.is_known(known.node('a'))
+    assert known.node('ac') is None
+    assert KnownNames.is_known(KnownNames.advance(known.node('ab'), 'c'))
+    assert KnownNames.advance(None, 'a') is None
+
+
+def test_known_names_cover_the_corpus():
+    '''The known names include the training corpus, the first of the files read, and are loaded once.'''
+
+    paths = known_name_files()
+    assert paths[0].endswith('names_clean.json')
+    assert all(os.path.isabs(path) and os.path.exists(path) for path in paths)
+    known = load_known_names()
+    assert load_known_names() is known
+    assert 'tylenol' in known
+
+
+@pytest.mark.parametrize('seed', ['a', 'b', 'zo'])
+def test_novel_batch(model, seed):
+    '''Novelty mode returns the requested number of distinct names, none of them real.'''
+
+    known = load_known_names()
+    names = model.predict_batch(seed, 300, rng_seed=0, novel=True)
+    assert len(names) == 300
+    assert len(set(names)) == len(names)
+    assert not any(name in known for name in names)
+
+
+def test_novel_seeds(model):
+    '''Novelty mode applies to every seed of a multi-seed request.'''
+
+    known = load_known_names()
+    for seed, names in zip(['zo', 'b'], model.predict_seeds([('zo', 50), ('b', 50)], rng_seed=0, novel=True)):
+        assert len(set(names)) == len(names) == 50
+        assert all(name.startswith(seed) and name not in known for name in names)
+
+
+@pytest.fixture
+def constraints():
+    '''Length, banned substring and suffix rules that unconstrained samples often break.'''
+
+    return Constraints(min_length=5, max_length=8, banned=['x', 'ine'], suffixes=['a', 'ol'])
+
+
+def test_constraints_check(constraints):
+    '''Finished names are checked against every rule.'''
+
+    assert constraints.check('bacitrol')
+    assert not constraints.check('bola')
+    assert not constraints.check('bacitrola')
+    assert not constraints.check('boxtrol')
+    assert not constraints.check('benzine')
+    assert not constraints.check('bacitre')
+
+
+def test_constraints_reject_impossible_seeds(constraints):
+    '''Seeds that already break a rule, or cannot be completed in time, are rejected up front.'''
+
+    with pytest.raises(ValueError):
+        constraints.start('box')
+    with pytest.raises(ValueError):
+        constraints.start('bacitraxyz')
+    assert constraints.start('bac') >= 0
+
+
+@pytest.mark.parametrize('seed', ['b', 'zo', ''])
+def test_constrained_batch(model, constraints, seed):
+    '''Every name generated under constraints satisfies them, and the counters add up.'''
+
+    names = model.predict_batch(seed, 200, rng_seed=0, constraints=constraints)
+    assert names
+    assert all(name.startswith(seed) and constraints.check(name) for name in names)
+    assert constraints.attempted == 200
+    assert constraints.accepted == len(names)
+    assert constraints.acceptance_rate() == len(names) / 200
+
+
+def test_shared_constraints_count_every_request(model, constraints):
+    '''Concurrent requests sharing one Constraints object all add to its counters.'''
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda rng_seed: model.predict_batch('b', 50, rng_seed=rng_seed,
+                                                                     constraints=constraints), range(16)))
+    assert constraints.attempted == 16 * 50
+    assert constraints.accepted == sum(len(names) for names in results)
+    assert constraints.acceptance_rate() == constraints.accepted / constraints.attempted
+
+
+def test_constrained_methods(model, constraints):
+    '''Single names and multi-seed requests follow the constraints too.'''
+
+    assert constraints.check(model.predict('b', rng_seed=0, constraints=constraints))
+    for seed, seed_names in zip(['a', 'zo'], model.predict_seeds([('a', 20), ('zo', 20)], rng_seed=0,
+                                                                   constraints=constraints)):
+        assert all(name.startswith(seed) and constraints.check(name) for name in seed_names)
+
+
+def test_novel_names_are_distinct_across_chunks(model):
+    '''Names streamed in novelty mode stay distinct from one chunk to the next.'''
+
+    known = load_known_names()
+    names = list(model.iter_names('zo', 200, chunk_size=16, rng_seed=0, novel=True))
+    assert len(names) == 200
+    assert len(set(names)) == len(names)
+    assert not any(name in known for name in names)
+
+
+def test_constrained_stream(model, constraints):
+    '''Streamed names follow the constraints.'''
+
+    names = list(model.iter_names('zo', 40, chunk_size=8, rng_seed=0, constraints=constraints))
+    assert names and all(constraints.check(name) for name in names)
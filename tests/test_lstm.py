@@ -0,0 +1,231 @@
+from torch.nn.functional import softmax, log_softmax
+import pytest
+import numpy as np
+import torch
+
+from models.lstm import sample_letters
+from models.benchmark import predict_legacy
+from models.utils import encode_onehot, LETTER_DICT, LABEL_DICT
+from conftest import SEEDS
+
+
+def name_outputs(model, name):
+    '''Logits after every letter of a name, fed in one pass from the zero state.'''
+
+    x = torch.from_numpy(encode_onehot(name).T).float().unsqueeze(0)
+    states = (torch.zeros(model.num_layers, 1, model.hidden_size), torch.zeros(model.num_layers, 1, model.hidden_size))
+    with torch.inference_mode():
+        y, _ = model(x, states, train=False)
+    return y
+
+
+def greedy_reencoded(model, seed):
+    '''
+    Greedy decoding the way the original loop did it, re-encoding the whole growing name at every step,
+    but from the zero state each time: the original loop also re-applied the carried state to the prefix,
+    which is the behavior incremental decoding dropped.
+    '''
+
+    name = seed
+    prob_total = 1
+    while True:
+        probs_next = softmax(name_outputs(model, name)[-1, :], dim=0)
+        letter_ind = int(probs_next.argmax())
+        prob_total *= float(probs_next[letter_ind])
+        if letter_ind == 26:
+            return name, prob_total
+        name += LETTER_DICT[letter_ind]
+
+
+@pytest.mark.parametrize('seed', [seed for seed in SEEDS if seed])
+def test_incremental_matches_reencoding(model, seed):
+    '''Feeding one letter per step from the carried state gives the same greedy name as re-encoding.'''
+
+    name, prob_total = model.predict_max(seed)
+    expected_name, expected_prob = greedy_reencoded(model, seed)
+    assert name == expected_name
+    assert prob_total == pytest.approx(expected_prob, rel=1e-4)
+
+
+@pytest.mark.parametrize('seed', [seed for seed in SEEDS if seed])
+def test_legacy_loop_still_runs(model, seed):
+    '''The original loop is kept in the benchmarks as a baseline and still decodes from the seed.'''
+
+    for greedy in (True, False):
+        name, prob_total = predict_legacy(model, seed, greedy)
+        assert name.startswith(seed)
+        assert 0 < prob_total <= 1
+
+
+def test_sampling_arguments_are_positional(model):
+    '''The sampling settings follow the seed, so a positional temperature of 0 decodes greedily.'''
+
+    assert model.predict('zo', 0) == model.predict_max('zo')[0]
+    with pytest.raises(TypeError):
+        model.predict_max('zo', incremental=False)
+
+
+def test_incremental_sampling_stays_in_vocabulary(model):
+    '''Sampled names start with their seed and only contain lowercase letters.'''
+
+    for rng_seed in range(10):
+        name = model.predict('zo', rng_seed=rng_seed)
+        assert name.startswith('zo')
+        assert set(name) <= set(LETTER_DICT[ind] for ind in range(26))
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_batch_names(model, seed):
+    '''A batch holds the requested number of names, each starting with the seed.'''
+
+    names = model.predict_batch(seed, 50)
+    assert len(names) == 50
+    assert all(name.startswith(seed) and set(name) <= set(LETTER_DICT[ind] for ind in range(26)) for name in names)
+
+
+def test_batch_samples_the_model(model):
+    '''Batched sampling follows the model: a name with probability 0.66 is by far the most common one.'''
+
+    torch.manual_seed(0)
+    names = model.predict_batch('zo', 500)
+    greedy_name, prob_total = model.predict_max('zo')
+    assert max(set(names), key=names.count) == greedy_name
+    assert names.count(greedy_name) / 500 == pytest.approx(prob_total, abs=0.1)
+
+
+def test_seed_counts(model):
+    '''Multi-seed requests return one list per (seed, count) pair, repeated seeds included.'''
+
+    seed_counts = [('a', 3), ('nicm', 0), ('zo', 4), ('a', 2), ('brand', 1)]
+    results = model.predict_seeds(seed_counts)
+    assert [len(names) for names in results] == [3, 0, 4, 2, 1]
+    for (seed, _), names in zip(seed_counts, results):
+        assert all(name.startswith(seed) for name in names)
+    assert model.predict_seeds([]) == []
+
+
+def test_packed_seeds_sample_the_model(model):
+    '''Seeds of different lengths encoded in one packed pass each follow their own distribution.'''
+
+    torch.manual_seed(0)
+    results = model.predict_seeds([('zo', 500), ('nicm', 500)])
+    for seed, names in zip(['zo', 'nicm'], results):
+        greedy_name, prob_total = model.predict_max(seed)
+        assert max(set(names), key=names.count) == greedy_name
+        assert names.count(greedy_name) / 500 == pytest.approx(prob_total, abs=0.1)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_beam_of_one_is_greedy(model, seed):
+    '''A beam of width 1 keeps the most likely letter at every step, like predict_max.'''
+
+    (name, log_prob), = model.predict_beam(seed, k=1)
+    expected_name, expected_prob = model.predict_max(seed)
+    assert name == expected_name
+    assert log_prob == pytest.approx(np.log(expected_prob), abs=1e-4)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_beam_is_ranked(model, seed):
+    '''Wider beams return distinct names, most likely first, at least as likely as the greedy name.'''
+
+    results = model.predict_beam(seed, k=5)
+    names = [name for name, _ in results]
+    log_probs = [log_prob for _, log_prob in results]
+    assert len(set(names)) == len(names)
+    assert all(name.startswith(seed) for name in names)
+    assert log_probs == sorted(log_probs, reverse=True)
+    assert log_probs[0] >= np.log(model.predict_max(seed)[1]) - 1e-4
+
+
+def manual_log_likelihood(model, name):
+    '''Log probability of every letter after the first and of the terminating space, one name at a time.'''
+
+    log_probs = log_softmax(name_outputs(model, name).double(), dim=1)
+    targets = [LABEL_DICT[letter] for letter in name[1:] + ' ']
+    return float(sum(log_probs[step, target] for step, target in enumerate(targets)))
+
+
+def test_score_matches_manual_log_likelihood(model):
+    '''Packed, chunked scoring gives the same log likelihoods as feeding each name on its own.'''
+
+    names = ['a', 'zonalone', 'nicmor', 'brandate', 'quiviaceo', 'xylophonex', 'ab']
+    log_likelihoods, surprisals = model.score(names, chunk_size=3)
+    for name, log_likelihood, surprisal in zip(names, log_likelihoods, surprisals):
+        assert log_likelihood == pytest.approx(manual_log_likelihood(model, name), abs=1e-4)
+        assert len(surprisal) == len(name)
+        assert -surprisal.sum() == pytest.approx(log_likelihood)
+
+
+def test_score_matches_greedy_probability(model):
+    '''With a one letter seed, the greedy name's probability is its score.'''
+
+    name, prob_total = model.predict_max('q')
+    log_likelihoods, _ = model.score([name])
+    assert log_likelihoods[0] == pytest.approx(np.log(prob_total), abs=1e-4)
+
+
+def test_iter_scores_streams_in_order(model):
+    '''Scores of a lazily generated name list come out in input order, whatever the chunk size.'''
+
+    names = ['nicmor', 'zo', 'brandate', 'a', 'quiviaceo']
+    log_likelihoods, _ = model.score(names)
+    streamed = [log_likelihood for log_likelihood, _ in model.iter_scores(iter(names), chunk_size=2)]
+    assert streamed == pytest.approx(list(log_likelihoods), abs=1e-5)
+
+
+def test_seeded_sampling_is_reproducible(model):
+    '''The same rng_seed gives the same names, whatever was sampled in between.'''
+
+    names = model.predict_batch('a', 50, temperature=0.8, top_k=10, top_p=0.9, rng_seed=7)
+    model.predict_batch('a', 50)
+    assert model.predict_batch('a', 50, temperature=0.8, top_k=10, top_p=0.9, rng_seed=7) == names
+    assert model.predict_batch('a', 50, temperature=0.8, top_k=10, top_p=0.9, rng_seed=8) != names
+    assert model.predict_seeds([('a', 5), ('zo', 5)], rng_seed=7) == \
+        model.predict_seeds([('a', 5), ('zo', 5)], rng_seed=7)
+    assert [model.predict('nicm', rng_seed=seed) for seed in range(5)] == \
+        [model.predict('nicm', rng_seed=seed) for seed in range(5)]
+
+
+@pytest.mark.parametrize('settings', [{'temperature': 0}, {'top_k': 1}, {'top_p': 1e-6}])
+def test_sampling_settings_reducing_to_greedy(model, settings):
+    '''Temperature 0, top_k 1 and a tiny top_p all keep only the most likely letter.'''
+
+    name, _ = model.predict_max('zo')
+    assert model.predict_batch('zo', 5, **settings) == [name] * 5
+    assert model.predict('zo', **settings) == name
+
+
+def test_sample_letters_top_k():
+    '''Top-k sampling never picks a letter outside the k best of its row.'''
+
+    logits = torch.randn(200, 27, generator=torch.Generator().manual_seed(0))
+    letter_inds = sample_letters(logits, top_k=3, generator=torch.Generator().manual_seed(1))
+    allowed = logits.topk(3, dim=1).indices
+    assert (allowed == letter_inds.unsqueeze(1)).any(dim=1).all()
+
+
+def test_iter_names_matches_batch(model):
+    '''Streamed names are the names of the batch with the same settings, in finishing order.'''
+
+    names = list(model.iter_names('ab', 30, temperature=0.8, rng_seed=3))
+    assert sorted(names) == sorted(model.predict_batch('ab', 30, temperature=0.8, rng_seed=3))
+    assert names == list(model.iter_names('ab', 30, temperature=0.8, rng_seed=3))
+    assert len(list(model.iter_names('a', 50, chunk_size=16, rng_seed=7))) == 50
+
+
+def test_iter_names_yields_each_name_as_it_finishes(model):
+    '''The first name is handed over as soon as it finishes, before the rest of its chunk is decoded.'''
+
+    steps = []
+    hook = model.lstm.register_forward_hook(lambda *args: steps.append(1))
+    try:
+        names = model.iter_names('zo', 64, chunk_size=64, rng_seed=0)
+        next(names)
+        first = len(steps)
+        assert not torch.is_inference_mode_enabled()
+        rest = list(names)
+    finally:
+        hook.remove()
+    assert len(rest) == 63
+    assert first < len(steps)
@@ -0,0 +1,129 @@
+import pytest
+import shutil
+import os
+
+from models.registry import ModelRegistry, TRAINED_DIR, parse_checkpoint_name, format_checkpoint_name
+from models.numpy_lstm import NumpyLSTMGenerator
+from models.embedding import EmbeddingLSTMGenerator
+from conftest import CHECKPOINT
+
+
+def test_parse_checkpoint_names():
+    '''Hyperparameters and format are read from every checkpoint name, and other files are ignored.'''
+
+    for suffix, fmt in (('.pt', 'pt'), ('_int8.pt', 'int8'), ('.npz', 'npz'), ('.rxw', 'rxw')):
+        assert parse_checkpoint_name(f'models/trained/lstm2_hs128_bs64_ep100_sw0-05{suffix}') == {
+            'num_layers': 2,
+            'hidden_size': 128,
+            'batch_size': 64,
+            'epochs': 100,
+            'space_weight': 0.05,
+            'format': fmt
+        }
+    assert parse_checkpoint_name('lstm1_hs64_bs128_ep100_sw1.pt')['space_weight'] == 1.0
+    assert parse_checkpoint_name('lstm2_hs128_bs128_ep100_sw0-05.json') is None
+    assert parse_checkpoint_name('model.pt') is None
+
+
+@pytest.mark.parametrize('space_weight', [0.05, 0.5, 1, 2.0, 0.1, 0.005, 5e-05, 0.123])
+def test_checkpoint_name_round_trip(space_weight):
+    '''Hyperparameters written into a checkpoint name are read back unchanged, in fixed point.'''
+
+    name = format_checkpoint_name(2, 128, 64, 100, space_weight)
+    assert 'e' not in name.split('_sw')[1]
+    for suffix, fmt in (('.pt', 'pt'), ('_int8.pt', 'int8'), ('.npz', 'npz'), ('.rxw', 'rxw')):
+        info = parse_checkpoint_name(name + suffix)
+        assert info == {
+            'num_layers': 2,
+            'hidden_size': 128,
+            'batch_size': 64,
+            'epochs': 100,
+            'space_weight': space_weight,
+            'format': fmt
+        }
+
+
+def test_checkpoint_names():
+    '''Names follow the original scheme, and values outside it are refused.'''
+
+    assert format_checkpoint_name(2, 128, 128, 100, 0.05) == 'lstm2_hs128_bs128_ep100_sw0-05'
+    assert format_checkpoint_name(1, 64, 128, 100, 5e-05) == 'lstm1_hs64_bs128_ep100_sw0-00005'
+    assert format_checkpoint_name(1, 64, 128, 100, 1) == 'lstm1_hs64_bs128_ep100_sw1'
+    with pytest.raises(ValueError):
+        format_checkpoint_name(1, 64, 128, 100, -0.5)
+    assert parse_checkpoint_name('lstm2_hs128_bs128_ep100_sw0-05.json') is None
+    assert parse_checkpoint_name('model.pt') is None
+
+
+def test_registry_catalog():
+    '''The registry finds every format of the pretrained checkpoints and loads each once.'''
+
+    registry = ModelRegistry()
+    base = os.path.basename(CHECKPOINT)
+    for fmt, filename in (('pt', f'{base}.pt'), ('int8', f'{base}_int8.pt'), ('npz', f'{base}.npz'),
+                          ('rxw', f'{base}.rxw')):
+        assert filename in registry.names(fmt)
+    assert len(registry.names('pt')) == 4
+    model = registry.get(f'{base}.pt')
+    assert registry.get(f'{base}.pt') is model
+    assert model.checkpoint.startswith(os.path.join(TRAINED_DIR, f'{base}.pt@')) and model.prefix_cache is None
+    assert isinstance(registry.get(f'{base}.npz'), NumpyLSTMGenerator)
+    assert registry.stats()['loads'] == 2
+    with pytest.raises(KeyError):
+        registry.get('lstm9_hs1_bs1_ep1_sw1.pt')
+
+
+def test_registry_ensemble(model):
+    '''Float checkpoints load together as one ensemble, reused while resident.'''
+
+    registry = ModelRegistry()
+    names = registry.names('pt')
+    ensemble = registry.get_ensemble(names)
+    assert ensemble.num_models == 4
+    assert registry.get_ensemble(names) is ensemble
+    assert [part.split('@')[0] for part in ensemble.base_checkpoint.split(',')] == \
+        [os.path.join(TRAINED_DIR, name) for name in names]
+    assert ensemble.mix([1, 1, 0, 0]).checkpoint.startswith(ensemble.base_checkpoint)
+    assert ensemble.mix([0, 1, 0, 0]).predict_max('zo')[0] == model.predict_max('zo')[0]
+
+
+def test_registry_hot_swap(tmp_path):
+    '''New and changed files are picked up without a restart, and the memory budget evicts old models.'''
+
+    names = ['lstm2_hs128_bs128_ep100_sw0-05.pt', 'lstm2_hs128_bs128_ep100_sw0-5.pt']
+    shutil.copy(os.path.join(TRAINED_DIR, names[0]), tmp_path / names[0])
+    registry = ModelRegistry(str(tmp_path), memory_budget=os.path.getsize(tmp_path / names[0]))
+    assert registry.names() == names[:1]
+    model = registry.get(names[0])
+
+    # A changed file is reloaded on its next use
+    stat = os.stat(tmp_path / names[0])
+    os.utime(tmp_path / names[0], (stat.st_atime, stat.st_mtime + 10))
+    assert registry.get(names[0]) is not model
+
+    # A new file is found on first use, and only one model fits the budget
+    shutil.copy(os.path.join(TRAINED_DIR, names[1]), tmp_path / names[1])
+    registry.get(names[1])
+    stats = registry.stats()
+    assert stats['loads'] == 3
+    assert stats['evictions'] == 2
+    assert stats['resident'] == names[1:]
+
+
+def test_registry_mmap(model):
+    '''Memory-mapped checkpoints are described from their header and load like the .pt file.'''
+
+    registry = ModelRegistry()
+    name = f'{os.path.basename(CHECKPOINT)}.rxw'
+    info = registry.checkpoints[name]
+    assert (info['format'], info['num_layers'], info['hidden_size']) == ('rxw', 2, 128)
+    assert registry.get(name).predict_max('nicm') == model.predict_max('nicm')
+
+
+def test_registry_embedding(model):
+    '''Float checkpoints can be served by the embedding model.'''
+
+    registry = ModelRegistry(embedding=True)
+    embedding_model = registry.get(f'{os.path.basename(CHECKPOINT)}.pt')
+    assert isinstance(embedding_model, EmbeddingLSTMGenerator)
+    assert embedding_model.predict_max('zo')[0] == model.predict_max('zo')[0]
@@ -0,0 +1,80 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import torch
+
+from models.scheduler import BatchScheduler, sample_rows
+from models.novelty import load_known_names
+
+
+@pytest.fixture
+def scheduler(model):
+    '''Scheduler with a wait long enough to batch the requests of a test together.'''
+
+    scheduler = BatchScheduler(model, max_wait=0.05)
+    yield scheduler
+    scheduler.close()
+
+
+def test_seeded_requests_match_predict_batch(model, scheduler):
+    '''Requests with an rng_seed get the names predict_batch gives for the same settings, in finishing order.'''
+
+    settings = {'temperature': 0.8, 'top_k': 10, 'top_p': 0.9, 'rng_seed': 3}
+    names = scheduler.generate('ab', 30, **settings)
+    assert sorted(names) == sorted(model.predict_batch('ab', 30, **settings))
+    assert names == list(model.iter_names('ab', 30, **settings))
+
+
+def test_novel_requests_match_predict_batch(model, scheduler):
+    '''Requests in novelty mode get distinct names that are not real brand names.'''
+
+    names = scheduler.generate('b', 50, rng_seed=0, novel=True)
+    assert sorted(names) == sorted(model.predict_batch('b', 50, rng_seed=0, novel=True))
+    assert len(set(names)) == 50
+    assert not any(name in load_known_names() for name in names)
+
+
+@pytest.mark.parametrize('settings', [{'temperature': 0}, {'top_k': 1}, {'top_p': 1e-6}])
+def test_greedy_requests_match_predict_batch(model, scheduler, settings):
+    '''Shared batch rows sampled greedily give the same names as predict_batch.'''
+
+    for seed in ['', 'zo', 'nicm']:
+        assert scheduler.generate(seed, 3, **settings) == model.predict_batch(seed, 3, **settings)
+
+
+def test_concurrent_requests_are_batched(model, scheduler):
+    '''Concurrent requests with different seeds, counts and settings share batches and get their own names.'''
+
+    requests = [('a', 5, {}), ('zo', 3, {'temperature': 0}), ('', 4, {'top_k': 3}), ('nicm', 2, {'top_p': 0.5}),
+                ('zo', 6, {'temperature': 1.5})] * 4
+    streamed = []
+
+    def call(request):
+        seed, n, settings = request
+        return scheduler.submit(seed, n, on_name=streamed.append, **settings).result(timeout=30)
+
+    with ThreadPoolExecutor(len(requests)) as pool:
+        results = list(pool.map(call, requests))
+    greedy_name, _ = model.predict_max('zo')
+    for (seed, n, settings), names in zip(requests, results):
+        assert len(names) == n
+        assert all(name.startswith(seed) for name in names)
+        if settings.get('temperature') == 0:
+            assert names == [greedy_name] * n
+    assert sorted(streamed) == sorted(name for names in results for name in names)
+    stats = scheduler.stats()
+    assert stats['batches'] < len(requests)
+    assert stats['mean_batch_requests'] > 1
+
+
+def test_sample_rows_settings():
+    '''Each row is sampled with its own temperature, top-k and top-p.'''
+
+    logits = torch.randn(300, 27, generator=torch.Generator().manual_seed(0))
+    temperature = torch.tensor([0.0, 1.0, 1.0] * 100)
+    top_k = torch.tensor([27, 3, 27] * 100)
+    top_p = torch.tensor([1.0, 1.0, 1e-6] * 100)
+    letter_inds = sample_rows(logits, temperature, top_k, top_p, torch.Generator().manual_seed(1))
+    best = logits.argmax(dim=1)
+    assert torch.equal(letter_inds[0::3], best[0::3])
+    assert (logits[1::3].topk(3, dim=1).indices == letter_inds[1::3].unsqueeze(1)).any(dim=1).all()
+    assert torch.equal(letter_inds[2::3], best[2::3])
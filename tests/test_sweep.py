@@ -0,0 +1,70 @@
+import numpy as np
+import os
+
+from models.sweep import grid_trials, random_trials, split_corpus, run_trial, format_results, SWEEP_SPACE, \
+    RANDOM_RANGES, RESULT_FIELDS
+from models.registry import format_checkpoint_name, parse_checkpoint_name
+
+
+def test_grid_trials():
+    '''The grid holds every combination of the hyperparameter values once.'''
+
+    trials = grid_trials()
+    assert len(trials) == np.prod([len(values) for values in SWEEP_SPACE.values()])
+    assert len({tuple(trial.values()) for trial in trials}) == len(trials)
+    assert all(trial[key] in values for trial in trials for key, values in SWEEP_SPACE.items())
+
+
+def test_random_trials():
+    '''Random trials draw the ranged hyperparameters within their range and the others from the space.'''
+
+    trials = random_trials(50, seed=1)
+    assert len(trials) == 50
+    for trial in trials:
+        assert list(trial) == list(SWEEP_SPACE)
+        for key, values in SWEEP_SPACE.items():
+            if key in RANDOM_RANGES:
+                low, high = RANDOM_RANGES[key]
+                assert low <= trial[key] <= high
+            else:
+                assert trial[key] in values
+        name = format_checkpoint_name(trial['num_layers'], trial['hidden_size'], trial['batch_size'], trial['epochs'],
+                                      trial['space_weight'])
+        assert parse_checkpoint_name(f'{name}.pt')['space_weight'] == trial['space_weight']
+    assert len({trial['space_weight'] for trial in trials}) > 40
+    assert random_trials(50, seed=1) == trials
+    assert random_trials(50, seed=2) != trials
+
+
+def test_split_corpus():
+    '''The validation names are a fixed, disjoint share of the corpus.'''
+
+    train_inds, val_inds = split_corpus(1000, val_fraction=0.1, seed=2)
+    assert len(val_inds) == 100
+    assert np.array_equal(np.sort(np.concatenate([train_inds, val_inds])), np.arange(1000))
+    assert np.array_equal(split_corpus(1000, val_fraction=0.1, seed=2)[1], val_inds)
+
+
+def test_format_results():
+    '''Results are laid out as a header line and one aligned line per trial.'''
+
+    row = dict(zip(RESULT_FIELDS, ['lstm1_hs64_bs128_ep100_sw0-5', 1, 64, 128, 100, 0.01, 0.5, 1.25, -12.5, 7.5,
+                                   0.9, 30.0]))
+    lines = format_results([row, row]).split('\n')
+    assert len(lines) == 3
+    assert lines[0].split() == RESULT_FIELDS
+    assert lines[1] == lines[2] and lines[1].split()[0] == row['checkpoint']
+    assert lines[0].index('val_log_likelihood') == lines[1].index('-12.5')
+
+
+def test_run_trial(tmp_path):
+    '''A trial saves its checkpoint and reports a bounded mean length, even for a barely trained model.'''
+
+    trial = {'hidden_size': 8, 'num_layers': 1, 'batch_size': 128, 'learning_rate': 0.01, 'epochs': 1,
+             'space_weight': 0.01}
+    row = run_trial(trial, str(tmp_path), names_per_letter=5, max_length=12)
+    assert set(row) == set(RESULT_FIELDS)
+    assert os.path.exists(tmp_path / row['checkpoint'])
+    assert parse_checkpoint_name(row['checkpoint'])['space_weight'] == 0.01
+    assert 1 <= row['mean_length'] <= 12
+    assert row['val_log_likelihood'] < 0
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+import torch
+
+from models.utils import encode_onehot, encode_label, encode_label_batch, encode_onehot_batch, collate_pad, \
+    collate_names, encode_char_onehot
+
+NAMES = ['a', 'zonalone', 'nicm ', 'brandate', 'ab']
+
+
+def test_encoders_match_per_letter_encoding():
+    '''The table encoders give the arrays built letter by letter, and reject characters outside the vocabulary.'''
+
+    for name in NAMES:
+        assert np.array_equal(encode_onehot(name), np.array([encode_char_onehot(char) for char in name]).T)
+        assert encode_label(name).dtype == np.int64
+        assert np.array_equal(encode_label(name), encode_onehot(name).argmax(axis=0))
+    for name in ['Ab', 'a1', 'café']:
+        with pytest.raises(KeyError):
+            encode_label(name)
+
+
+def test_batch_encoders_match_single_encoders():
+    '''Batch encoders give the single encodings padded to the longest name.'''
+
+    labels, lengths = encode_label_batch(NAMES)
+    onehot, _ = encode_onehot_batch(NAMES)
+    assert list(lengths) == [len(name) for name in NAMES]
+    assert labels.shape == onehot.shape[:2] == (len(NAMES), 8)
+    for row, name in enumerate(NAMES):
+        assert np.array_equal(labels[row, :len(name)], encode_label(name))
+        assert (labels[row, len(name):] == -1).all()
+        assert np.array_equal(onehot[row, :len(name)], encode_onehot(name).T)
+        assert (onehot[row, len(name):] == -1).all()
+    labels, lengths = encode_label_batch([])
+    assert labels.shape == (0, 0) and len(lengths) == 0
+
+
+def test_collate_names_matches_collate_pad():
+    '''Collating names directly builds the same packed batch as collate_pad.'''
+
+    batch_x, batch_y = collate_names(NAMES)
+    expected_x, expected_y = collate_pad([(encode_onehot(name), encode_label(name)) for name in NAMES])
+    assert torch.equal(batch_x.data, expected_x.data)
+    assert torch.equal(batch_x.batch_sizes, expected_x.batch_sizes)
+    assert torch.equal(batch_y, expected_y)
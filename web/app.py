@@ -1,27 +1,292 @@
 import dash
-from dash import Dash, Input, Output, State
+from dash import Dash, Input, Output, State, ClientsideFunction
+from flask import Response, jsonify, request, stream_with_context
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
-import torch
+import numpy as np
 import string
+import math
 import sys
 import os
-from collections import Counter
+import threading
+import queue
+import json
+import uuid
+from collections import Counter, OrderedDict
 
 # Custom module imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 from web.layout import layout, graph_layout_names, graph_layout_letters
-from models.lstm import LSTMGenerator
-
-# Model instantiation
-device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-model = LSTMGenerator(128, 2)
-model.load_state_dict(
-    torch.load(
-        'models/trained/lstm2_hs128_bs128_ep100_sw0-05.pt',
-        map_location=device
-    )
-)
+from models.cache import PrefixCache
+from models.registry import ModelRegistry, parse_checkpoint_name
+
+# Models are loaded lazily from the checkpoints in models/trained, RX_BACKEND=numpy serves the NumPy
+# engine (.npz) and never imports torch, RX_QUANTIZED=1 serves int8 dynamically quantized checkpoints
+# (CPU only) and RX_MMAP=1 serves memory-mapped .rxw checkpoints, which worker processes share.
+# RX_EMBEDDING=1 feeds the single torch checkpoints letter indices instead of one-hot vectors.
+# The default torch backend also offers the space weight ensemble, mixed with the slider
+if os.environ.get('RX_BACKEND', 'torch') == 'numpy':
+    checkpoint_format = 'npz'
+    device = 'cpu'
+elif os.environ.get('RX_QUANTIZED'):
+    checkpoint_format = 'int8'
+    device = 'cpu'
+elif os.environ.get('RX_MMAP'):
+    checkpoint_format = 'rxw'
+    device = 'cpu'
+else:
+    import torch
+    checkpoint_format = 'pt'
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+registry = ModelRegistry(device=device, prefix_cache=PrefixCache(max_size=4096),
+                         embedding=checkpoint_format == 'pt' and bool(os.environ.get('RX_EMBEDDING')))
+ENSEMBLE = 'ensemble'
+DEFAULT_CHECKPOINT = {
+    'pt': ENSEMBLE,
+    'npz': 'lstm2_hs128_bs128_ep100_sw0-05.npz',
+    'int8': 'lstm2_hs128_bs128_ep100_sw0-05_int8.pt',
+    'rxw': 'lstm2_hs128_bs128_ep100_sw0-05.rxw'
+}[checkpoint_format]
+
+
+def space_weight_names():
+    '''
+    Find the float checkpoints that differ from the default one only in their space weight.
+
+        Returns:
+            names (list): checkpoint file names, sorted from the smallest to the largest space weight
+    '''
+
+    reference = parse_checkpoint_name('lstm2_hs128_bs128_ep100_sw0-05.pt')
+    same_shape = ('num_layers', 'hidden_size', 'batch_size', 'epochs')
+    names = [
+        name for name in registry.names('pt')
+        if all(registry.checkpoints[name].get(key) == reference[key] for key in same_shape)
+    ]
+    return sorted(names, key=lambda name: registry.checkpoints[name]['space_weight'])
+
+
+def get_model(choice, space_mix):
+    '''
+    Get the model to generate with for the selected checkpoint and space weight slider position.
+
+        Parameters:
+            choice (str): checkpoint file name, or ENSEMBLE for the space weight ensemble
+            space_mix (float): slider position, from the smallest to the largest space weight
+
+        Returns:
+            model (LSTMGenerator): loaded model or ensemble mix to generate with
+    '''
+
+    if choice != ENSEMBLE:
+        return registry.get(choice)
+    from models.ensemble import space_weight_mix
+    names = space_weight_names()
+    return registry.get_ensemble(names).mix(space_weight_mix(space_mix, len(names)))
+
+
+# Generation runs stream their names into this server-side buffer, keyed by run id, for the page to poll.
+# Only run summaries (see summarize_run) and the names around the viewed one (see load_names) are sent to the page
+runs = OrderedDict()
+runs_lock = threading.Lock()
+MAX_RUNS = 64
+
+# Finished names of reproducible runs (with a random seed), keyed by all the inputs of the run
+result_cache = OrderedDict()
+MAX_CACHED_RESULTS = 256
+
+# One micro-batching scheduler per torch model, so runs started at the same moment decode together
+schedulers = OrderedDict()
+schedulers_lock = threading.Lock()
+MAX_SCHEDULERS = 8
+
+# Number of most frequent names shown in the name distribution graph, and of names sent to the name viewer at once
+TOP_NAMES = 10
+NAME_WINDOW = 200
+
+# Limits of the input form, also enforced by the JSON API
+MIN_NAMES = 10
+MAX_NAMES = 5000
+
+
+def get_scheduler(gen_model):
+    '''
+    Get the micro-batching scheduler of a model, starting one if needed.
+
+        Parameters:
+            gen_model (LSTMGenerator): model or ensemble mix to generate with
+
+        Returns:
+            scheduler (BatchScheduler): scheduler decoding concurrent requests for the model together
+    '''
+
+    from models.scheduler import BatchScheduler
+
+    with schedulers_lock:
+        key = gen_model.checkpoint
+        if key not in schedulers or schedulers[key].model is not gen_model:
+            schedulers[key] = BatchScheduler(gen_model, max_batch_size=4096, max_wait=0.01)
+        schedulers.move_to_end(key)
+        while len(schedulers) > MAX_SCHEDULERS:
+            _, scheduler = schedulers.popitem(last=False)
+            threading.Thread(target=scheduler.close, daemon=True).start()
+        return schedulers[key]
+
+
+def summarize_run(run):
+    '''
+    Bring the aggregates of a run up to date and summarize it for the page. Each name is only
+    processed once: the names added since the last call are counted in one Counter update, and the
+    letters generated after the seed in one byte histogram. Call with runs_lock held.
+
+        Parameters:
+            run (dict): run entry in the buffer, its aggregates are updated in place
+
+        Returns:
+            summary (dict): run id, number of names, number of unique names, most frequent names,
+                relative frequency of each letter after the seed, most likely names, seed and done flag
+    '''
+
+    new_names = run['names'][run['summarized']:]
+    if new_names:
+        run['name_counts'].update(new_names)
+        seed_length = len(run['used_seed'])
+        letters = ''.join(name[seed_length:] for name in new_names).encode('ascii')
+        byte_counts = np.bincount(np.frombuffer(letters, dtype=np.uint8), minlength=256)
+        run['letter_counts'] += byte_counts[ord('a'):ord('z') + 1]
+        run['summarized'] += len(new_names)
+
+    total_letters = max(int(run['letter_counts'].sum()), 1)
+    summary = {
+        'run_id': run['run_id'],
+        'count': run['summarized'],
+        'unique': len(run['name_counts']),
+        'top_names': run['name_counts'].most_common(TOP_NAMES),
+        'letter_freq': (run['letter_counts'] / total_letters).tolist(),
+        'likely': run['likely'],
+        'used_seed': run['used_seed'],
+        'done': run['done']
+    }
+    return summary
+
+
+def stream_run(run, key, gen_model, seed, num_gen, temperature, top_k, top_p, rng_seed, novel):
+    '''
+    Generate the names of a run in a background thread, appending each one to the run as it finishes.
+
+        Parameters:
+            run (dict): run entry in the buffer, updated in place
+            key (tuple): result cache key of the run
+            gen_model (LSTMGenerator): model or ensemble mix to generate with
+            seed (str): lowercase seed string given to the generator
+            num_gen (int): number of names to generate
+            temperature (float): sampling temperature
+            top_k (int): top-k sampling limit
+            top_p (float): nucleus sampling threshold
+            rng_seed (int): random seed for the request, None for a non-reproducible run
+            novel (bool): flag for only generating distinct names that are not real brand names
+    '''
+
+    def add_name(name):
+        with runs_lock:
+            run['names'].append(name)
+
+    try:
+        # Non-reproducible runs on a torch model share batches with concurrent runs
+        if rng_seed is None and not novel and checkpoint_format != 'npz':
+            future = get_scheduler(gen_model).submit(seed, num_gen, temperature, top_k, top_p, on_name=add_name)
+            future.result()
+        else:
+            for name in gen_model.iter_names(seed, num_gen, temperature=temperature, top_k=top_k, top_p=top_p,
+                                             rng_seed=rng_seed, novel=novel):
+                add_name(name)
+        if rng_seed is not None:
+            with runs_lock:
+                result_cache[key] = list(run['names'])
+                while len(result_cache) > MAX_CACHED_RESULTS:
+                    result_cache.popitem(last=False)
+    finally:
+        with runs_lock:
+            run['done'] = True
+            summarize_run(run)
+
+
+def start_run(seed, num_gen, temperature, top_k, top_p, rng_seed, novel, choice=None, space_mix=1):
+    '''
+    Register a new generation run and start streaming its names, or serve it at once from the result cache.
+
+        Parameters:
+            seed (str): lowercase seed string given to the generator
+            num_gen (int): number of names to generate
+            temperature (float): sampling temperature
+            top_k (int): top-k sampling limit
+            top_p (float): nucleus sampling threshold
+            rng_seed (int): random seed for the request, None for a non-reproducible run
+            novel (bool): flag for only generating distinct names that are not real brand names
+            choice (str): checkpoint file name or ENSEMBLE, None (or a checkpoint that is gone) for the default
+            space_mix (float): space weight slider position, see get_model
+
+        Returns:
+            run_id (str): identifier of the run in the buffer
+    '''
+
+    run_id = uuid.uuid4().hex
+    if choice != ENSEMBLE and choice not in registry.checkpoints:
+        choice = DEFAULT_CHECKPOINT
+    gen_model = get_model(choice, space_mix)
+    key = (gen_model.checkpoint, seed, num_gen, temperature, top_k, top_p, rng_seed, novel)
+    run = {
+        'run_id': run_id,
+        'names': [],
+        'done': False,
+        'likely': gen_model.predict_beam(seed, k=3, max_length=len(seed) + 30),
+        'used_seed': seed,
+        'name_counts': Counter(),
+        'letter_counts': np.zeros(26, dtype=np.int64),
+        'summarized': 0
+    }
+    with runs_lock:
+        runs[run_id] = run
+        while len(runs) > MAX_RUNS:
+            runs.popitem(last=False)
+        cached = result_cache.get(key) if rng_seed is not None else None
+    if cached is not None:
+        with runs_lock:
+            run['names'] = list(cached)
+            run['done'] = True
+            summarize_run(run)
+    else:
+        thread = threading.Thread(
+            target=stream_run,
+            args=(run, key, gen_model, seed, num_gen, temperature, top_k, top_p, rng_seed, novel),
+            daemon=True
+        )
+        thread.start()
+    return run_id
+
+
+def validate_inputs(seed, num_gen):
+    '''
+    Check a seed string and number of names against the input rules, shared by the input form and the JSON API.
+
+        Parameters:
+            seed (str): seed string for the generator
+            num_gen (int): number of names to generate
+
+        Returns:
+            alert_text (str): help message describing the first problem found, or the go-ahead message
+            color (str): bootstrap color for the alert styling, 'success' when the inputs are valid
+    '''
+
+    valid_num = isinstance(num_gen, int) and not isinstance(num_gen, bool) and MIN_NAMES <= num_gen <= MAX_NAMES
+    if not valid_num:
+        return [f'Ensure that the specified number of names is an integer between {MIN_NAMES} and {MAX_NAMES}...', 'danger']
+    if not seed or not isinstance(seed, str):
+        return ['Input how many names to generate and a seed string to get started...', 'warning']
+    if set(seed).difference(string.ascii_letters):
+        return ['Invalid characters present in the seed. Only upper or lowercase English letters are allowed!', 'danger']
+    return ['Press the generate button to produce results!', 'success']
+
 
 # App definition
 app = Dash(
@@ -35,6 +300,65 @@ app = Dash(
 app.layout = layout
 
 
+@app.callback(
+    [Output('checkpoint-select', 'options'),
+     Output('checkpoint-select', 'value'),
+     Output('space-weight-slider', 'max'),
+     Output('space-weight-slider', 'marks')],
+    Input('registry-interval', 'n_intervals'),
+    [State('checkpoint-select', 'value'),
+     State('space-weight-slider', 'value')]
+)
+def refresh_checkpoints(n_intervals, choice, space_mix):
+    '''
+    Rescan the trained checkpoints on page load and periodically after, so checkpoints can be
+    added or replaced without restarting the server.
+
+        Parameters:
+            n_intervals (int): number of rescan ticks, only used to trigger callback
+            choice (str): currently selected checkpoint
+            space_mix (float): current space weight slider position
+
+        Returns:
+            options (list): selectable checkpoints of the served format
+            value (str): selected checkpoint, the default one if the current one is gone
+            slider_max (int): last position of the space weight slider
+            slider_marks (dict): space weight of each checkpoint in the ensemble, by slider position
+    '''
+
+    registry.scan()
+    options = [{'label': name, 'value': name} for name in registry.names(checkpoint_format)]
+    sw_names = space_weight_names() if checkpoint_format == 'pt' else []
+    if sw_names:
+        options.insert(0, {'label': f'Space weight ensemble ({len(sw_names)} checkpoints)', 'value': ENSEMBLE})
+    values = [option['value'] for option in options]
+    value = choice if choice in values else DEFAULT_CHECKPOINT
+    slider_max = max(len(sw_names) - 1, 0)
+    slider_marks = {
+        position: f'sw {registry.checkpoints[name]["space_weight"]:g}' for position, name in enumerate(sw_names)
+    }
+    return [options, value, slider_max, slider_marks]
+
+
+@app.callback(
+    Output('space-weight-slider', 'disabled'),
+    Input('checkpoint-select', 'value')
+)
+def toggle_slider(choice):
+    '''
+    Only enable the space weight slider while the ensemble is selected.
+
+        Parameters:
+            choice (str): selected checkpoint
+
+        Returns:
+            slider_disabled (bool): True unless the ensemble is selected
+    '''
+
+    slider_disabled = choice != ENSEMBLE
+    return slider_disabled
+
+
 @app.callback(
     Output('personal-info-toast', 'is_open'),
     Input('personal-info-toggle', 'n_clicks'),
@@ -57,100 +381,136 @@ def open_personal_info(clicks, curr_state):
     return new_state
 
 
-@app.callback(
+# Input checks run in the browser, see static/clientside.js, with the same rules as validate_inputs
+# and sampling_settings
+app.clientside_callback(
+    ClientsideFunction(namespace='rx', function_name='check_inputs'),
     [Output('inputs-alert', 'children'),
      Output('inputs-alert', 'color'),
      Output('generate-button', 'disabled')],
     [Input('name-seed-input', 'value'),
-     Input('name-num-input', 'value')]
+     Input('name-num-input', 'value'),
+     Input('temperature-input', 'value'),
+     Input('top-k-input', 'value'),
+     Input('top-p-input', 'value'),
+     Input('rng-seed-input', 'value')],
+    [State('name-num-input', 'min'),
+     State('name-num-input', 'max'),
+     State('temperature-input', 'min'),
+     State('temperature-input', 'max'),
+     State('top-k-input', 'min'),
+     State('top-k-input', 'max'),
+     State('top-p-input', 'min'),
+     State('top-p-input', 'max'),
+     State('rng-seed-input', 'min'),
+     State('rng-seed-input', 'max')]
+)
+
+
+@app.callback(
+    [Output('run-id', 'data'),
+     Output('results-interval', 'disabled'),
+     Output('generate-button', 'children')],
+    Input('generate-button', 'n_clicks'),
+    [State('name-seed-input', 'value'),
+     State('name-num-input', 'value'),
+     State('temperature-input', 'value'),
+     State('top-k-input', 'value'),
+     State('top-p-input', 'value'),
+     State('rng-seed-input', 'value'),
+     State('novelty-switch', 'value'),
+     State('checkpoint-select', 'value'),
+     State('space-weight-slider', 'value')],
+    prevent_initial_call=True
 )
-def check_inputs(seed, num_gen):
+def populate_results(clicks, seed, num_gen, temperature, top_k, top_p, rng_seed, novel, choice, space_mix):
     '''
-    Assess the supplied inputs to provide help text and disable/enable the generation button.
+    Start generating names using user input; the names are then streamed to the page by poll_results.
 
         Parameters:
-            seed (str): user supplied input for the seed string for the generator
+            clicks (int): number of clicks of the generate button, only used to trigger callback
+            seed (str): user supplied input for seed string given to generator
             num_gen (int): user supplied input for number of names to generate
+            temperature (float): user supplied sampling temperature, empty means 1 and 0 is greedy
+            top_k (int): user supplied top-k sampling limit, empty means no limit
+            top_p (float): user supplied nucleus sampling threshold, empty means no limit
+            rng_seed (int): user supplied random seed, empty means a new random run each time
+            novel (bool): flag for only generating distinct names that are not real brand names
+            choice (str): user selected checkpoint, or the space weight ensemble
+            space_mix (float): user selected space weight slider position, mixing the checkpoints
 
         Returns:
-            alert_text (str): help message for the user to guide input entry
-            color (str): bootstrap color for the alert styling
-            disabled (bool): flag indicating if the generate button should be disabled
-    '''
-
-    allowed_letters = set(string.ascii_letters)
-    if num_gen:
-        if seed:
-            seed_chars = set(seed)
-            if not seed_chars.difference(allowed_letters):
-                alert_text = 'Press the generate button to produce results!'
-                color = 'success'
-                disabled = False
-            else:
-                alert_text = 'Invalid characters present in the seed. Only upper or lowercase English letters are allowed!'
-                color = 'danger'
-                disabled = True
-        else:
-            alert_text = 'Input how many names to generate and a seed string to get started...'
-            color = 'warning'
-            disabled = True
-    else:
-        alert_text = 'Ensure that the specified number of names is an integer between 10 and 100...'
-        color='danger'
-        disabled=True
+            run_id (str): identifier of the new generation run
+            interval_disabled (bool): always False, starts polling for the streamed names
+            button_text (str): always "Generate", included to trigger loading icon while the run starts
+    '''
 
-    return [alert_text, color, disabled]
+    alert_text, color = validate_inputs(seed, num_gen)
+    if color != 'success':
+        raise dash.exceptions.PreventUpdate
+    try:
+        sampling = sampling_settings({'temperature': temperature, 'top_k': top_k, 'top_p': top_p, 'rng_seed': rng_seed})
+    except InvalidRequest:
+        raise dash.exceptions.PreventUpdate
+    seed = seed.lower()
+    run_id = start_run(seed, num_gen, sampling['temperature'], sampling['top_k'], sampling['top_p'],
+                       sampling['rng_seed'], bool(novel), choice, space_mix)
+    interval_disabled = False
+    button_text = 'Generate'
+    return [run_id, interval_disabled, button_text]
 
 
 @app.callback(
     [Output('results-storage', 'data'),
      Output('name-index-select', 'max_value'),
-     Output('generate-button', 'children')],
-    Input('generate-button', 'n_clicks'),
-    [State('name-seed-input', 'value'),
-     State('name-num-input', 'value')],
+     Output('results-interval', 'disabled')],
+    [Input('results-interval', 'n_intervals'),
+     Input('run-id', 'data')],
+    State('results-storage', 'data'),
     prevent_initial_call=True
 )
-def populate_results(clicks, seed, num_gen):
+def poll_results(n_intervals, run_id, data):
     '''
-    Generate names using user input and store them in a Dash storage component for use by other callbacks.
+    Copy the summary of the names generated so far by the current run into the storage component,
+    so the name viewer, info and graphs fill in progressively. Polling stops once the run is finished.
 
         Parameters:
-            clicks (int): number of clicks of the generate button, only used to trigger callback
-            seed (str): user supplied input for seed string given to generator
-            num_gen (int): user supplied input for number of names to generate
+            n_intervals (int): number of polling ticks, only used to trigger callback
+            run_id (str): identifier of the current generation run
+            data (dict): run summary currently stored on the page
 
         Returns:
-            results (dict): dictionary containing different types of results from the model
-            max_page (int): equal to num_gen, the max number of pages for navigating the word bank
-            button_text (str): always "Generate", included to trigger loading icon when the predictions are processing
+            summary (dict): run summary, see summarize_run
+            max_page (int): number of names so far, the max number of pages for navigating the word bank
+            interval_disabled (bool): True once the run is finished
     '''
 
-    results = {'names': []}
-    seed = seed.lower()
-    for i in range(num_gen):
-        name = model.predict(seed)
-        results['names'].append(name)
-    likely_name, likely_prob = model.predict_max(seed)
-    results['likely_name'] = likely_name
-    results['likely_prob'] = likely_prob
-    results['used_seed'] = seed
-    max_page = num_gen
-    button_text = 'Generate'
-    return [results, max_page, button_text]
+    with runs_lock:
+        run = runs.get(run_id)
+        if run is None:
+            return [dash.no_update, dash.no_update, True]
+
+        # Nothing new since the last tick
+        same_run = data is not None and data.get('run_id') == run_id
+        if not run['names'] or (same_run and len(run['names']) == data['count'] and not run['done']):
+            return [dash.no_update, dash.no_update, run['done']]
+        summary = summarize_run(run)
+
+    max_page = summary['count']
+    return [summary, max_page, summary['done']]
 
 
 @app.callback(
     Output('name-index-select', 'active_page'),
-    Input('results-storage', 'data'),
+    Input('run-id', 'data'),
     prevent_initial_call=True
 )
-def reset_pagination(data):
+def reset_pagination(run_id):
     '''
-    Move back to page 1 when new predictions are generated.
+    Move back to page 1 when a new generation run starts.
 
         Parameters:
-            data (dict): new names generated from model, only used to trigger callback
+            run_id (str): identifier of the new generation run, only used to trigger callback
 
         Returns:
             page (int): page to go to when new predictions arrive, always 1
@@ -160,40 +520,54 @@ def reset_pagination(data):
     return page
 
 
-@app.callback(
+# The name viewer pages in the browser through the names sent by load_names, see static/clientside.js;
+# the server is only asked for more names when the selected page leaves them
+app.clientside_callback(
+    ClientsideFunction(namespace='rx', function_name='request_names'),
+    Output('name-window-request', 'data'),
+    [Input('name-index-select', 'active_page'),
+     Input('results-storage', 'data')],
+    State('name-window', 'data')
+)
+app.clientside_callback(
+    ClientsideFunction(namespace='rx', function_name='show_name'),
     [Output('name-viewer-1', 'children'),
      Output('name-viewer-2', 'children'),
      Output('name-viewer-3', 'children')],
-    Input('name-index-select', 'active_page'),
-    State('results-storage', 'data')
+    [Input('name-index-select', 'active_page'),
+     Input('results-storage', 'data'),
+     Input('name-window', 'data')]
 )
-def show_name(page, data):
+
+
+@app.callback(
+    Output('name-window', 'data'),
+    Input('name-window-request', 'data'),
+    prevent_initial_call=True
+)
+def load_names(window_request):
     '''
-    Show the selected name and its two neighbors in the name viewer.
+    Send the page the names of a run around the selected page, plus the first and last name that
+    the viewer wraps around to.
 
         Parameters:
-            page (int): currently selected word index
-            data (dict): model results dictionary
-        
+            window_request (dict): run id, selected page and number of names shown by the page
+
         Returns:
-            view_1 (str): number and name to display in the topmost view panel
-            view_2 (str): number and name to display in the middle/main view panel
-            view_3 (str): number and name to display in the bottom view panel
+            name_window (dict): run id and names keyed by index (as a string)
     '''
 
-    if not data:
-        curr_num = page
-        prev_num = page - 1 if page - 1 != 0 else 10
-        next_num = page + 1 if page + 1 <= 10 else 1
-        view_1, view_2, view_3 = f'{prev_num}.', f'{curr_num}.', f'{next_num}.'
-    else:
-        data = data['names']
-        curr_num = page
-        prev_num = page - 1 if page - 1 != 0 else len(data)
-        next_num = page + 1 if page + 1 <= len(data) else 1
-        prev_word, curr_word, next_word = data[page - 2], data[page - 1], data[page % (len(data))]
-        view_1, view_2, view_3 = f'{prev_num}. {prev_word}', f'{curr_num}. {curr_word}', f'{next_num}. {next_word}'
-    return [view_1, view_2, view_3]
+    with runs_lock:
+        run = runs.get(window_request['run_id'])
+        if run is None:
+            raise dash.exceptions.PreventUpdate
+        count = min(window_request['count'], len(run['names']))
+        start = max(window_request['page'] - 1 - NAME_WINDOW // 2, 0)
+        indices = set(range(start, min(start + NAME_WINDOW, count))) | {0, count - 1}
+        names = {str(ind): run['names'][ind] for ind in sorted(indices)}
+
+    name_window = {'run_id': window_request['run_id'], 'names': names}
+    return name_window
 
 
 @app.callback(
@@ -207,7 +581,7 @@ def fill_info(data):
     Fill the supplementary info section with model results.
 
         Parameters:
-            data (dict): model results dictionary
+            data (dict): summary of the current run
 
         Returns:
             unique_info (str): text blurb describing the number of unique words generated
@@ -215,11 +589,16 @@ def fill_info(data):
     '''
 
     if data:
-        unique_names = list(set(data['names']))
-        count = len(unique_names)
-        prop = round(count / len(data['names']) * 100, 1)
+        count = data['unique']
+        prop = round(count / data['count'] * 100, 1)
         unique_info = f'This generation run produced {count} unique words (proportion of unique words: {prop}%)'
-        likely_info = f'The theoretical most likely name for this combination of inputs is {data["likely_name"].capitalize()} (probability of being generated: {round(data["likely_prob"] * 100, 1)}%)'
+        if not data['done']:
+            unique_info += f', {data["count"]} names so far...'
+        likely_ranked = ', '.join(
+            f'{rank}. {name.capitalize()} ({round(math.exp(log_prob) * 100, 1)}%)'
+            for rank, (name, log_prob) in enumerate(data['likely'], start=1)
+        )
+        likely_info = f'The theoretical most likely names for this combination of inputs are {likely_ranked} (probability of being generated in brackets)'
         return [unique_info, likely_info]
     else:
         raise dash.exceptions.PreventUpdate
@@ -235,21 +614,16 @@ def fill_name_graph(data):
     Create the name distribution graph from the generated results.
 
         Parameters:
-            data (dict): model results dictionary
+            data (dict): summary of the current run
 
         Returns:
             fig (plotly.graph_objects.Figure): Plotly graph instance containing name chart
     '''
 
     if data:
-        names = data['names']
-        total = len(names)
-        name_freq = dict(Counter(names))
-        sorted_names = sorted(name_freq.items(), key=lambda x: x[1], reverse=True)
-        if len(sorted_names) > 10:
-            sorted_names = sorted_names[:10]
-        names_x = list(map(lambda x: x[0], sorted_names))
-        probs_y = list(map(lambda x: x[1]/total, sorted_names))
+        total = data['count']
+        names_x = [name for name, _ in data['top_names']]
+        probs_y = [freq / total for _, freq in data['top_names']]
 
         bar = go.Bar(
             x=names_x, y=probs_y,
@@ -274,20 +648,15 @@ def fill_letter_graph(data):
     Create the letter distribution graph from the generated results.
 
         Parameters:
-            data (dict): model results dictionary
+            data (dict): summary of the current run
 
         Returns:
             fig (plotly.graph_objects.Figure): Plotly graph instance containing letter chart
     '''
 
     if data:
-        names = data['names']
-        letters_trim = list(map(lambda x: list(x[len(data['used_seed']):]), names))
-        letters_flat = [item for sublist in letters_trim for item in sublist]
-        total = len(letters_flat)
-        name_freq = dict(Counter(letters_flat))
         letters_x = list(string.ascii_lowercase)
-        probs_y = [name_freq[letter]/total for letter in letters_flat]
+        probs_y = data['letter_freq']
 
         bar = go.Bar(
             x=letters_x, y=probs_y,
@@ -303,6 +672,299 @@ def fill_letter_graph(data):
         raise dash.exceptions.PreventUpdate
 
 
+# JSON API for other services, served by Flask directly without going through the Dash callbacks.
+# Every endpoint takes a batch per call; large responses are streamed as one JSON object per line
+server = app.server
+MAX_API_BATCH = 64
+MAX_API_SCORES = 10000
+API_STREAM_THRESHOLD = 1000
+NDJSON = 'application/x-ndjson'
+
+
+class InvalidRequest(ValueError):
+    '''Error raised for API calls with invalid input, answered with a 400 response.'''
+
+
+def api_number(settings, key, default, low, high, integer=False):
+    '''
+    Read a numeric setting of an API call, checking it against the limits of the input form.
+
+        Parameters:
+            settings (dict): decoded request settings
+            key (str): name of the setting
+            default (float): value used when the setting is missing or null, None for no limit
+            low (float): smallest allowed value
+            high (float): largest allowed value
+            integer (bool): flag for only allowing integers
+
+        Returns:
+            value (float): validated setting, or the default
+    '''
+
+    value = settings.get(key)
+    if value is None:
+        return default
+    kinds = int if integer else (int, float)
+    if isinstance(value, bool) or not isinstance(value, kinds) or not low <= value <= high:
+        kind = 'an integer' if integer else 'a number'
+        raise InvalidRequest(f'{key} must be {kind} between {low} and {high}')
+    return value
+
+
+# Sampling settings shared by the input form and the JSON API: (default, smallest, largest, integer only)
+SAMPLING_LIMITS = {
+    'temperature': (1.0, 0, 3, False),
+    'top_k': (None, 1, 27, True),
+    'top_p': (None, 0.05, 1, False),
+    'rng_seed': (None, 0, 2 ** 32 - 1, True)
+}
+
+
+def sampling_settings(settings):
+    '''
+    Read and check the sampling settings of a generation request from the input form or the JSON API.
+
+        Parameters:
+            settings (dict): request settings, a missing or null sampling setting takes its default
+
+        Returns:
+            sampling (dict): validated temperature (0 for greedy), top_k, top_p and rng_seed
+    '''
+
+    return {
+        key: api_number(settings, key, default, low, high, integer)
+        for key, (default, low, high, integer) in SAMPLING_LIMITS.items()
+    }
+
+
+def api_model(settings):
+    '''
+    Get the model selected by an API call, see get_model.
+
+        Parameters:
+            settings (dict): decoded request settings, with optional model and space_mix keys
+
+        Returns:
+            model (LSTMGenerator or NumpyLSTMGenerator): model to serve the call with
+    '''
+
+    choice = settings.get('model', DEFAULT_CHECKPOINT)
+    if choice == ENSEMBLE and checkpoint_format == 'pt':
+        space_mix = api_number(settings, 'space_mix', 1, 0, max(len(space_weight_names()) - 1, 0))
+        return get_model(choice, space_mix)
+    if choice not in registry.names(checkpoint_format):
+        raise InvalidRequest(f'Unknown model {choice}, see /api/models')
+    return get_model(choice, None)
+
+
+def api_body(key):
+    '''
+    Decode the JSON body of an API call and get its batch of inputs.
+
+        Parameters:
+            key (str): name of the list of inputs in the body
+
+        Returns:
+            body (dict): decoded body
+            batch (list): inputs of the call
+    '''
+
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        raise InvalidRequest('The request body must be a JSON object')
+    batch = body.get(key)
+    limit = MAX_API_SCORES if key == 'names' else MAX_API_BATCH
+    if not isinstance(batch, list) or not 0 < len(batch) <= limit:
+        raise InvalidRequest(f'{key} must be a list of 1 to {limit} entries')
+    return body, batch
+
+
+def check_seed(seed, what='seed'):
+    '''Raise an InvalidRequest for a seed (or name) that the input form would not accept.'''
+
+    alert_text, color = validate_inputs(seed, MIN_NAMES)
+    if color != 'success':
+        raise InvalidRequest(alert_text.replace('the seed', f'the {what} {seed!r}'))
+
+
+def wants_stream(total):
+    '''Check whether an API response of total results should be streamed as NDJSON.'''
+
+    return total > API_STREAM_THRESHOLD or request.accept_mimetypes.best == NDJSON
+
+
+def ndjson_response(lines):
+    '''
+    Stream API results as NDJSON while they are produced, reporting a failure as a last error line.
+
+        Parameters:
+            lines (generator): JSON serializable results, one per line
+
+        Returns:
+            response (flask.Response): streamed response
+    '''
+
+    def stream():
+        try:
+            for line in lines:
+                yield json.dumps(line) + '\n'
+        except Exception as error:
+            yield json.dumps({'error': str(error)}) + '\n'
+
+    return Response(stream_with_context(stream()), mimetype=NDJSON)
+
+
+def iter_generated(jobs):
+    '''
+    Generate the names of several API generation requests, yielding each name as it finishes.
+    Requests on a torch model go through its micro-batching scheduler, so they decode together
+    with each other and with the runs started from the page.
+
+        Parameters:
+            jobs (list): (model, settings) pairs, with settings keyed like BatchScheduler.submit
+
+        Returns:
+            names (generator): (index, name) pairs, where index is the position of the request in jobs
+    '''
+
+    if checkpoint_format == 'npz':
+        for index, (gen_model, settings) in enumerate(jobs):
+            for name in gen_model.iter_names(**settings):
+                yield index, name
+        return
+
+    finished = queue.Queue()
+    futures = []
+    for index, (gen_model, settings) in enumerate(jobs):
+        future = get_scheduler(gen_model).submit(
+            **settings, on_name=lambda name, index=index: finished.put((index, name))
+        )
+        future.add_done_callback(lambda future, index=index: finished.put((index, None)))
+        futures.append(future)
+    remaining = len(futures)
+    while remaining:
+        index, name = finished.get()
+        if name is None:
+            remaining -= 1
+        else:
+            yield index, name
+    for future in futures:
+        future.result()     # raise the error of a failed request
+
+
+@server.errorhandler(InvalidRequest)
+def api_invalid(error):
+    '''Answer an API call with invalid input with a 400 error giving the reason.'''
+
+    return jsonify({'error': str(error)}), 400
+
+
+@server.route('/api/models', methods=['GET'])
+def api_models():
+    '''
+    List the models that the API can use.
+
+        Returns:
+            response (flask.Response): JSON object with the default model and every model name
+    '''
+
+    models = registry.names(checkpoint_format)
+    if checkpoint_format == 'pt' and space_weight_names():
+        models.insert(0, ENSEMBLE)
+    return jsonify({'default': DEFAULT_CHECKPOINT, 'models': models})
+
+
+@server.route('/api/generate', methods=['POST'])
+def api_generate():
+    '''
+    Generate names for a batch of requests, e.g.
+    {"requests": [{"seed": "ab", "n": 100}, {"seed": "xy", "n": 20, "temperature": 0.8}], "model": "ensemble"}.
+    Each request takes the seed, n, temperature, top_k, top_p, rng_seed, novel, model and space_mix
+    inputs of the page; inputs given next to the requests list apply to every request.
+
+        Returns:
+            response (flask.Response): {"results": [{"seed": ..., "names": [...]}, ...]}, or NDJSON lines
+                {"index": ..., "name": ...} in the order the names finish
+    '''
+
+    body, batch = api_body('requests')
+    defaults = {key: value for key, value in body.items() if key != 'requests'}
+    jobs = []
+    for settings in batch:
+        if not isinstance(settings, dict):
+            raise InvalidRequest('Every request must be a JSON object')
+        settings = {**defaults, **settings}
+        alert_text, color = validate_inputs(settings.get('seed'), settings.get('n'))
+        if color != 'success':
+            raise InvalidRequest(alert_text)
+        jobs.append((api_model(settings), {
+            'seed': settings['seed'].lower(),
+            'n': settings['n'],
+            **sampling_settings(settings),
+            'novel': bool(settings.get('novel', False))
+        }))
+
+    if wants_stream(sum(settings['n'] for _, settings in jobs)):
+        return ndjson_response({'index': index, 'name': name} for index, name in iter_generated(jobs))
+    results = [{'seed': settings['seed'], 'names': []} for _, settings in jobs]
+    for index, name in iter_generated(jobs):
+        results[index]['names'].append(name)
+    return jsonify({'results': results})
+
+
+@server.route('/api/most-likely', methods=['POST'])
+def api_most_likely():
+    '''
+    Find the most likely names for a batch of seeds with beam search, e.g. {"seeds": ["ab", "xy"], "k": 3}.
+    Optional inputs are k (1 to 20), max_length (letters after the seed, 1 to 60), model and space_mix.
+
+        Returns:
+            response (flask.Response): {"results": [{"seed": ..., "names": [{"name": ..., "log_prob": ...,
+                "probability": ...}, ...]}, ...]}
+    '''
+
+    body, seeds = api_body('seeds')
+    for seed in seeds:
+        check_seed(seed)
+    k = api_number(body, 'k', 3, 1, 20, integer=True)
+    max_length = api_number(body, 'max_length', 30, 1, 60, integer=True)
+    gen_model = api_model(body)
+
+    results = []
+    for seed in map(str.lower, seeds):
+        likely = gen_model.predict_beam(seed, k=k, max_length=len(seed) + max_length)
+        names = [{'name': name, 'log_prob': log_prob, 'probability': math.exp(log_prob)} for name, log_prob in likely]
+        results.append({'seed': seed, 'names': names})
+    return jsonify({'results': results})
+
+
+@server.route('/api/score', methods=['POST'])
+def api_score():
+    '''
+    Score a batch of names under a model, see LSTMGenerator.iter_scores, e.g. {"names": ["abilify", "xarelto"]}.
+
+        Returns:
+            response (flask.Response): {"results": [{"name": ..., "log_likelihood": ..., "surprisal": [...]},
+                ...]}, or the same objects as NDJSON lines
+    '''
+
+    body, names = api_body('names')
+    for name in names:
+        check_seed(name, 'name')
+    gen_model = api_model(body)
+    if not hasattr(gen_model, 'iter_scores'):
+        return jsonify({'error': f'Scoring is not available with the {checkpoint_format} backend'}), 501
+
+    names = [name.lower() for name in names]
+    results = (
+        {'name': name, 'log_likelihood': float(log_likelihood), 'surprisal': surprisal.tolist()}
+        for name, (log_likelihood, surprisal) in zip(names, gen_model.iter_scores(names))
+    )
+    if wants_stream(len(names)):
+        return ndjson_response(results)
+    return jsonify({'results': list(results)})
+
+
 # Run the server 
 if __name__ == '__main__':
     app.run_server(debug=True)
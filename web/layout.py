@@ -63,9 +63,20 @@ personal_info = dbc.Toast(
     style={'position': 'fixed', 'top': 110, 'right': 10, 'background-color': 'rgba(255,255,255,1)'}
 )
 
-# Dash module for storing model results
+# Dash module for storing the summary of the current run, the names themselves stay on the server
 results_storage = dcc.Store(id='results-storage', data=None)
 
+# Timer rescanning the trained checkpoints, so new or replaced files show up without a restart
+registry_interval = dcc.Interval(id='registry-interval', interval=60000)
+
+# Identifier of the current generation run and the timer polling its streamed names
+run_id_storage = dcc.Store(id='run-id', data=None)
+results_interval = dcc.Interval(id='results-interval', interval=300, disabled=True)
+
+# Names of the current run around the viewed one, and the request asking the server for them
+name_window_storage = dcc.Store(id='name-window', data=None)
+name_window_request = dcc.Store(id='name-window-request', data=None)
+
 # Define basic graph structure for charts to be generated
 graph_layout_names = go.Layout(
         margin=dict(l=50, r=50, t=80, b=50),
@@ -115,7 +126,7 @@ body = dbc.Container(
                         class_name='fs-4',
                         style={'width': '90px'},
                         min=10,
-                        max=100
+                        max=5000
                     ),
                     width='auto',
                     class_name='ps-3 pe-3'
@@ -153,6 +164,94 @@ body = dbc.Container(
             justify='center'
         ),
 
+        # Sampling controls section
+        dbc.Row(
+            [
+                dbc.Col(
+                    dbc.InputGroup(
+                        [
+                            dbc.InputGroupText('Temperature'),
+                            dbc.Input(id='temperature-input', type='number', value=1, min=0, max=3, step=0.1)
+                        ],
+                        style={'width': '220px'}
+                    ),
+                    width='auto'
+                ),
+                dbc.Col(
+                    dbc.InputGroup(
+                        [
+                            dbc.InputGroupText('Top-k'),
+                            dbc.Input(id='top-k-input', type='number', value=27, min=1, max=27, step=1)
+                        ],
+                        style={'width': '180px'}
+                    ),
+                    width='auto'
+                ),
+                dbc.Col(
+                    dbc.InputGroup(
+                        [
+                            dbc.InputGroupText('Top-p'),
+                            dbc.Input(id='top-p-input', type='number', value=1, min=0.05, max=1, step=0.05)
+                        ],
+                        style={'width': '180px'}
+                    ),
+                    width='auto'
+                ),
+                dbc.Col(
+                    dbc.Switch(id='novelty-switch', label='Only new names', value=False),
+                    width='auto'
+                ),
+                dbc.Col(
+                    dbc.InputGroup(
+                        [
+                            dbc.InputGroupText('Random seed'),
+                            dbc.Input(id='rng-seed-input', type='number', placeholder='<random>', min=0, max=2 ** 32 - 1, step=1)
+                        ],
+                        style={'width': '240px'}
+                    ),
+                    width='auto'
+                )
+            ],
+            class_name='g-3 mt-2',
+            align='center',
+            justify='center'
+        ),
+
+        # Checkpoint section, picks a trained model or blends the models trained with different space weights
+        dbc.Row(
+            [
+                dbc.Col(
+                    dbc.InputGroup(
+                        [
+                            dbc.InputGroupText('Model'),
+                            dbc.Select(id='checkpoint-select', options=[], value=None)
+                        ],
+                        style={'width': '460px'}
+                    ),
+                    width='auto'
+                ),
+                dbc.Col(
+                    html.Div('Space weight mix (longer names to the left)', className='fs-6'),
+                    width='auto'
+                ),
+                dbc.Col(
+                    dcc.Slider(
+                        id='space-weight-slider',
+                        min=0,
+                        max=3,
+                        step=0.1,
+                        value=1,
+                        marks={0: 'sw 0.01', 1: 'sw 0.05', 2: 'sw 0.1', 3: 'sw 0.5'}
+                    ),
+                    style={'width': '420px'},
+                    width='auto'
+                )
+            ],
+            class_name='g-3 mt-2',
+            align='center',
+            justify='center'
+        ),
+
         # Input Alerts Section
         dbc.Alert(
             id='inputs-alert',
@@ -209,7 +308,7 @@ body = dbc.Container(
                                             id='unique-info'
                                         ),
                                         dbc.ListGroupItem(
-                                            'The theoretical most likely name for this combination of inputs is __________ (probability of being generated: __%)', 
+                                            'The theoretical most likely names for this combination of inputs are 1. __________ (__%), 2. __________ (__%), 3. __________ (__%) (probability of being generated in brackets)', 
                                             class_name='fs-6',
                                             id='likely-info'
                                         ),
@@ -300,6 +399,11 @@ layout = html.Div(
 
         # Extras - popups, hidden storage components, etc
         personal_info,
-        results_storage
+        results_storage,
+        run_id_storage,
+        name_window_storage,
+        name_window_request,
+        results_interval,
+        registry_interval
     ]
 )
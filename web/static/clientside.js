@@ -0,0 +1,109 @@
+// Callbacks run in the browser, registered in app.py with ClientsideFunction(namespace='rx', ...).
+// They only use data already on the page, so typing and paging never wait for the server
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    rx: {
+        /**
+         * Assess the supplied inputs to provide help text and disable/enable the generation button,
+         * with the same rules as validate_inputs and sampling_settings in app.py.
+         *
+         * @param {string} seed - user supplied input for the seed string for the generator
+         * @param {number} num_gen - user supplied input for number of names to generate
+         * @param {number} temperature - user supplied sampling temperature, empty for the default
+         * @param {number} top_k - user supplied top-k sampling limit, empty for no limit
+         * @param {number} top_p - user supplied nucleus sampling threshold, empty for no limit
+         * @param {number} rng_seed - user supplied random seed, empty for a random run
+         * @param {...number} limits - smallest and largest allowed value of each number input above, in order
+         * @returns {Array} help message, bootstrap color of the alert and flag disabling the generate button
+         */
+        check_inputs: function (seed, num_gen, temperature, top_k, top_p, rng_seed, ...limits) {
+            const [min_names, max_names] = limits;
+            if (!Number.isInteger(num_gen) || num_gen < min_names || num_gen > max_names) {
+                return [
+                    `Ensure that the specified number of names is an integer between ${min_names} and ${max_names}...`,
+                    'danger',
+                    true
+                ];
+            }
+            if (!seed) {
+                return ['Input how many names to generate and a seed string to get started...', 'warning', true];
+            }
+            if (!/^[A-Za-z]+$/.test(seed)) {
+                return [
+                    'Invalid characters present in the seed. Only upper or lowercase English letters are allowed!',
+                    'danger',
+                    true
+                ];
+            }
+
+            // Empty sampling inputs take their defaults
+            const sampling = [
+                ['temperature', temperature, false],
+                ['top-k', top_k, true],
+                ['top-p', top_p, false],
+                ['random seed', rng_seed, true]
+            ];
+            for (const [ind, [label, value, integer]] of sampling.entries()) {
+                const [low, high] = limits.slice(2 * ind + 2, 2 * ind + 4);
+                if (value === null || value === undefined || value === '') {
+                    continue;
+                }
+                if (typeof value !== 'number' || (integer && !Number.isInteger(value)) || value < low || value > high) {
+                    const kind = integer ? 'an integer' : 'a number';
+                    return [`Ensure that the ${label} is ${kind} between ${low} and ${high}...`, 'danger', true];
+                }
+            }
+            return ['Press the generate button to produce results!', 'success', false];
+        },
+
+        /**
+         * Ask the server for the names around the selected page, only when the names already on the
+         * page do not cover it and its two neighbors.
+         *
+         * @param {number} page - currently selected word index
+         * @param {Object} data - summary of the current run
+         * @param {Object} name_window - names already sent by the server, keyed by index
+         * @returns {Object} run id, page and number of names to send, or no_update
+         */
+        request_names: function (page, data, name_window) {
+            if (!data || !data.count) {
+                return window.dash_clientside.no_update;
+            }
+            const count = data.count;
+            page = Math.min(page || 1, count);
+            const needed = [(page - 2 + count) % count, page - 1, page % count];
+            if (name_window && name_window.run_id === data.run_id
+                && needed.every((ind) => String(ind) in name_window.names)) {
+                return window.dash_clientside.no_update;
+            }
+            return {run_id: data.run_id, page: page, count: count};
+        },
+
+        /**
+         * Show the selected name and its two neighbors in the name viewer.
+         *
+         * @param {number} page - currently selected word index
+         * @param {Object} data - summary of the current run
+         * @param {Object} name_window - names sent by the server, keyed by index
+         * @returns {Array} number and name to display in the top, middle/main and bottom view panels
+         */
+        show_name: function (page, data, name_window) {
+            page = page || 1;
+            if (!data || !data.count) {
+                const prev_num = page - 1 !== 0 ? page - 1 : 10;
+                const next_num = page + 1 <= 10 ? page + 1 : 1;
+                return [`${prev_num}.`, `${page}.`, `${next_num}.`];
+            }
+            const count = data.count;
+            page = Math.min(page, count);
+            const prev_num = page - 1 !== 0 ? page - 1 : count;
+            const next_num = page + 1 <= count ? page + 1 : 1;
+            const names = name_window && name_window.run_id === data.run_id ? name_window.names : {};
+
+            // Names still on their way from the server are left blank
+            return [prev_num, page, next_num].map((num) => {
+                const name = names[String(num - 1)];
+                return name === undefined ? `${num}.` : `${num}. ${name}`;
+            });
+        }
+    }
+});